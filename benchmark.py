@@ -0,0 +1,115 @@
+import copy
+import http.client
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+# HTTP load benchmark for a running API server. Compare throughput of the
+# single-process server and the gunicorn profile by running it against each:
+#
+#   python benchmark.py --url http://127.0.0.1:8000 --endpoint score --concurrency 32 --duration 20
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SAMPLE_FARMER_PATH = os.path.join(DATA_DIR, "sample_farmer.json")
+GOLDEN_SET_PATH = os.path.join(DATA_DIR, "eval_golden_set.json")
+
+
+def score_requests(unique=True):
+    """Yields credit score request bodies; unique profiles defeat the score caches."""
+    with open(SAMPLE_FARMER_PATH, encoding="utf-8") as f:
+        sample = json.load(f)
+    n = 0
+    while True:
+        body = copy.deepcopy(sample)
+        if unique:
+            body["farmers"]["id"] = f"bench-{n}"
+            body["farmers"]["mobile_wallet_balance"] = float(n % 100000)
+        n += 1
+        yield "/calculate_credit_score", body
+
+
+def faq_requests():
+    with open(GOLDEN_SET_PATH, encoding="utf-8") as f:
+        queries = [entry["query"] for entry in json.load(f)]
+    n = 0
+    while True:
+        yield "/query_faq", {"query": queries[n % len(queries)]}
+        n += 1
+
+
+def run_benchmark(url, requests, concurrency=16, duration_s=10.0, timeout_s=30.0):
+    """
+    Sends requests from `concurrency` keep-alive connections for `duration_s` seconds.
+
+    Returns:
+        dict: Request and error counts, throughput and latency percentiles.
+    """
+    parts = urlsplit(url)
+    lock = threading.Lock()
+    latencies, errors = [], []
+    stop_at = time.monotonic() + duration_s
+
+    def next_request():
+        with lock:
+            return next(requests)
+
+    def post(connection, path, body):
+        for attempt in range(2):
+            try:
+                connection.request("POST", path, body=json.dumps(body), headers={"Content-Type": "application/json"})
+                response = connection.getresponse()
+                response.read()
+                return response.status == 200
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Keep-alive connection closed by a recycled worker: reconnect once
+                connection.close()
+                if attempt:
+                    return False
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                return False
+
+    def worker():
+        connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout_s)
+        while time.monotonic() < stop_at:
+            path, body = next_request()
+            started = time.perf_counter()
+            ok = post(connection, path, body)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with lock:
+                (latencies if ok else errors).append(elapsed_ms)
+        connection.close()
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_s = time.monotonic() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": len(latencies) / wall_s,
+        "latency_ms": {f"p{q}": float(np.percentile(latencies, q)) for q in (50, 95, 99)} if latencies else {},
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure API throughput and latency under concurrent load.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=["score", "faq"], default="score")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("--repeat-profile", action="store_true", help="Send the same farmer profile every time")
+    args = parser.parse_args()
+
+    requests = score_requests(unique=not args.repeat_profile) if args.endpoint == "score" else faq_requests()
+    print(json.dumps(run_benchmark(args.url, requests, args.concurrency, args.duration), indent=2))
@@ -1,27 +1,205 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, FastAPI, HTTPException, Header, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+import asyncio
 import json
-import credit_score as cs
-import rag.querying
-import converse 
-from mangum import Mangum
-from models.request import CreditScoreRequestModel, QueryFAQRequestModel, ConversationRequestModel
+import os
+from contextlib import asynccontextmanager, contextmanager
+from typing import Literal, Optional
+from models.request import CreditScoreRequestModel, CreditScoreJobRequestModel, QueryFAQRequestModel, ConversationRequestModel
+from rag.answers import fallback_answer
+from rag.deadline import Deadline
+from rag.resilience import load_shedder
 
+# Scoring and AI modules are imported by the routes that use them, so a Lambda
+# function serving only one group of routes never loads the other's dependencies
+# (see lambda_handler.py). preload() imports them up front for long-running servers.
 
-app = FastAPI(debug=True)
-#handler = Mangum(app)
+# How often to check whether the client is still connected while a RAG pipeline runs
+DISCONNECT_POLL_SECONDS = 0.25
 
-@app.get("/")
+# Tracebacks in error responses; the production server profile turns this off
+APP_DEBUG = os.getenv("APP_DEBUG", "true").lower() == "true"
+
+# Route groups that can be served together or deployed separately
+ROUTE_GROUPS = ("scoring", "ai", "jobs")
+
+scoring_router = APIRouter()
+ai_router = APIRouter()
+jobs_router = APIRouter()
+status_router = APIRouter()
+
+
+@asynccontextmanager
+async def run_job_workers(app: FastAPI):
+    """Run bulk scoring job workers for the lifetime of the server (resuming unfinished jobs)."""
+    from scoring import jobs
+    jobs.start_workers()
+    try:
+        yield
+    finally:
+        await run_in_threadpool(jobs.stop_workers)
+
+
+def server_lifespan(routes=ROUTE_GROUPS):
+    """
+    Lifespan of a server for the given route groups: warm-up in the background
+    (see warmup.py), plus job workers if the server runs jobs.
+    """
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        import warmup
+        warmup.warm_up.start(routes)
+        try:
+            if "jobs" in routes:
+                async with run_job_workers(app):
+                    yield
+            else:
+                yield
+        finally:
+            warmup.warm_up.stop()
+
+    return lifespan
+
+
+def create_app(routes=ROUTE_GROUPS) -> FastAPI:
+    """
+    Build the API with the given route groups ("scoring", "ai", "jobs").
+    """
+    app = FastAPI(debug=APP_DEBUG, lifespan=server_lifespan(routes))
+    app.include_router(status_router)
+    if "scoring" in routes:
+        app.include_router(scoring_router)
+    if "ai" in routes:
+        app.include_router(ai_router)
+    if "jobs" in routes:
+        app.include_router(jobs_router)
+    return app
+
+def preload(routes=ROUTE_GROUPS):
+    """
+    Import the route modules and load rule tables, reference data, the FAQ lexical
+    and answer indexes and upstream clients for the given route groups.
+
+    The production server calls this once before forking workers, so they share
+    the loaded data instead of each loading it on its first request.
+    """
+    if "scoring" in routes:
+        import credit_score
+        from scoring import markets, ml, rules
+        rules.get_rules()
+        markets.get_market_index()
+        try:
+            ml.get_model()
+        except ml.ModelUnavailableError:
+            pass  # Already logged; ML scoring falls back to the heuristic engine
+    if "ai" in routes:
+        import converse
+        import rag.querying
+        from rag.answer_index import wait_for_answer_index
+        from rag.clients import preload_clients
+        from rag.tenants import get_tenants
+        from warmup import WARMUP_TIMEOUT_SECONDS
+        for tenant in get_tenants().values():
+            tenant.lexical_index()
+            # Embedded here if the ingest-time file is missing, before the server forks,
+            # so workers inherit the index instead of each embedding the FAQ again
+            wait_for_answer_index(tenant, WARMUP_TIMEOUT_SECONDS)
+        preload_clients()
+
+def resolve_tenant(tenant_id):
+    """The tenant named by a request's X-Tenant-Id header (default: FarmCredit's own FAQ)."""
+    from rag.tenants import UnknownTenant, get_tenant
+    try:
+        return get_tenant(tenant_id)
+    except UnknownTenant as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@contextmanager
+def admit_ai_request(tenant):
+    """
+    Context manager yielding whether an AI request is admitted: within its tenant's
+    quota, then within the server's AI request capacity.
+    """
+    with tenant.admit() as within_quota:
+        if not within_quota:
+            yield False
+            return
+        with load_shedder.admit("low") as admitted:
+            yield admitted
+
+async def run_until_disconnect(http_request: Request, deadline: Deadline, func, *args, **kwargs):
+    """
+    Run a blocking pipeline in the threadpool, cancelling its deadline if the client disconnects.
+    """
+    task = asyncio.ensure_future(run_in_threadpool(func, *args, deadline=deadline, **kwargs))
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return task.result()
+        if not deadline.cancelled and await http_request.is_disconnected():
+            print("Client disconnected, cancelling request")
+            deadline.cancel()
+
+@status_router.get("/")
 def read_root():
     return {"Status": "OK", "Message": "Welcome to the Credit Score API!"}
 
-@app.post("/calculate_credit_score")
-def calculate_credit_score(request: CreditScoreRequestModel):
+@status_router.get("/ready")
+def ready():
+    """Readiness for load balancers: 503 until this worker's startup warm-up has finished."""
+    import warmup
+    if not warmup.warm_up.ready:
+        return JSONResponse(status_code=503, content={"Status": "Warming up", "warmup": warmup.get_warmup_stats()})
+    return {"Status": "Ready", "warmup": warmup.get_warmup_stats()}
+
+@status_router.get("/metrics")
+def metrics():
+    import shared_cache
+    import warmup
+    from scoring import features, ml
+    from rag import metrics as rag_metrics
+    from rag.answer_index import get_answer_index_stats
+    from rag.coalesce import get_coalescing_stats
+    from rag.resilience import get_resilience_stats
+    from rag.sessions import get_session_stats
+    from rag.tenants import get_tenant_stats
+    return {
+        "ml_shadow": ml.get_shadow_stats(),
+        "feature_cache": features.get_cache_stats(),
+        "rag": rag_metrics.snapshot(),
+        "faq_fast_path": get_answer_index_stats(),
+        "coalescing": get_coalescing_stats(),
+        "resilience": get_resilience_stats(),
+        "sessions": get_session_stats(),
+        "tenants": get_tenant_stats(),
+        "warmup": warmup.get_warmup_stats(),
+        "shared_cache": shared_cache.get_stats()
+    }
+
+@scoring_router.post("/calculate_credit_score")
+def calculate_credit_score(request: CreditScoreRequestModel,
+                           engine: Literal["heuristic", "ml"] = "heuristic",
+                           shadow: bool = False,
+                           budget_ms: Optional[float] = None):
+    import credit_score as cs
+    from scoring import ml
     try:
         # Convert the request object to a dictionary using model_dump
         request_data = request.model_dump()
-        request_data
-        # Pass the dictionary to the calculate_credit_score function
-        credit_scoring_details = cs.calculate_credit_score(request_data)
+        
+        # Scoring is high priority: always admitted, and counted so AI traffic leaves it room
+        with load_shedder.admit("high"):
+            if engine == "ml":
+                # ML scoring within the latency budget, heuristic fallback otherwise
+                credit_scoring_details = ml.score_with_budget(request_data, budget_ms)
+            else:
+                # Pass the dictionary to the calculate_credit_score function
+                credit_scoring_details = cs.get_credit_score(request_data)
+                credit_scoring_details["engine"] = "heuristic"
+        
+        if shadow:
+            ml.submit_shadow(request_data, credit_scoring_details, credit_scoring_details["engine"])
 
         return {
             "responseCode": 200,
@@ -32,15 +210,62 @@ def calculate_credit_score(request: CreditScoreRequestModel):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/query_faq")
-def query_faq(request: QueryFAQRequestModel):
+@jobs_router.post("/jobs/credit_score", status_code=202)
+def submit_credit_score_job(request: CreditScoreJobRequestModel):
+    from scoring import jobs
+    try:
+        farmers = [farmer.model_dump(mode="json") for farmer in request.farmers] if request.farmers is not None else None
+        job = jobs.submit_job(farmers=farmers, file=request.file, chunk_size=request.chunk_size)
+
+        return {
+            "responseCode": 202,
+            "responseMessage": "Credit score job queued",
+            "data": job
+        }
+
+    except jobs.JobError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@jobs_router.get("/jobs/{job_id}")
+def get_job(job_id: str, offset: int = 0, limit: int = 100):
+    from scoring import jobs
+    try:
+        job = jobs.get_job(job_id, offset=offset, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    return {
+        "responseCode": 200,
+        "responseMessage": "Job status retrieved successfully",
+        "data": job
+    }
+
+@ai_router.post("/query_faq")
+async def query_faq(request: QueryFAQRequestModel, http_request: Request,
+                    x_request_timeout_ms: Optional[float] = Header(default=None),
+                    x_tenant_id: Optional[str] = Header(default=None)):
+    import rag.querying
+    import warmup
+    tenant = resolve_tenant(x_tenant_id)
     try:
         # Convert the request object to a dictionary using model_dump
         request_data = request.model_dump()
         query = request_data['query']
+        deadline = Deadline(x_request_timeout_ms)
         
-        # Pass the dictionary to the query_faq function
-        faq_response = rag.querying.rag_pipeline(query)
+        with admit_ai_request(tenant) as admitted:
+            if admitted:
+                # Pass the dictionary to the query_faq function
+                faq_response = await run_until_disconnect(http_request, deadline, rag.querying.rag_pipeline, query, tenant=tenant)
+                if tenant.is_default:
+                    warmup.record_query(query)
+            else:
+                # Shed under load or over the tenant's quota: serve a cached answer without calling Bedrock
+                faq_response = fallback_answer(query, cache=tenant.answer_cache)
 
         return {
             "responseCode": 200,
@@ -54,30 +279,59 @@ def query_faq(request: QueryFAQRequestModel):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
-@app.post("/converse")
-def conversation(request: ConversationRequestModel):
+@ai_router.post("/converse")
+async def conversation(request: ConversationRequestModel, http_request: Request,
+                       x_request_timeout_ms: Optional[float] = Header(default=None),
+                       x_tenant_id: Optional[str] = Header(default=None)):
+    import converse
+    import warmup
+    from rag.sessions import open_session, session_store
+    tenant = resolve_tenant(x_tenant_id)
     try:
-        # Convert the request object to a dictionary using model_dump
-        request_data = request.model_dump()
+        # Convert the request object to a dictionary using model_dump (JSON types, so sessions can be shared)
+        request_data = request.model_dump(mode="json")
         query = request_data['query']
-        user_info = request_data['user_info']
-        context = request_data['context']
+
+        # Resume the conversation's session, updated with whatever the client sent
+        session = open_session(request_data['conversation_id'], request_data['user_info'],
+                               user_info_sent="user_info" in request.model_fields_set, context=request_data['context'],
+                               tenant_id=tenant.id)
+        user_info = session.user_info
+        context = session.trail
         
         print("Query:", query)
         print("User Info:", user_info)
         print("Context:", context)
         
-        # Pass the dictionary to the query_faq function
-        respone = converse.converse_pipeline(query, user_info, context)
+        deadline = Deadline(x_request_timeout_ms)
+        
+        with admit_ai_request(tenant) as admitted:
+            if admitted:
+                # Pass the dictionary to the query_faq function
+                respone = await run_until_disconnect(http_request, deadline, converse.converse_pipeline, query, user_info, context,
+                                                     session=session, tenant=tenant)
+                if tenant.is_default:
+                    warmup.record_query(query)
+            else:
+                # Shed under load or over the tenant's quota: serve a cached answer without calling Bedrock
+                respone = fallback_answer(query, cache=tenant.answer_cache)
+
+        session.add_turn(query, respone)
+        session_store.save(session)
 
         return {
             "responseCode": 200,
             "responseMessage": "FAQ query processed successfully",
             "data": {
                 "query": query,
-                "answer": respone
+                "answer": respone,
+                "conversation_id": session.conversation_id,
+                "session_resumed": session.resumed
             }
         }
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+app = create_app()
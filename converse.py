@@ -1,37 +1,30 @@
 import json
-import boto3
-from pinecone import Pinecone
 import uuid
-from dotenv import load_dotenv
 import os
-
-# Load environment variables from .env file (for local development)
-load_dotenv()
-
-# Retrieve AWS credentials from environment variables
-aws_access_key_id = os.getenv("aws_access_key_id")
-aws_secret_access_key = os.getenv("aws_secret_access_key")
-aws_region = "us-east-1"
-
-if aws_secret_access_key is None or aws_access_key_id is None:
-    print("AWS credentials not found in environment variables.")
-    raise ValueError("Please set AWS credentials in the environment variables.")
-
-# Initialize Pinecone connection
-pc = Pinecone(api_key="pcsk_5pEARi_DNbj63Mj7ABLU113t4z64p68KZeFwK5UoYMvRHzjWcGycbb3PUi5WNE1LsZ76vs")
-
-# Initialize Bedrock client
-bedrock = boto3.client(service_name='bedrock-runtime', region_name='us-east-1',aws_access_key_id=aws_access_key_id, aws_secret_access_key=aws_secret_access_key)
-
-# Pinecone index name
-index_name = "farmcredit"
-index = pc.Index(index_name)
+import time
+from rag import metrics, routing
+from rag.answers import ERROR_MESSAGE, fallback_answer
+from rag.clients import EMBEDDING_MODEL_ID, get_bedrock_client, get_vector_index
+from rag.context import format_chunk, record_generation, select_context
+from rag.deadline import DeadlineExceeded, generate_with_deadline
+from rag.embedder import embed_query
+from rag.lexical import RETRIEVAL_CANDIDATES, hybrid_rerank
+from rag.resilience import UpstreamUnavailable, guarded
+from rag.tenants import get_tenant
+
+# Bedrock client and Pinecone index for the configured backend (RAG_BACKEND)
+bedrock = get_bedrock_client()
+index = get_vector_index()
+
+# Fuse vector search with the local BM25 index and re-rank locally
+hybrid_retrieval = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
 
 # Model IDs
-embedding_model_id = "amazon.titan-embed-text-v2:0"
+embedding_model_id = EMBEDDING_MODEL_ID
 generation_model_id = "anthropic.claude-3-5-sonnet-20240620-v1:0"
 
-def retrieve_similar_chunks(query, top_k=3, bedrock=bedrock, embedding_model_id=embedding_model_id, index=index):
+def retrieve_similar_chunks(query, top_k=3, bedrock=bedrock, embedding_model_id=embedding_model_id, index=index, deadline=None,
+                            session=None, tenant=None):
     """
     Embeds the query using Bedrock and retrieves the top_k most similar chunks from Pinecone.
 
@@ -41,58 +34,79 @@ def retrieve_similar_chunks(query, top_k=3, bedrock=bedrock, embedding_model_id=
         bedrock (boto3.client): Bedrock client for embedding.
         embedding_model_id (str): Bedrock model ID for embedding.
         index (pinecone.Index): Pinecone index to query.
+        deadline (Deadline, optional): Request deadline checked before each upstream call.
+        session (Session, optional): The conversation's session. Its last vector search
+            results are re-ranked for this query instead of searching again when the
+            query is on the same topic, and new results are kept in it.
+        tenant (Tenant, optional): Tenant whose FAQ namespace and lexical index to
+            search (default: FarmCredit's own).
 
     Returns:
         list: List of dictionaries containing the top_k chunks with their metadata and scores.
     """
+    tenant = tenant or get_tenant()
     try:
-        # Prepare the input for embedding
-        input_data = {
-            "inputText": query,
-            "dimensions": 512,
-            "normalize": True
-        }
-
-        # Serialize to JSON
-        body = json.dumps(input_data).encode('utf-8')
-
-        # Generate query embedding using Bedrock
-        response = bedrock.invoke_model(
-            modelId=embedding_model_id,
-            contentType="application/json",
-            accept="*/*",
-            body=body
-        )
-
-        response_body = response['body'].read()
-        response_json = json.loads(response_body)
-        query_embedding = response_json['embedding']
-
-        # Query Pinecone for top_k similar chunks
-        query_results = index.query(
-            vector=query_embedding,
-            top_k=top_k,
-            include_metadata=True
-        )
-
-        # Format results as a list of dictionaries
-        retrieved_chunks = [
-            {
-                "id": match["id"],
-                "score": match["score"],
-                "question": match["metadata"]["question"],
-                "answer": match["metadata"]["answer"]
-            }
-            for match in query_results["matches"]
-        ]
+        if deadline is not None:
+            deadline.check("embedding")
+
+        try:
+            # Generate query embedding using Bedrock (shared with concurrent identical queries)
+            query_embedding = embed_query(query, bedrock, embedding_model_id, cache=tenant.embedding_cache, deadline=deadline)
+
+            # Follow-up on the same topic: reuse the conversation's last search results
+            retrieved_chunks = session.reusable_chunks(query_embedding) if session is not None else None
+            if retrieved_chunks is not None:
+                metrics.increment("converse.session.retrieval_reused")
+            else:
+                if deadline is not None:
+                    deadline.check("vector search")
+
+                # Query Pinecone for similar chunks, with extra candidates for re-ranking
+                query_results = guarded(
+                    "pinecone",
+                    deadline,
+                    index.query,
+                    vector=query_embedding,
+                    top_k=max(top_k, RETRIEVAL_CANDIDATES) if hybrid_retrieval else top_k,
+                    include_metadata=True,
+                    namespace=tenant.namespace
+                )
+
+                # Format results as a list of dictionaries
+                retrieved_chunks = [
+                    {
+                        "id": match["id"],
+                        "score": match["score"],
+                        "question": match["metadata"]["question"],
+                        "answer": match["metadata"]["answer"]
+                    }
+                    for match in query_results["matches"]
+                ]
+                if session is not None:
+                    session.remember_retrieval(query_embedding, retrieved_chunks)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if not hybrid_retrieval:
+                raise
+            # Degraded mode: lexical-only retrieval from the local BM25 index
+            print(f"Vector search unavailable ({e}), using lexical retrieval only")
+            metrics.increment("converse.degraded.lexical_retrieval")
+            retrieved_chunks = []
+
+        if hybrid_retrieval:
+            retrieved_chunks = hybrid_rerank(query, retrieved_chunks, top_k, index=tenant.lexical_index())
 
         return retrieved_chunks
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"Error retrieving chunks: {e}")
         raise
 
-def generate_answer(query,conversation_trail,user_info,retrieved_chunks,bedrock=bedrock, generation_model_id=generation_model_id):
+def generate_answer(query,conversation_trail,user_info,retrieved_chunks,bedrock=bedrock, generation_model_id=generation_model_id, deadline=None,
+                    max_tokens=500, pipeline="converse"):
     """
     Generates a final answer using Bedrock based on the query and retrieved chunks.
 
@@ -101,16 +115,16 @@ def generate_answer(query,conversation_trail,user_info,retrieved_chunks,bedrock=
         retrieved_chunks (list): List of retrieved chunks with metadata.
         bedrock (boto3.client): Bedrock client for text generation.
         generation_model_id (str): Bedrock model ID for text generation.
+        deadline (Deadline, optional): Request deadline; generation is streamed and stopped when it expires.
+        max_tokens (int): Output token budget.
+        pipeline (str): Name generation metrics are recorded under.
 
     Returns:
         str: The generated answer.
     """
     try:
         # Format the context from retrieved chunks
-        context = "\n\n".join(
-            f"Q: {chunk['question']}\nA: {chunk['answer']}"
-            for chunk in retrieved_chunks
-        )
+        context = "\n\n".join(format_chunk(chunk) for chunk in retrieved_chunks)
 
         # Create the prompt for the generation model
         prompt = f"""
@@ -148,7 +162,7 @@ Answer:"""
         # Prepare the input for Bedrock text generation
         input_data = {
             "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 500,
+            "max_tokens": max_tokens,
             "temperature": 0.7,
             "messages": [
                 {
@@ -158,6 +172,14 @@ Answer:"""
             ]
         }
 
+        started_at = time.monotonic()
+        if deadline is not None:
+            # Stream so the generation can be abandoned when the deadline passes
+            usage = {}
+            answer = generate_with_deadline(bedrock, generation_model_id, input_data, deadline, usage=usage)
+            record_generation(pipeline, prompt, (time.monotonic() - started_at) * 1000, usage, generation_model_id)
+            return answer.strip()
+
         # Serialize to JSON
         body = json.dumps(input_data).encode('utf-8')
 
@@ -174,32 +196,110 @@ Answer:"""
 
         # Extract the generated answer
         answer = response_json['content'][0]['text']
+        record_generation(pipeline, prompt, (time.monotonic() - started_at) * 1000, response_json.get('usage'), generation_model_id)
 
         return answer.strip()
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"Error generating answer: {e}")
         raise
 
-def converse_pipeline(query, user_info, conversation_trail):
+def converse_pipeline(query, user_info, conversation_trail, deadline=None, session=None, tenant=None):
     """
-    Combines retrieval and generation to answer a query.
+    Routes a conversation turn and answers it: greetings and account lookups from
+    user_info templates, simple turns with the small model and complex turns with
+    the large model. Latency and cost are recorded per route.
 
     Args:
         query (str): The user query.
+        user_info (dict, optional): The signed-in user's details.
+        conversation_trail (list): Previous messages in the conversation.
+        deadline (Deadline, optional): Request deadline. When too little budget is
+            left for generation, a cached or retrieval-only answer is returned.
+        session (Session, optional): The conversation's server-side session, used to
+            reuse retrieval for follow-ups on the same topic.
+        tenant (Tenant, optional): Tenant whose FAQ answers the query (default: FarmCredit's own).
 
     Returns:
         str: The final generated answer.
     """
+    route, intent = routing.classify_turn(query)
+    if intent == routing.SCORE_REASONS and user_info:
+        user_info = with_score_explanation(user_info)
+        if not user_info.get("reason_codes"):
+            # No reason codes for this score: let the model answer
+            route, intent = routing.LARGE, None
+    metrics.increment(f"converse.route.{route}")
+    started_at = time.monotonic()
     try:
-        # Retrieve top 5 similar chunks
-        retrieved_chunks = retrieve_similar_chunks(query, top_k=3)
+        if route in (routing.GREETING, routing.ACCOUNT):
+            return routing.template_answer(route, intent, user_info, (tenant or get_tenant()).name, query)
+        return answer_turn(query, user_info, conversation_trail, route, deadline=deadline, session=session, tenant=tenant)
+    finally:
+        metrics.observe(f"converse.route.{route}.latency_ms", (time.monotonic() - started_at) * 1000)
+
+def with_score_explanation(user_info):
+    """
+    Adds the reason codes cached when the farmer's score was calculated, unless
+    the client sent them. Codes are only used for the score the user_info shows.
+    """
+    if user_info.get("reason_codes"):
+        return user_info
+    import credit_score  # Only loaded for score explanations
+
+    explanation = credit_score.get_explanation(user_info.get("farmer_id"))
+    if explanation is None or explanation["credit_score"] != round(user_info["credit_score"]):
+        return user_info
+    return {**user_info, "credit_rating": explanation["credit_rating"], "reason_codes": explanation["reason_codes"]}
+
+def answer_turn(query, user_info, conversation_trail, route, deadline=None, session=None, tenant=None):
+    """
+    Combines retrieval and generation to answer a query with the model for its route.
+
+    Args:
+        query (str): The user query.
+        user_info (dict, optional): The signed-in user's details.
+        conversation_trail (list): Previous messages in the conversation.
+        route (str): routing.SMALL or routing.LARGE.
+        deadline (Deadline, optional): Request deadline. When too little budget is
+            left for generation, a cached or retrieval-only answer is returned.
+        session (Session, optional): The conversation's server-side session.
+        tenant (Tenant, optional): Tenant whose FAQ answers the query (default: FarmCredit's own).
+
+    Returns:
+        str: The final generated answer.
+    """
+    tenant = tenant or get_tenant()
+    model_id, max_tokens = routing.model_for_route(route)
+    retrieved_chunks = None
+    try:
+        # Retrieve the top 3 chunks and keep only those relevant enough to help
+        retrieved_chunks = retrieve_similar_chunks(query, top_k=3, deadline=deadline, session=session, tenant=tenant)
+        context_chunks = select_context(retrieved_chunks, max_chunks=3, pipeline="converse")
+
+        if deadline is not None and not deadline.allows_generation():
+            print(f"Skipping generation with {deadline.remaining_ms():.0f}ms left")
+            return fallback_answer(query, retrieved_chunks, cache=tenant.answer_cache)
+
         # Generate answer using retrieved chunks
-        answer = generate_answer(query,conversation_trail,user_info,retrieved_chunks)
+        answer = guarded("bedrock_generation", deadline, generate_answer, query,conversation_trail,user_info,context_chunks,
+                         generation_model_id=model_id, deadline=deadline, max_tokens=max_tokens,
+                         pipeline=f"converse.route.{route}")
         return answer
+    except DeadlineExceeded as e:
+        print(f"CONVERSE pipeline stopped: {e}")
+        return fallback_answer(query, retrieved_chunks, cache=tenant.answer_cache)
+    except UpstreamUnavailable as e:
+        # Degraded mode: Bedrock is over quota or failing, answer without generation
+        print(f"CONVERSE pipeline degraded: {e}")
+        metrics.increment("converse.degraded.no_generation")
+        return fallback_answer(query, retrieved_chunks, cache=tenant.answer_cache)
     except Exception as e:
-        print(f"Error in CONVERSE pipeline: {e}")
-        return "Sorry, an error occurred while processing your query. Please try again."
+        print(f"Error in CONVERSE pipeline: {e!r}")
+        metrics.increment("converse.errors")
+        return ERROR_MESSAGE
 
 
 #print(converse_pipeline(query="",user_info=None,conversation_trail=None))
@@ -1,17 +1,37 @@
 import datetime
 import json
+import os
+import threading
+from collections import OrderedDict
 from typing import Dict, Any, List, Optional
 
-def calculate_credit_score(farmer_data: Dict[str, Any]) -> Dict[str, Any]:
+import shared_cache
+from scoring import features as scoring_features
+from scoring import rules as scoring_rules
+from scoring.features import FarmerFeatures
+from scoring.rules import RuleSet
+
+# How long heuristic scores stay in the cross-worker shared cache (when enabled)
+SCORE_CACHE_TTL_SECONDS = float(os.getenv("SCORE_CACHE_TTL_SECONDS", "3600"))
+
+_shared_scores = shared_cache.get_cache("scores", SCORE_CACHE_TTL_SECONDS)
+
+def calculate_credit_score(farmer_data: Dict[str, Any], rules: Optional[RuleSet] = None,
+                           features: Optional[FarmerFeatures] = None) -> Dict[str, Any]:
     """
     Calculate the credit score for a rural farmer based on a traditional model.
     
     Args:
         farmer_data (Dict[str, Any]): JSON containing all relevant farmer data from database
+        rules (RuleSet, optional): Compiled scoring rules, defaults to the active rule table
+        features (FarmerFeatures, optional): Precomputed features, extracted from farmer_data if omitted
         
     Returns:
-        Dict[str, Any]: Credit score results including total score and component scores
+        Dict[str, Any]: Credit score results including total score, component scores and reason codes
     """
+    rules = rules or scoring_rules.get_rules()
+    features = features or scoring_features.get_features(farmer_data)
+    
     # Initialize component scores
     component_scores = {
         "personal_demographic": 0,
@@ -30,19 +50,19 @@ def calculate_credit_score(farmer_data: Dict[str, Any]) -> Dict[str, Any]:
     }
     
     # 1. Personal & Demographic Information (100 points max)
-    component_scores["personal_demographic"] = calculate_personal_demographic_score(farmer_data)
+    component_scores["personal_demographic"] = calculate_personal_demographic_score(features, rules)
     
     # 2. Financial History & Stability (200 points max)
-    component_scores["financial_history"] = calculate_financial_history_score(farmer_data)
+    component_scores["financial_history"] = calculate_financial_history_score(features, rules)
     
     # 3. Loan History (250 points max)
-    component_scores["loan_history"] = calculate_loan_history_score(farmer_data)
+    component_scores["loan_history"] = calculate_loan_history_score(features, rules)
     
     # 4. Agricultural Factors (200 points max)
-    component_scores["agricultural_factors"] = calculate_agricultural_factors_score(farmer_data)
+    component_scores["agricultural_factors"] = calculate_agricultural_factors_score(features, rules)
     
     # 5. Geographical & Environmental (100 points max)
-    component_scores["geographical"] = calculate_geographical_score(farmer_data)
+    component_scores["geographical"] = calculate_geographical_score(features, rules)
     
     # Calculate total raw score (0-850)
     raw_score = sum(component_scores.values())
@@ -57,7 +77,7 @@ def calculate_credit_score(farmer_data: Dict[str, Any]) -> Dict[str, Any]:
     final_score = round(max(min_final, min(max_final, scaled_score)))
     
     # Determine credit rating
-    credit_rating = get_credit_rating(final_score)
+    credit_rating = get_credit_rating(final_score, rules)
     
     # Prepare and return results
     results = {
@@ -66,577 +86,458 @@ def calculate_credit_score(farmer_data: Dict[str, Any]) -> Dict[str, Any]:
         "component_scores": component_scores,
         "max_component_points": max_points,
         "raw_score": raw_score,
-        "max_possible": max_possible
+        "max_possible": max_possible,
+        "rules_version": rules.version,
+        "reason_codes": explain_features(features, rules)
     }
     
     return results
 
-def get_credit_rating(score: int) -> str:
+def get_credit_score(farmer_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Score a farmer with the active rules, reusing a score any worker already
+    computed for the same profile, rule table and day when the shared cache is enabled.
+    """
+    rules = scoring_rules.get_rules()
+    key = f"{scoring_features.profile_fingerprint(farmer_data)}|{rules.fingerprint}|{datetime.date.today().isoformat()}"
+    result = _shared_scores.get(key)
+    if result is None:
+        result = calculate_credit_score(farmer_data, rules)
+        _shared_scores.put(key, result)
+    remember_explanation(farmer_data.get("farmers", {}).get("id"), result)
+    return result
+
+def get_credit_rating(score: int, rules: Optional[RuleSet] = None) -> str:
     """Determine credit rating based on score."""
-    if score >= 750:
-        return "Excellent"
-    elif score >= 670:
-        return "Good"
-    elif score >= 580:
-        return "Fair"
-    elif score >= 500:
-        return "Poor"
-    else:
-        return "Very Poor"
+    rules = rules or scoring_rules.get_rules()
+    return rules.band("credit_rating", score)
 
-def calculate_personal_demographic_score(data: Dict[str, Any]) -> int:
+def calculate_personal_demographic_score(features: FarmerFeatures, rules: Optional[RuleSet] = None) -> int:
     """
     Calculate score for personal and demographic factors.
     Max 100 points.
     """
+    rules = rules or scoring_rules.get_rules()
     score = 0
     
-    # Age factor (0-25 points)
-    age = data.get("farmers", {}).get("age", 0)
-    if age >= 30 and age <= 55:
-        score += 25  # Prime age range
-    elif age > 55 and age <= 65:
-        score += 20
-    elif age > 18 and age < 30:
-        score += 15
-    else:
-        score += 10
+    # Age factor (0-25 points, prime age range 30-55)
+    score += rules.band("age", features.age)
     
     # Experience factor (0-25 points)
-    experience_years = calculate_years_of_experience(data)
-    if experience_years >= 5:
-        score += 25
-    elif experience_years >= 3:
-        score += 20
-    elif experience_years >= 1:
-        score += 15
-    else:
-        score += 5
+    score += rules.band("experience_years", features.experience_years)
     
     # Education level (0-20 points)
-    education = data.get("farmers", {}).get("highest_education", "").lower()
-    if "university" in education or "degree" in education:
-        score += 20
-    elif "college" in education or "diploma" in education:
-        score += 15
-    elif "secondary" in education or "high school" in education:
-        score += 10
-    else:
-        score += 5
+    score += rules.keyword("education", features.highest_education)
     
     # Family support (0-30 points)
-    next_of_kin = data.get("farmer_next_of_kin", [])
-    if len(next_of_kin) > 0:
-        score += 30
+    if features.has_next_of_kin:
+        score += rules.award("next_of_kin")
     
     return min(score, 100)  # Cap at max points
 
-def calculate_years_of_experience(data: Dict[str, Any]) -> float:
-    """Calculate years of experience based on farmers.created_at."""
-    created_at_str = data.get("farmers", {}).get("created_at")
-    if not created_at_str:
-        return 0
-    
-    try:
-        created_at = datetime.datetime.fromisoformat(created_at_str.replace('Z', '+00:00'))
-        now = datetime.datetime.now(datetime.timezone.utc)
-        return (now - created_at).days / 365.25
-    except (ValueError, TypeError):
-        return 0
-
-def calculate_financial_history_score(data: Dict[str, Any]) -> int:
+def calculate_financial_history_score(features: FarmerFeatures, rules: Optional[RuleSet] = None) -> int:
     """
     Calculate score for financial history and stability.
     Max 200 points.
     """
+    rules = rules or scoring_rules.get_rules()
     score = 0
     
     # Wallet balance (0-50 points)
-    wallet_balance = data.get("farmers", {}).get("mobile_wallet_balance", 0)
-    if wallet_balance >= 100000:
-        score += 50
-    elif wallet_balance >= 50000:
-        score += 40
-    elif wallet_balance >= 10000:
-        score += 30
-    elif wallet_balance >= 1000:
-        score += 20
-    elif wallet_balance > 0:
-        score += 10
+    score += rules.band("wallet_balance", features.wallet_balance)
     
     # BVN verification (0-50 points)
-    if data.get("farmers", {}).get("bvn"):
-        score += 50
+    if features.bvn_verified:
+        score += rules.award("bvn_verified")
     
     # Alternative income (0-40 points)
-    if data.get("farmers", {}).get("other_sources_of_income"):
-        score += 40
+    if features.has_alternative_income:
+        score += rules.award("alternative_income")
     
     # Transaction history (0-60 points)
-    transactions = data.get("transaction_history", [])
-    transaction_score = analyze_transactions(transactions)
+    transaction_score = analyze_transactions(features, rules)
     score += transaction_score
     
     return min(score, 200)  # Cap at max points
 
-def analyze_transactions(transactions: List[Dict[str, Any]]) -> int:
+def analyze_transactions(features: FarmerFeatures, rules: Optional[RuleSet] = None) -> int:
     """Analyze transaction history and return a score out of 60."""
-    if not transactions:
+    if not features.transaction_count:
         return 0
         
+    rules = rules or scoring_rules.get_rules()
     score = 0
     
     # Transaction frequency (0-20 points)
-    if len(transactions) >= 10:
-        score += 20
-    elif len(transactions) >= 5:
-        score += 15
-    elif len(transactions) >= 2:
-        score += 10
-    elif len(transactions) == 1:
-        score += 5
-    
-    # Calculate average and variance in transaction amounts
-    amounts = []
-    recent_count = 0
-    now = datetime.datetime.now(datetime.timezone.utc)
-    
-    for tx in transactions:
-        tx_data = tx.get("transaction_data", {})
-        if isinstance(tx_data, str):
-            try:
-                tx_data = json.loads(tx_data)
-            except:
-                tx_data = {}
-                
-        amount = tx_data.get("amount", 0)
-        if amount > 0:
-            amounts.append(amount)
-        
-        # Check recency (transactions in last 3 months)
-        tx_date_str = tx.get("created_at")
-        if tx_date_str:
-            try:
-                tx_date = datetime.datetime.fromisoformat(tx_date_str.replace('Z', '+00:00'))
-                if (now - tx_date).days <= 90:
-                    recent_count += 1
-            except (ValueError, TypeError):
-                pass
+    score += rules.band("transaction_count", features.transaction_count)
     
     # Average transaction amount (0-20 points)
-    if amounts:
-        avg_amount = sum(amounts) / len(amounts)
-        if avg_amount >= 50000:
-            score += 20
-        elif avg_amount >= 10000:
-            score += 15
-        elif avg_amount >= 1000:
-            score += 10
-        else:
-            score += 5
+    if features.avg_transaction_amount is not None:
+        score += rules.band("avg_transaction_amount", features.avg_transaction_amount)
     
-    # Recency of transactions (0-20 points)
-    if recent_count >= 5:
-        score += 20
-    elif recent_count >= 3:
-        score += 15
-    elif recent_count >= 1:
-        score += 10
+    # Recency of transactions in the last 3 months (0-20 points)
+    score += rules.band("recent_transactions", features.recent_transaction_count)
         
     return min(score, 60)  # Cap at max 60 points for transaction analysis
 
-def calculate_loan_history_score(data: Dict[str, Any]) -> int:
+def calculate_loan_history_score(features: FarmerFeatures, rules: Optional[RuleSet] = None) -> int:
     """
     Calculate score for loan history.
     Max 250 points.
     """
+    rules = rules or scoring_rules.get_rules()
     score = 0
     
-    # Get loan applications and contracts
-    loan_applications = data.get("loan_application", [])
-    loan_contracts = data.get("loan_contract", [])
-    loan_repayments = data.get("loan_repayments", [])
-    
     # Process repayment history if there are any loans
-    if loan_contracts:
-        repayment_score = analyze_loan_repayments(loan_contracts, loan_repayments)
+    if features.loan_contract_count:
+        repayment_score = analyze_loan_repayments(features, rules)
         score += repayment_score  # Up to 150 points
     else:
         # No loan history, give partial credit (first-time borrowers)
         score += 75  # Half of the maximum repayment score
     
     # Existing debt load (0-100 points)
-    debt_score = analyze_debt_load(loan_applications)
+    debt_score = analyze_debt_load(features, rules)
     score += debt_score
     
     return min(score, 250)  # Cap at max points
 
-def analyze_loan_repayments(loan_contracts: List[Dict[str, Any]], loan_repayments: List[Dict[str, Any]]) -> int:
+def analyze_loan_repayments(features: FarmerFeatures, rules: Optional[RuleSet] = None) -> int:
     """Analyze loan repayment history and return a score out of 150."""
-    if not loan_contracts or not loan_repayments:
+    if not features.loan_contract_count or not features.loan_repayment_count:
         return 75  # Neutral score for no history
     
+    rules = rules or scoring_rules.get_rules()
     score = 0
     
-    # Map repayments to their contracts
-    contract_repayments = {}
-    for repayment in loan_repayments:
-        contract_id = repayment.get("loan_contract_id")
-        if contract_id:
-            if contract_id not in contract_repayments:
-                contract_repayments[contract_id] = []
-            contract_repayments[contract_id].append(repayment)
-    
-    total_on_time = 0
-    total_repayments = 0
-    days_late_sum = 0
-    fully_repaid_loans = 0
-    
-    # Analyze each contract's repayments
-    for contract in loan_contracts:
-        contract_id = contract.get("id")
-        if not contract_id or contract_id not in contract_repayments:
-            continue
-        
-        repayments = contract_repayments[contract_id]
-        contract_on_time = 0
-        contract_total = len(repayments)
-        contract_days_late = 0
-        all_paid = True
-        
-        for repayment in repayments:
-            due_date_str = repayment.get("due_date")
-            date_paid_str = repayment.get("date_paid")
-            
-            if not due_date_str or not date_paid_str:
-                all_paid = False
-                continue
-                
-            try:
-                due_date = datetime.datetime.fromisoformat(due_date_str.replace('Z', '+00:00'))
-                date_paid = datetime.datetime.fromisoformat(date_paid_str.replace('Z', '+00:00'))
-                
-                if date_paid <= due_date:
-                    contract_on_time += 1
-                else:
-                    days_late = (date_paid - due_date).days
-                    contract_days_late += days_late
-            except (ValueError, TypeError):
-                all_paid = False
-                continue
-        
-        total_on_time += contract_on_time
-        total_repayments += contract_total
-        days_late_sum += contract_days_late
-        
-        if all_paid and contract_total > 0:
-            fully_repaid_loans += 1
-    
     # On-time payment ratio (0-60 points)
-    if total_repayments > 0:
-        on_time_ratio = total_on_time / total_repayments
-        if on_time_ratio >= 0.95:
-            score += 60
-        elif on_time_ratio >= 0.9:
-            score += 50
-        elif on_time_ratio >= 0.8:
-            score += 40
-        elif on_time_ratio >= 0.7:
-            score += 30
-        elif on_time_ratio >= 0.6:
-            score += 20
-        else:
-            score += 10
+    if features.repayment_count > 0:
+        score += rules.band("on_time_ratio", features.on_time_ratio)
     else:
         score += 30  # Neutral score for no repayment history
     
     # Average days late (0-40 points)
-    if total_repayments > 0:
-        avg_days_late = days_late_sum / total_repayments
-        if avg_days_late <= 0:
-            score += 40
-        elif avg_days_late <= 3:
-            score += 30
-        elif avg_days_late <= 7:
-            score += 20
-        elif avg_days_late <= 14:
-            score += 10
-        else:
-            score += 0
+    if features.repayment_count > 0:
+        score += rules.band("avg_days_late", features.avg_days_late)
     else:
         score += 20  # Neutral score for no history
     
-    # Number of fully repaid loans (0-50 points)
-    if fully_repaid_loans >= 3:
-        score += 50
-    elif fully_repaid_loans == 2:
-        score += 40
-    elif fully_repaid_loans == 1:
-        score += 30
-    else:
-        score += 15  # Some credit for no fully repaid loans
+    # Number of fully repaid loans (0-50 points, some credit for none)
+    score += rules.band("fully_repaid_loans", features.fully_repaid_loans)
     
     return min(score, 150)  # Cap at max points
 
-def analyze_debt_load(loan_applications: List[Dict[str, Any]]) -> int:
-    """Analyze existing debt load and return a score out of 100."""
+def analyze_debt_load(features: FarmerFeatures, rules: Optional[RuleSet] = None) -> int:
+    """Analyze existing debt load from the most recent approved application and return a score out of 100."""
+    rules = rules or scoring_rules.get_rules()
     score = 0
     
-    # Find the most recent loan application
-    most_recent = None
-    for application in loan_applications:
-        if application.get("status") == "approved":
-            if most_recent is None:
-                most_recent = application
-            else:
-                app_date_str = application.get("created_at")
-                recent_date_str = most_recent.get("created_at")
-                
-                if app_date_str and recent_date_str:
-                    try:
-                        app_date = datetime.datetime.fromisoformat(app_date_str.replace('Z', '+00:00'))
-                        recent_date = datetime.datetime.fromisoformat(recent_date_str.replace('Z', '+00:00'))
-                        
-                        if app_date > recent_date:
-                            most_recent = application
-                    except (ValueError, TypeError):
-                        pass
-    
-    if most_recent:
-        # Check if there are existing loans
-        has_existing_loans = most_recent.get("existing_loans", False)
-        
-        if not has_existing_loans:
+    if features.has_approved_application:
+        if not features.has_existing_loans:
             # No existing loans, full points
             score += 100
         else:
-            # Existing loans, analyze debt load
-            existing_loan_amount = most_recent.get("total_existing_loan_amount", 0)
-            
             # Without income data, we'll use heuristics based on loan amount
-            if existing_loan_amount <= 10000:
-                score += 80
-            elif existing_loan_amount <= 50000:
-                score += 60
-            elif existing_loan_amount <= 100000:
-                score += 40
-            elif existing_loan_amount <= 200000:
-                score += 20
-            else:
-                score += 0
+            score += rules.band("existing_loan_amount", features.existing_loan_amount)
     else:
         # No loan applications, neutral score
         score += 50
     
     return min(score, 100)  # Cap at max points
 
-def calculate_agricultural_factors_score(data: Dict[str, Any]) -> int:
+def calculate_agricultural_factors_score(features: FarmerFeatures, rules: Optional[RuleSet] = None) -> int:
     """
     Calculate score for agricultural factors.
     Max 200 points.
     """
+    rules = rules or scoring_rules.get_rules()
     score = 0
     
-    farms = data.get("farms", [])
-    farm_production = data.get("farm_production", [])
-    
-    if not farms:
+    if not features.farm_count:
         return 50  # Minimal score if no farm data
     
     # Farm size (0-40 points)
-    total_farm_size = sum(farm.get("size", 0) for farm in farms)
-    if total_farm_size >= 10:
-        score += 40
-    elif total_farm_size >= 5:
-        score += 30
-    elif total_farm_size >= 2:
-        score += 20
-    elif total_farm_size > 0:
-        score += 10
+    score += rules.band("farm_size", features.total_farm_size)
     
     # Crop diversity (0-40 points)
-    crop_types = set()
-    for production in farm_production:
-        crop_type = production.get("type")
-        if crop_type:
-            crop_types.add(crop_type)
-    
-    if len(crop_types) >= 3:
-        score += 40
-    elif len(crop_types) == 2:
-        score += 30
-    elif len(crop_types) == 1:
-        score += 20
+    score += rules.band("crop_diversity", features.crop_diversity)
     
     # Farming experience (0-40 points)
-    farming_experience = calculate_farming_experience(farms)
-    if farming_experience >= 10:
-        score += 40
-    elif farming_experience >= 5:
-        score += 30
-    elif farming_experience >= 2:
-        score += 20
-    elif farming_experience > 0:
-        score += 10
+    score += rules.band("farming_experience", features.farming_experience)
     
     # Production history (0-40 points)
-    production_score = analyze_production_history(farms, farm_production)
+    production_score = analyze_production_history(features, rules)
     score += production_score
     
     # Expected profit margin (0-40 points)
-    profit_score = analyze_profit_margin(farm_production)
+    profit_score = analyze_profit_margin(features, rules)
     score += profit_score
     
     return min(score, 200)  # Cap at max points
 
-def calculate_farming_experience(farms: List[Dict[str, Any]]) -> float:
-    """Calculate years of farming experience from the oldest farm start date."""
-    if not farms:
-        return 0
-    
-    oldest_start_date = None
-    for farm in farms:
-        start_date_str = farm.get("start_date")
-        if not start_date_str:
-            continue
-            
-        try:
-            start_date = datetime.datetime.fromisoformat(start_date_str.replace('Z', '+00:00')).date()
-            if oldest_start_date is None or start_date < oldest_start_date:
-                oldest_start_date = start_date
-        except (ValueError, TypeError):
-            pass
-    
-    if oldest_start_date:
-        now = datetime.datetime.now().date()
-        return (now - oldest_start_date).days / 365.25
-    return 0
-
-def analyze_production_history(farms: List[Dict[str, Any]], 
-                             farm_production: List[Dict[str, Any]]) -> int:
+def analyze_production_history(features: FarmerFeatures, rules: Optional[RuleSet] = None) -> int:
     """Analyze production history and return a score out of 40."""
+    rules = rules or scoring_rules.get_rules()
     score = 0
     
     # Number of successful harvests (0-20 points)
-    total_harvests = sum(farm.get("number_of_harvests", 0) for farm in farms)
-    if total_harvests >= 10:
-        score += 20
-    elif total_harvests >= 5:
-        score += 15
-    elif total_harvests >= 2:
-        score += 10
-    elif total_harvests >= 1:
-        score += 5
+    score += rules.band("total_harvests", features.total_harvests)
     
     # Expected yield (0-20 points)
-    if farm_production:
-        avg_yield = sum(prod.get("expected_yield", 0) for prod in farm_production) / len(farm_production)
-        
-        # Without context for what's a "good" yield, we'll use a heuristic
-        if avg_yield > 0:
-            score += 20  # Any positive expected yield gets full points
+    # Without context for what's a "good" yield, any positive expected yield gets full points
+    if features.avg_expected_yield is not None and features.avg_expected_yield > 0:
+        score += 20
     
     return min(score, 40)  # Cap at max points
 
-def analyze_profit_margin(farm_production: List[Dict[str, Any]]) -> int:
+def analyze_profit_margin(features: FarmerFeatures, rules: Optional[RuleSet] = None) -> int:
     """Analyze expected profit margins and return a score out of 40."""
-    if not farm_production:
+    if not features.production_count or features.avg_profit_margin is None:
         return 0
     
-    profit_margins = []
-    for prod in farm_production:
-        expected_profit = prod.get("expected_unit_profit", 0)
-        if expected_profit > 0:
-            profit_margins.append(expected_profit)
-    
-    if not profit_margins:
-        return 0
+    rules = rules or scoring_rules.get_rules()
     
-    avg_profit_margin = sum(profit_margins) / len(profit_margins)
-    
-    # Score based on average profit margin
-    if avg_profit_margin >= 1000:
-        return 40
-    elif avg_profit_margin >= 500:
-        return 30
-    elif avg_profit_margin >= 100:
-        return 20
-    elif avg_profit_margin > 0:
-        return 10
-    else:
-        return 0
+    # Score based on average positive profit margin
+    return rules.band("avg_profit_margin", features.avg_profit_margin)
 
-def calculate_geographical_score(data: Dict[str, Any]) -> int:
+def calculate_geographical_score(features: FarmerFeatures, rules: Optional[RuleSet] = None) -> int:
     """
-    Calculate score for geographical and environmental factors.
+    Calculate score for geographical and environmental factors from the
+    farmer and farm addresses.
     Max 100 points.
     """
+    rules = rules or scoring_rules.get_rules()
     score = 0
     
-    # Access address information from farms and farmer
-    addresses = []
-    
-    # Get farmer address
-    farmer_address_id = data.get("farmers", {}).get("address_id")
-    if farmer_address_id:
-        for address in data.get("address", []):
-            if address.get("id") == farmer_address_id:
-                addresses.append(address)
-                break
-    
-    # Get farm addresses
-    for farm in data.get("farms", []):
-        farm_address_id = farm.get("address_id")
-        if farm_address_id:
-            for address in data.get("address", []):
-                if address.get("id") == farm_address_id:
-                    addresses.append(address)
-                    break
-    
-    if not addresses:
+    if not features.location_count:
         return 50  # Neutral score if no location data
     
     # Location risk score based on geopolitical zone (0-60 points)
     location_risk_score = 0
-    risk_zones = {
-        # Assign risk scores to different geopolitical zones
-        # This is just a placeholder - replace with actual risk assessments
-        "north central": 45,
-        "north east": 30,  # Higher risk
-        "north west": 40,
-        "south east": 50,
-        "south south": 50,
-        "south west": 60
-    }
+    risk_zones = rules.lookups["geopolitical_zone"]
     
-    zone_scores = []
-    for address in addresses:
-        zone = address.get("geopolitical_zone", "").lower()
-        if zone in risk_zones:
-            zone_scores.append(risk_zones[zone])
+    zone_scores = [risk_zones(zone) for zone in features.geopolitical_zones if zone in risk_zones]
     
     if zone_scores:
         location_risk_score = sum(zone_scores) / len(zone_scores)
     else:
-        location_risk_score = 30  # Default if zone not recognized
+        location_risk_score = risk_zones.default  # Default if zone not recognized
     
     score += location_risk_score
     
     # Proximity to markets based on coordinates (0-40 points)
-    # This is a simplified placeholder - in a real implementation
-    # you would calculate actual distances to known markets
-    has_coordinates = any(
-        address.get("latitude") is not None and address.get("longitude") is not None
-        for address in addresses
-    )
-    
-    if has_coordinates:
-        score += 40  # Full points if coordinates are available
-    else:
-        score += 20  # Partial points otherwise
+    score += calculate_market_proximity_score(features, rules)
     
     return min(score, 100)  # Cap at max points
 
+def calculate_market_proximity_score(features: FarmerFeatures, rules: Optional[RuleSet] = None) -> int:
+    """
+    Score proximity to the nearest known market, averaged over the farm addresses.
+    Max 40 points.
+    """
+    rules = rules or scoring_rules.get_rules()
+    if not features.has_coordinates:
+        return 20  # Partial points without coordinates
+    
+    if features.market_distance_km is None:
+        return 40  # Market dataset unavailable, keep the coordinate-only score
+    
+    return rules.band("market_distance_km", features.market_distance_km)
+
+
+# Reason codes: the label shown for each factor and what the farmer can do to
+# raise its points (None when it isn't something the farmer can change). Only
+# the codes travel with a score; the text is looked up when it is shown.
+REASONS = {
+    "AGE": ("Age", None),
+    "PLATFORM_TENURE": ("Time on FarmCredit", None),
+    "EDUCATION": ("Education level", None),
+    "NEXT_OF_KIN": ("Next of kin", "Add a next of kin to your FarmCredit profile"),
+    "WALLET_BALANCE": ("Wallet balance", "Keep a higher balance in your FarmCredit wallet"),
+    "BVN_VERIFIED": ("BVN verification", "Verify your BVN on FarmCredit"),
+    "ALTERNATIVE_INCOME": ("Other sources of income", "Add your other sources of income to your profile"),
+    "NO_TRANSACTIONS": ("Transaction history", "Use your FarmCredit wallet for your payments"),
+    "TRANSACTION_COUNT": ("Number of transactions", "Use your FarmCredit wallet for more of your payments"),
+    "AVG_TRANSACTION_AMOUNT": ("Average transaction size", None),
+    "RECENT_TRANSACTIONS": ("Transactions in the last 3 months", "Make regular transactions with your wallet"),
+    "NO_REPAYMENT_HISTORY": ("Loan repayment history", "Repay a FarmCredit loan on time to build a history"),
+    "ON_TIME_RATIO": ("On-time repayments", "Pay every instalment on or before its due date"),
+    "AVG_DAYS_LATE": ("Days late on repayments", "Pay overdue instalments as soon as possible"),
+    "FULLY_REPAID_LOANS": ("Fully repaid loans", "Complete the repayments on your current loan"),
+    "NO_LOAN_APPLICATION": ("Existing debt", None),
+    "EXISTING_LOAN_AMOUNT": ("Existing debt", "Pay down your existing loans"),
+    "NO_FARMS": ("Farm records", "Register your farms on FarmCredit"),
+    "FARM_SIZE": ("Total farm size", None),
+    "CROP_DIVERSITY": ("Crop variety", "Grow and record more than one type of crop"),
+    "FARMING_EXPERIENCE": ("Farming experience", None),
+    "TOTAL_HARVESTS": ("Recorded harvests", "Record each harvest on your farms"),
+    "EXPECTED_YIELD": ("Expected yield", "Record the expected yield of your crops"),
+    "PROFIT_MARGIN": ("Expected profit per unit", "Record the expected profit of your crops"),
+    "NO_LOCATION": ("Address details", "Add your home and farm addresses"),
+    "GEOPOLITICAL_ZONE": ("Location risk", None),
+    "NO_COORDINATES": ("Market access", "Add GPS coordinates to your farm addresses"),
+    "MARKET_DISTANCE": ("Distance to the nearest market", None),
+}
+
+# Entries kept in the in-process cache of explanations by farmer id
+EXPLANATION_CACHE_SIZE = int(os.getenv("EXPLANATION_CACHE_SIZE", "10000"))
+
+
+def _reason(code: str, component: str, points: Any, max_points: Any, value: Any = None,
+            band: Optional[str] = None, next_band: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "code": code,
+        "component": component,
+        "value": round(value, 2) if isinstance(value, float) else value,
+        "points": points,
+        "max_points": max_points,
+        "band": band,
+        "next": next_band,
+    }
+
+
+def _gain(reason: Dict[str, Any]) -> Any:
+    """Points the next band (or the factor's maximum) would add."""
+    return (reason["next"]["points"] if reason["next"] else reason["max_points"]) - reason["points"]
+
+
+def _band_reason(code: str, component: str, rules: RuleSet, name: str, value: float,
+                 max_points: Optional[Any] = None) -> Dict[str, Any]:
+    table = rules.bands[name]
+    band = table.band(value)
+    better = table.better[band]
+    next_band = {"band": table.descriptions[better], "points": table.points_at(better)} if better is not None else None
+    return _reason(code, component, table.points_at(band), max_points if max_points is not None else table.max_points,
+                   value, table.descriptions[band], next_band)
+
+
+def _award_reason(code: str, component: str, rules: RuleSet, name: str, earned: bool) -> Dict[str, Any]:
+    points = rules.award(name)
+    return _reason(code, component, points if earned else 0, points, earned)
+
+
+def explain_features(features: FarmerFeatures, rules: Optional[RuleSet] = None) -> List[Dict[str, Any]]:
+    """
+    Record the band each scoring factor landed in and what would move it up.
+
+    Mirrors the component calculations above factor by factor, so it costs a
+    few table lookups per score.
+
+    Args:
+        features (FarmerFeatures): The farmer's feature vector
+        rules (RuleSet, optional): Compiled scoring rules, defaults to the active rule table
+
+    Returns:
+        List[Dict[str, Any]]: Reason codes, those with the most points to gain first
+    """
+    rules = rules or scoring_rules.get_rules()
+    reasons = []
+
+    # Personal & demographic
+    reasons.append(_band_reason("AGE", "personal_demographic", rules, "age", features.age))
+    reasons.append(_band_reason("PLATFORM_TENURE", "personal_demographic", rules, "experience_years", features.experience_years))
+    education = rules.keywords["education"]
+    reasons.append(_reason("EDUCATION", "personal_demographic", education(features.highest_education),
+                           max([education.default] + [points for _, points in education.rules]),
+                           features.highest_education))
+    reasons.append(_award_reason("NEXT_OF_KIN", "personal_demographic", rules, "next_of_kin", features.has_next_of_kin))
+
+    # Financial history
+    reasons.append(_band_reason("WALLET_BALANCE", "financial_history", rules, "wallet_balance", features.wallet_balance))
+    reasons.append(_award_reason("BVN_VERIFIED", "financial_history", rules, "bvn_verified", features.bvn_verified))
+    reasons.append(_award_reason("ALTERNATIVE_INCOME", "financial_history", rules, "alternative_income",
+                                 features.has_alternative_income))
+    if features.transaction_count:
+        reasons.append(_band_reason("TRANSACTION_COUNT", "financial_history", rules, "transaction_count",
+                                    features.transaction_count))
+        if features.avg_transaction_amount is not None:
+            reasons.append(_band_reason("AVG_TRANSACTION_AMOUNT", "financial_history", rules, "avg_transaction_amount",
+                                        features.avg_transaction_amount))
+        reasons.append(_band_reason("RECENT_TRANSACTIONS", "financial_history", rules, "recent_transactions",
+                                    features.recent_transaction_count))
+    else:
+        reasons.append(_reason("NO_TRANSACTIONS", "financial_history", 0, 60, 0))
+
+    # Loan history
+    if features.loan_contract_count and features.loan_repayment_count and features.repayment_count:
+        reasons.append(_band_reason("ON_TIME_RATIO", "loan_history", rules, "on_time_ratio", features.on_time_ratio))
+        reasons.append(_band_reason("AVG_DAYS_LATE", "loan_history", rules, "avg_days_late", features.avg_days_late))
+        reasons.append(_band_reason("FULLY_REPAID_LOANS", "loan_history", rules, "fully_repaid_loans",
+                                    features.fully_repaid_loans))
+    else:
+        reasons.append(_reason("NO_REPAYMENT_HISTORY", "loan_history", analyze_loan_repayments(features, rules), 150))
+    if not features.has_approved_application:
+        reasons.append(_reason("NO_LOAN_APPLICATION", "loan_history", 50, 100))
+    elif features.has_existing_loans:
+        reasons.append(_band_reason("EXISTING_LOAN_AMOUNT", "loan_history", rules, "existing_loan_amount",
+                                    features.existing_loan_amount, max_points=100))
+
+    # Agricultural factors
+    if not features.farm_count:
+        reasons.append(_reason("NO_FARMS", "agricultural_factors", 50, 200))
+    else:
+        reasons.append(_band_reason("FARM_SIZE", "agricultural_factors", rules, "farm_size", features.total_farm_size))
+        reasons.append(_band_reason("CROP_DIVERSITY", "agricultural_factors", rules, "crop_diversity",
+                                    features.crop_diversity))
+        reasons.append(_band_reason("FARMING_EXPERIENCE", "agricultural_factors", rules, "farming_experience",
+                                    features.farming_experience))
+        reasons.append(_band_reason("TOTAL_HARVESTS", "agricultural_factors", rules, "total_harvests",
+                                    features.total_harvests))
+        has_yield = features.avg_expected_yield is not None and features.avg_expected_yield > 0
+        reasons.append(_reason("EXPECTED_YIELD", "agricultural_factors", 20 if has_yield else 0, 20,
+                               features.avg_expected_yield))
+        if features.production_count and features.avg_profit_margin is not None:
+            reasons.append(_band_reason("PROFIT_MARGIN", "agricultural_factors", rules, "avg_profit_margin",
+                                        features.avg_profit_margin))
+        else:
+            reasons.append(_reason("PROFIT_MARGIN", "agricultural_factors", 0, rules.bands["avg_profit_margin"].max_points))
+
+    # Geographical
+    if not features.location_count:
+        reasons.append(_reason("NO_LOCATION", "geographical", 50, 100))
+    else:
+        risk_zones = rules.lookups["geopolitical_zone"]
+        zone_scores = [risk_zones(zone) for zone in features.geopolitical_zones if zone in risk_zones]
+        reasons.append(_reason("GEOPOLITICAL_ZONE", "geographical",
+                               sum(zone_scores) / len(zone_scores) if zone_scores else risk_zones.default,
+                               max([risk_zones.default] + list(risk_zones.values.values())),
+                               ", ".join(features.geopolitical_zones)))
+        if not features.has_coordinates:
+            reasons.append(_reason("NO_COORDINATES", "geographical", 20, 40))
+        elif features.market_distance_km is not None:
+            reasons.append(_band_reason("MARKET_DISTANCE", "geographical", rules, "market_distance_km",
+                                        features.market_distance_km))
+
+    reasons.sort(key=_gain, reverse=True)
+    return reasons
+
+
+_explanations: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_explanations_lock = threading.Lock()
+_shared_explanations = shared_cache.get_cache("explanations", SCORE_CACHE_TTL_SECONDS)
+
+
+def remember_explanation(farmer_id: Optional[str], result: Dict[str, Any]) -> None:
+    """Keep a farmer's latest score and reason codes for /converse to explain."""
+    if not farmer_id or "reason_codes" not in result:
+        return
+    explanation = {key: result[key] for key in ("credit_score", "credit_rating", "reason_codes")}
+    with _explanations_lock:
+        _explanations[farmer_id] = explanation
+        _explanations.move_to_end(farmer_id)
+        while len(_explanations) > EXPLANATION_CACHE_SIZE:
+            _explanations.popitem(last=False)
+    _shared_explanations.put(farmer_id, explanation)
+
+
+def get_explanation(farmer_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """The last score and reason codes computed for a farmer, if still cached."""
+    if not farmer_id:
+        return None
+    with _explanations_lock:
+        explanation = _explanations.get(farmer_id)
+    return explanation if explanation is not None else _shared_explanations.get(farmer_id)
+
 
 def process_farmer_credit_score(farmer_data_json: str) -> Dict[str, Any]:
     """
@@ -657,6 +558,49 @@ def process_farmer_credit_score(farmer_data_json: str) -> Dict[str, Any]:
         return {"error": f"Error calculating credit score: {str(e)}"}
 
 
+def compare_rule_versions(farmers: List[Dict[str, Any]], rules_a: RuleSet, rules_b: RuleSet) -> Dict[str, Any]:
+    """
+    Score the same batch of farmers under two rule versions in a single pass.
+
+    Args:
+        farmers (List[Dict[str, Any]]): Farmer data dictionaries
+        rules_a (RuleSet): Baseline rule version
+        rules_b (RuleSet): Candidate rule version
+
+    Returns:
+        Dict[str, Any]: Per-farmer score pairs and a summary of the differences
+    """
+    results = []
+    total_delta = 0
+    rating_changes = 0
+
+    for farmer_data in farmers:
+        # Extract features once and evaluate both rule versions against them
+        features = scoring_features.get_features(farmer_data)
+        result_a = calculate_credit_score(farmer_data, rules_a, features)
+        result_b = calculate_credit_score(farmer_data, rules_b, features)
+        delta = result_b["credit_score"] - result_a["credit_score"]
+        total_delta += delta
+        if result_a["credit_rating"] != result_b["credit_rating"]:
+            rating_changes += 1
+
+        results.append({
+            "farmer_id": features.farmer_id,
+            "a": result_a,
+            "b": result_b,
+            "delta": delta
+        })
+
+    return {
+        "version_a": rules_a.version,
+        "version_b": rules_b.version,
+        "count": len(results),
+        "mean_delta": total_delta / len(results) if results else 0,
+        "rating_changes": rating_changes,
+        "results": results
+    }
+
+
 # Example usage
 if __name__ == "__main__":
     # This is just a sample - replace with actual data
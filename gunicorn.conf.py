@@ -0,0 +1,62 @@
+import os
+
+# Production server profile: gunicorn -c gunicorn.conf.py controller:app
+#
+# The app is imported and preloaded once in the master, then forked into one
+# Uvicorn worker per available CPU. Workers share the loaded rule tables, FAQ
+# index and clients copy-on-write, share scores, embeddings and FAQ answers
+# through the local shared cache, and are recycled gracefully after a number
+# of requests.
+
+
+def container_cpus():
+    """CPUs available to this container: the cgroup CPU quota if set, else the CPU affinity."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0:
+            return max(1, quota // period)
+    except (OSError, ValueError):
+        pass
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(container_cpus())))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Import the app before forking so workers start with everything loaded
+preload_app = True
+
+# Recycle each worker after this many requests (jittered so they don't all restart
+# together), letting in-flight requests finish within graceful_timeout
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# Settings read by the app when it is imported (below, before forking)
+os.environ.setdefault("APP_DEBUG", "false")
+os.environ.setdefault("SHARED_CACHE", "true")
+os.environ["SERVER_WORKERS"] = str(workers)
+
+
+def on_starting(server):
+    import controller
+
+    controller.preload()
+    server.log.info("Preloaded app data and clients for %d workers", workers)
+
+
+def post_fork(server, worker):
+    server.log.info("Worker %s started", worker.pid)
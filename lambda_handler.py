@@ -0,0 +1,182 @@
+import json
+import os
+import sys
+import time
+
+# AWS Lambda entry points. Deploy one function per route group so that cold
+# starts only load what the function serves:
+#
+#   lambda_handler.scoring_handler   /calculate_credit_score (no boto3, Pinecone or RAG modules)
+#   lambda_handler.ai_handler        /query_faq and /converse
+#   lambda_handler.handler           all routes in one function
+#
+# The app for the configured handler (Lambda's _HANDLER) is built and preloaded
+# during the init phase, which runs at full CPU and is what SnapStart snapshots;
+# connections are dropped again after a snapshot restore. Import timing for the
+# cold start is logged as one JSON line.
+
+_started = time.perf_counter()
+
+# Modules whose cold-start import time is reported individually, e.g. "rag.querying";
+# everything else is reported under its top-level package
+REPORTED_MODULE_PREFIXES = ("rag.", "scoring.", "models.")
+
+# Packages listed in the cold-start report, slowest first
+COLD_START_REPORT_TOP = int(os.getenv("COLD_START_REPORT_TOP", "15"))
+
+
+class _TimedLoader:
+    """Wraps a module loader to time module execution."""
+
+    def __init__(self, loader, timer):
+        self._loader = loader
+        self._timer = timer
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._timer.enter()
+        started = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer.exit(module.__name__, (time.perf_counter() - started) * 1000)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class ImportTimer:
+    """
+    Records the time spent importing each module (excluding the modules it
+    imports in turn), like ``python -X importtime``, while it is installed.
+    """
+
+    def __init__(self):
+        self.self_ms = {}
+        self.child_ms = [0.0]
+
+    def enter(self):
+        self.child_ms.append(0.0)
+
+    def exit(self, name, cumulative_ms):
+        children = self.child_ms.pop()
+        self.self_ms[name] = self.self_ms.get(name, 0.0) + cumulative_ms - children
+        self.child_ms[-1] += cumulative_ms
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def by_package(self):
+        """Import time in ms grouped by top-level package (or by module for this repo's packages)."""
+        totals = {}
+        for name, ms in self.self_ms.items():
+            key = name if name.startswith(REPORTED_MODULE_PREFIXES) else name.split(".")[0]
+            totals[key] = totals.get(key, 0.0) + ms
+        return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+_timer = ImportTimer()
+_timer.install()
+
+_handlers = {}
+
+# Route groups served by each entry point
+_ROUTES = {"handler": ("scoring", "ai"), "scoring_handler": ("scoring",), "ai_handler": ("ai",)}
+
+
+def _report(handler_name, routes, init_ms):
+    imports = _timer.by_package()
+    print(json.dumps({
+        "event": "cold_start",
+        "handler": handler_name,
+        "routes": list(routes),
+        "init_ms": round(init_ms, 1),
+        "import_ms": round(sum(imports.values()), 1),
+        "modules_imported": len(_timer.self_ms),
+        "slowest_imports_ms": {name: round(ms, 1) for name, ms in list(imports.items())[:COLD_START_REPORT_TOP]},
+    }))
+
+
+def _build(handler_name, routes):
+    """Build, preload and wrap the app for a route group on first use."""
+    if handler_name in _handlers:
+        return _handlers[handler_name]
+
+    os.environ.setdefault("APP_DEBUG", "false")
+    started = time.perf_counter()
+    from mangum import Mangum
+    import controller
+
+    import warmup
+
+    # Lambda runs no lifespan: warm up in the init phase instead, without keep-alive
+    # pings (the environment is frozen between invocations)
+    if warmup.STARTUP_WARMUP:
+        warmup.warm_up.run(routes)
+    else:
+        controller.preload(routes)
+    _handlers[handler_name] = Mangum(controller.create_app(routes), lifespan="off")
+
+    _timer.uninstall()
+    _report(handler_name, routes, (time.perf_counter() - started) * 1000)
+    return _handlers[handler_name]
+
+
+def _before_snapshot():
+    print(json.dumps({"event": "before_snapshot", "handlers": list(_handlers)}))
+
+
+def _after_restore():
+    # The snapshot may be restored into many environments: drop its connections
+    # and reseed randomness so environments don't share state
+    import random
+    random.seed()
+    if "rag.clients" in sys.modules:
+        sys.modules["rag.clients"].reset_connections()
+    print(json.dumps({"event": "after_restore", "handlers": list(_handlers)}))
+
+
+try:
+    # Runtime hooks, only available on Lambda with SnapStart
+    from snapshot_restore_py import register_after_restore, register_before_snapshot
+except ImportError:
+    pass
+else:
+    register_before_snapshot(_before_snapshot)
+    register_after_restore(_after_restore)
+
+
+def handler(event, context):
+    return _build("handler", _ROUTES["handler"])(event, context)
+
+
+def scoring_handler(event, context):
+    return _build("scoring_handler", _ROUTES["scoring_handler"])(event, context)
+
+
+def ai_handler(event, context):
+    return _build("ai_handler", _ROUTES["ai_handler"])(event, context)
+
+
+# Build the configured handler during the init phase rather than on the first invocation
+_configured = os.getenv("_HANDLER", "").rpartition(".")[2]
+if _configured in _ROUTES:
+    _build(_configured, _ROUTES[_configured])
+    print(json.dumps({"event": "init", "handler": _configured, "total_init_ms": round((time.perf_counter() - _started) * 1000, 1)}))
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 from datetime import datetime
 
 class Farmer(BaseModel):
@@ -11,6 +11,7 @@ class Farmer(BaseModel):
     mobile_wallet_balance: float
     bvn: str
     other_sources_of_income: str
+    address_id: Optional[str] = None
 
 class FarmerNextOfKin(BaseModel):
     id: str
@@ -23,6 +24,7 @@ class Farm(BaseModel):
     size: float
     start_date: datetime
     number_of_harvests: int
+    address_id: Optional[str] = None
 
 class FarmProduction(BaseModel):
     id: str
@@ -79,6 +81,12 @@ class CreditScoreRequestModel(BaseModel):
     loan_repayments: List[LoanRepayment]
     transaction_history: List[TransactionHistory]
 
+class CreditScoreJobRequestModel(BaseModel):
+    # Either the profiles themselves or a JSON lines file of them under JOBS_INPUT_DIR
+    farmers: Optional[List[CreditScoreRequestModel]] = None
+    file: Optional[str] = None
+    chunk_size: Optional[int] = None
+
 class QueryFAQRequestModel(BaseModel):
     query: str
 
@@ -87,6 +95,9 @@ class UserInfo(BaseModel):
     wallet_balance: float
     available_loans: List[LoanContract]
     credit_score: float
+    # Used to find the reason codes of the farmer's last score, or sent as returned by /calculate_credit_score
+    farmer_id: Optional[str] = None
+    reason_codes: Optional[List[Dict[str, Any]]] = None
 
 class Context(BaseModel):
     message_position: int
@@ -94,6 +105,9 @@ class Context(BaseModel):
     message: str
 
 class ConversationRequestModel(BaseModel):
-    user_info: Optional[UserInfo]
+    # Returned with each answer; when sent, user_info and context can be left out
+    # and the server's copies for the conversation are used
+    conversation_id: Optional[str] = None
+    user_info: Optional[UserInfo] = None
     query: str
-    context: List[Context]
+    context: List[Context] = []
@@ -0,0 +1,387 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+
+import numpy as np
+
+from rag import metrics
+from rag.answers import normalize_query
+from rag.corpus import corpus_fingerprint, faq_chunks_path, load_faq_chunks
+from rag.deadline import DeadlineExceeded
+
+# Precomputed FAQ question embeddings, written next to the lexical index at ingest time
+DEFAULT_ANSWER_INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "faq_answer_index.npz")
+
+# Where a server that had to embed the FAQ questions itself keeps the result, so other
+# workers and restarts load it instead of embedding them again ("": don't keep it)
+ANSWER_INDEX_CACHE_DIR = os.getenv(
+    "ANSWER_INDEX_CACHE_DIR",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "farmcredit-answer-index")
+)
+
+# Answer /query_faq queries that are an FAQ question, or a close paraphrase of one,
+# with the FAQ's answer instead of retrieval and generation
+FAQ_FAST_PATH = os.getenv("FAQ_FAST_PATH", "true").lower() == "true"
+FAQ_MATCH_SIMILARITY = float(os.getenv("FAQ_MATCH_SIMILARITY", "0.92"))
+
+# How often the FAQ corpus file is checked for changes
+FAQ_INDEX_CHECK_SECONDS = float(os.getenv("FAQ_INDEX_CHECK_SECONDS", "60"))
+
+# Weight of each new full-pipeline latency in the average the savings are estimated from
+LATENCY_SMOOTHING = 0.1
+
+
+def answer_index_path():
+    return os.getenv("ANSWER_INDEX_PATH", DEFAULT_ANSWER_INDEX_PATH)
+
+
+class AnswerIndex:
+    """
+    FAQ answers looked up by normalized question text, or by the embedding of a
+    query close enough to an FAQ question's.
+    """
+
+    def __init__(self, chunks, fingerprint, embeddings=None, embedding_model_id=None):
+        self.questions = [chunk["question"] for chunk in chunks]
+        self.answers = [chunk["answer"] for chunk in chunks]
+        self.fingerprint = fingerprint
+        self.embedding_model_id = embedding_model_id
+        self.exact = {}
+        for i, question in enumerate(self.questions):
+            self.exact.setdefault(normalize_query(question), i)
+        self.embeddings = None
+        if embeddings is not None:
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            self.embeddings = embeddings / np.where(norms == 0, 1, norms)
+
+    @classmethod
+    def build(cls, chunks, embed, embedding_model_id):
+        """
+        Builds the index, embedding each FAQ question the way queries are embedded.
+
+        Args:
+            chunks (list): List of dictionaries containing 'question' and 'answer' keys.
+            embed (callable): Returns the embedding of a text.
+            embedding_model_id (str): Model the embeddings come from.
+
+        Returns:
+            AnswerIndex: The index.
+        """
+        embeddings = [embed(chunk["question"]) for chunk in chunks]
+        return cls(chunks, corpus_fingerprint(chunks), embeddings, embedding_model_id)
+
+    def match_exact(self, query):
+        """Position of the FAQ whose normalized question is the query, or None."""
+        return self.exact.get(normalize_query(query))
+
+    def match_similar(self, query_embedding, threshold=FAQ_MATCH_SIMILARITY):
+        """
+        Position and cosine similarity of the FAQ question most similar to the
+        query, or (None, similarity) if it is below the threshold.
+        """
+        if self.embeddings is None or not len(self.embeddings):
+            return None, 0.0
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        if vector.shape[0] != self.embeddings.shape[1]:
+            return None, 0.0
+        norm = float(np.linalg.norm(vector))
+        if norm == 0:
+            return None, 0.0
+        similarities = self.embeddings @ (vector / norm)
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        return (best if similarity >= threshold else None), similarity
+
+    def save(self, path):
+        """Writes the index next to `path` and moves it into place, so readers never see a partial file."""
+        meta = {"fingerprint": self.fingerprint, "embedding_model_id": self.embedding_model_id,
+                "dimensions": int(self.embeddings.shape[1])}
+        temp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            with open(temp_path, "wb") as f:
+                np.savez(f, embeddings=self.embeddings, meta=np.array(json.dumps(meta)))
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path, chunks, embedding_model_id, dimensions=None):
+        """
+        Loads the embeddings written for these chunks, embedding model and (if given)
+        embedding length, or returns None if the file is missing or was written for
+        other ones.
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            embeddings = data["embeddings"]
+        fingerprint = corpus_fingerprint(chunks)
+        if meta["fingerprint"] != fingerprint or meta["embedding_model_id"] != embedding_model_id \
+                or len(embeddings) != len(chunks) or (dimensions is not None and embeddings.shape[1] != dimensions):
+            return None
+        return cls(chunks, fingerprint, embeddings, embedding_model_id)
+
+
+class _IndexSource:
+    """
+    Keeps the answer index for one FAQ corpus current: loads the file written at
+    ingest time, or rebuilds it in the background when the corpus changes.
+    """
+
+    def __init__(self, corpus_path=None, index_path=None):
+        self.corpus_path = corpus_path
+        self.index_path = index_path
+        self.index = None
+        self.lock = threading.Lock()
+        self.corpus_mtime = None
+        self.checked_at = 0.0
+        self.building = None
+
+    def get(self):
+        if self.index is None or time.monotonic() - self.checked_at >= FAQ_INDEX_CHECK_SECONDS:
+            if self.lock.acquire(blocking=self.index is None):
+                try:
+                    if self.index is None or time.monotonic() - self.checked_at >= FAQ_INDEX_CHECK_SECONDS:
+                        self._refresh()
+                finally:
+                    self.lock.release()
+        return self.index
+
+    def set(self, index):
+        with self.lock:
+            self.index = index
+            self.checked_at = time.monotonic()
+
+    def _cache_path(self):
+        """Where this server keeps an index it built itself (None: ANSWER_INDEX_CACHE_DIR is off)."""
+        if not ANSWER_INDEX_CACHE_DIR:
+            return None
+        key = hashlib.blake2b(os.path.abspath(self.index_path or answer_index_path()).encode("utf-8"), digest_size=8).hexdigest()
+        return os.path.join(ANSWER_INDEX_CACHE_DIR, f"faq_answer_index-{key}.npz")
+
+    def _load(self, chunks, model_id):
+        """The index written at ingest time, or else one this server built earlier, for these chunks."""
+        from rag.clients import EMBEDDING_DIMENSIONS
+        for path in (self.index_path or answer_index_path(), self._cache_path()):
+            if path is None:
+                continue
+            try:
+                loaded = AnswerIndex.load(path, chunks, model_id, EMBEDDING_DIMENSIONS)
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+                print(f"Could not read the FAQ answer index {path} ({e})")
+                continue
+            if loaded is not None:
+                return loaded
+        return None
+
+    def _build_embeddings(self, chunks, fingerprint):
+        """Embeds the FAQ questions in the background and swaps in the completed index."""
+        try:
+            embed, model_id = _embedder()
+            index = AnswerIndex.build(chunks, embed, model_id)
+            cache_path = self._cache_path()
+            if cache_path is not None:
+                try:
+                    os.makedirs(ANSWER_INDEX_CACHE_DIR, exist_ok=True)
+                    index.save(cache_path)
+                except OSError as e:
+                    print(f"Could not write the FAQ answer index ({e})")
+            with self.lock:
+                if self.index is None or self.index.fingerprint == fingerprint:
+                    self.index = index
+            print(f"FAQ answer index built for {len(chunks)} questions")
+        except Exception as e:
+            # Exact matches keep working; embeddings are retried at the next corpus check
+            print(f"Could not embed FAQ questions for the answer index ({e})")
+        finally:
+            with self.lock:
+                self.building = None
+
+    def _refresh(self):
+        self.checked_at = time.monotonic()
+        path = self.corpus_path or faq_chunks_path()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError as e:
+            print(f"FAQ corpus unavailable for the answer index ({e})")
+            return
+        index = self.index
+        if index is not None and mtime == self.corpus_mtime and (index.embeddings is not None or self.building):
+            return
+
+        chunks = load_faq_chunks(path)
+        fingerprint = corpus_fingerprint(chunks)
+        self.corpus_mtime = mtime
+        if index is not None and index.fingerprint == fingerprint and index.embeddings is not None:
+            return
+
+        _, model_id = _embedder()
+        loaded = self._load(chunks, model_id)
+        if loaded is not None:
+            self.index = loaded
+            return
+
+        # Serve exact matches right away while the questions are embedded
+        if index is None or index.fingerprint != fingerprint:
+            if index is not None:
+                metrics.increment("faq.fast_path.rebuilds")
+            self.index = AnswerIndex(chunks, fingerprint)
+        if self.building is None:
+            self.building = threading.Thread(target=self._build_embeddings, args=(chunks, fingerprint), daemon=True)
+            self.building.start()
+
+    def after_fork(self):
+        # A background build does not survive a fork; workers check the corpus and start their own
+        self.lock, self.building, self.checked_at = threading.Lock(), None, 0.0
+
+
+# Answer index sources by (corpus path, index path); (None, None) is FarmCredit's own FAQ
+_sources = {}
+_sources_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {"exact": 0, "similar": 0, "misses": 0, "saved_ms": 0.0, "full_pipeline_ms": None}
+
+
+def _embedder():
+    from rag.clients import EMBEDDING_MODEL_ID, get_bedrock_client
+    from rag.embedder import embed_query
+    bedrock = get_bedrock_client()
+    return (lambda text: embed_query(text, bedrock, EMBEDDING_MODEL_ID)), EMBEDDING_MODEL_ID
+
+
+def _source(tenant=None):
+    key = (tenant.faq_chunks_path, tenant.answer_index_path) if tenant is not None else (None, None)
+    source = _sources.get(key)
+    if source is None:
+        with _sources_lock:
+            source = _sources.setdefault(key, _IndexSource(*key))
+    return source
+
+
+def _after_fork():
+    global _sources_lock
+    _sources_lock = threading.Lock()
+    for source in _sources.values():
+        source.after_fork()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def get_answer_index(tenant=None):
+    """
+    Returns the answer index for a tenant's FAQ (default: FarmCredit's own), loading
+    the file written at ingest time or building it from the FAQ corpus, and
+    rebuilding it when the corpus changes.
+    """
+    return _source(tenant).get()
+
+
+def wait_for_answer_index(tenant=None, timeout=None):
+    """
+    Loads a tenant's answer index (default: FarmCredit's own) and waits up to `timeout`
+    seconds for a background build of its embeddings to finish.
+
+    Returns:
+        bool: Whether the index can match paraphrases (has embeddings).
+    """
+    source = _source(tenant)
+    source.get()
+    building = source.building
+    if building is not None:
+        building.join(timeout)
+    index = source.index
+    return index is not None and index.embeddings is not None
+
+
+def set_answer_index(index, tenant=None):
+    """Replaces a tenant's answer index (default: FarmCredit's own), e.g. after re-ingestion."""
+    _source(tenant).set(index)
+
+
+def lookup_faq_answer(query, embed, deadline=None, tenant=None):
+    """
+    Answers a query that is an FAQ question, or a close paraphrase of one, with the
+    FAQ's answer.
+
+    Args:
+        query (str): The user query.
+        embed (callable): Returns the query's embedding; only called if there is no exact match.
+        deadline (Deadline, optional): Request deadline checked before embedding.
+        tenant (Tenant, optional): Tenant whose FAQ to match (default: FarmCredit's own).
+
+    Returns:
+        tuple: (answer or None, the query embedding if it was computed). The embedding
+            is passed on to retrieval so the query isn't embedded twice.
+    """
+    if not FAQ_FAST_PATH:
+        return None, None
+    started_at = time.monotonic()
+    index = get_answer_index(tenant)
+    if index is None:
+        return None, None
+
+    match, kind, query_embedding = index.match_exact(query), "exact", None
+    if match is None and index.embeddings is not None:
+        if deadline is not None:
+            deadline.check("embedding")
+        try:
+            query_embedding = embed()
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"FAQ fast path skipped ({e})")
+            return None, None
+        match, similarity = index.match_similar(query_embedding)
+        kind = "similar"
+        metrics.observe("faq.fast_path.similarity_pct", similarity * 100, buckets=(50, 60, 70, 80, 85, 90, 92, 95, 98, 100))
+
+    if match is None:
+        with _stats_lock:
+            _stats["misses"] += 1
+        metrics.increment("faq.fast_path.miss")
+        return None, query_embedding
+
+    elapsed_ms = (time.monotonic() - started_at) * 1000
+    with _stats_lock:
+        _stats[kind] += 1
+        if _stats["full_pipeline_ms"] is not None:
+            _stats["saved_ms"] += max(0.0, _stats["full_pipeline_ms"] - elapsed_ms)
+    metrics.increment(f"faq.fast_path.{kind}")
+    metrics.observe("faq.fast_path.latency_ms", elapsed_ms)
+    return index.answers[match], query_embedding
+
+
+def record_full_answer(latency_ms):
+    """Records the latency of a retrieved and generated answer, which the fast path saves."""
+    with _stats_lock:
+        average = _stats["full_pipeline_ms"]
+        _stats["full_pipeline_ms"] = latency_ms if average is None else average + LATENCY_SMOOTHING * (latency_ms - average)
+
+
+def get_answer_index_stats():
+    index = _source().index
+    with _stats_lock:
+        hits = _stats["exact"] + _stats["similar"]
+        lookups = hits + _stats["misses"]
+        return {
+            "enabled": FAQ_FAST_PATH,
+            "questions": len(index.questions) if index is not None else 0,
+            "embedded": index is not None and index.embeddings is not None,
+            "fingerprint": index.fingerprint if index is not None else None,
+            "exact_hits": _stats["exact"],
+            "similar_hits": _stats["similar"],
+            "misses": _stats["misses"],
+            "bypass_rate": hits / lookups if lookups else None,
+            "full_pipeline_ms": _stats["full_pipeline_ms"],
+            "estimated_saved_ms": round(_stats["saved_ms"], 1),
+        }
@@ -0,0 +1,97 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any
+
+import shared_cache
+
+# Size and lifetime of the in-process FAQ answer cache
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+# Returned when a request runs out of time and there is nothing to fall back on
+TIMEOUT_MESSAGE = "Sorry, this is taking longer than expected. Please try again in a moment."
+
+# Returned when a request fails unexpectedly; a cached or retrieved answer is not
+# passed off as a reply to it
+ERROR_MESSAGE = "Sorry, an error occurred while processing your query. Please try again."
+
+_punctuation = re.compile(r"[^\w\s]")
+_whitespace = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase a query and strip punctuation and repeated whitespace."""
+    return _whitespace.sub(" ", _punctuation.sub(" ", (query or "").lower())).strip()
+
+
+class AnswerCache:
+    """
+    Thread-safe LRU cache of generated FAQ answers keyed by normalized query.
+    Each tenant has its own (see rag.tenants).
+
+    Misses fall through to the cross-worker shared cache when it is enabled.
+    """
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+                 namespace: str = "answers", shared_max_entries: int = shared_cache.SHARED_CACHE_MAX_ENTRIES):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.shared = shared_cache.get_cache(namespace, ttl_seconds, max_entries=shared_max_entries)
+
+    def get(self, query: str) -> Optional[str]:
+        key = normalize_query(query)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                answer, stored_at = entry
+                if time.monotonic() - stored_at <= self.ttl_seconds:
+                    self.entries.move_to_end(key)
+                    return answer
+                del self.entries[key]
+
+        answer = self.shared.get(key)
+        if answer is not None:
+            self._store(key, answer)
+        return answer
+
+    def put(self, query: str, answer: str) -> None:
+        key = normalize_query(query)
+        self._store(key, answer)
+        self.shared.put(key, answer)
+
+    def _store(self, key: str, answer: str) -> None:
+        with self.lock:
+            self.entries[key] = (answer, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+answer_cache = AnswerCache()
+
+
+def retrieval_only_answer(retrieved_chunks: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+    """Use the best retrieved FAQ answer verbatim when there is no time to generate one."""
+    if not retrieved_chunks:
+        return None
+    best = max(retrieved_chunks, key=lambda chunk: chunk.get("score", 0))
+    return best.get("answer")
+
+
+def fallback_answer(query: str, retrieved_chunks: Optional[List[Dict[str, Any]]] = None,
+                    default: str = TIMEOUT_MESSAGE, cache: Optional[AnswerCache] = None) -> str:
+    """
+    Answer without a generation call: a cached answer for the same query (from the
+    tenant's cache if given), else the top retrieved FAQ answer, else the default
+    (a retry message).
+    """
+    cache = answer_cache if cache is None else cache
+    return cache.get(query) or retrieval_only_answer(retrieved_chunks) or default
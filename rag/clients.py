@@ -0,0 +1,224 @@
+import json
+import os
+import threading
+
+# Load environment variables from .env file (for local development; Lambda
+# functions get theirs from the function configuration)
+if not os.getenv("AWS_LAMBDA_FUNCTION_NAME"):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+# Which upstreams the RAG pipelines talk to:
+#   "aws"    Bedrock and Pinecone
+#   "record" Bedrock and Pinecone, recording every response to RECORDINGS_PATH
+#   "http"   the local stub server (rag.stub_server) at STUB_SERVER_URL
+#   "stub"   in-process offline stand-ins
+RAG_BACKEND = os.getenv("RAG_BACKEND", "aws").lower()
+
+# Simulated upstream latency for the stub backend
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "0"))
+
+# Optional JSON lines file of recorded {"text", "embedding"} pairs the stub backend replays
+STUB_RECORDED_EMBEDDINGS = os.getenv("STUB_RECORDED_EMBEDDINGS")
+
+# Optional vector export (see rag.vectors) loaded into the stub index instead of embedding the FAQ
+STUB_VECTOR_EXPORT = os.getenv("STUB_VECTOR_EXPORT")
+
+# How the stub index stores vectors ("float32", "float16" or "int8"), and whether it
+# rescores a shortlist of quantized matches with float32 copies of their vectors
+STUB_INDEX_DTYPE = os.getenv("STUB_INDEX_DTYPE", "float32")
+STUB_INDEX_RESCORE = os.getenv("STUB_INDEX_RESCORE", "false").lower() == "true"
+
+# Length of Titan embeddings for ingestion and queries alike; Titan v2 supports 256, 512 and 1024
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "512"))
+if EMBEDDING_DIMENSIONS not in (256, 512, 1024):
+    raise ValueError(f"EMBEDDING_DIMENSIONS must be 256, 512 or 1024, not {EMBEDDING_DIMENSIONS}")
+
+AWS_REGION = "us-east-1"
+# A Pinecone index has a fixed dimension, so each embedding length gets its own index
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "farmcredit" if EMBEDDING_DIMENSIONS == 512 else f"farmcredit-{EMBEDDING_DIMENSIONS}")
+PINECONE_DIMENSION = EMBEDDING_DIMENSIONS
+PINECONE_METRIC = "cosine"
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v2:0"
+
+_clients = {}
+_clients_lock = threading.RLock()
+
+
+def _shared(name, factory):
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = factory()
+        return _clients[name]
+
+
+class _SharedClient:
+    """
+    Handle to a process-wide client, looked up on every use so that forked
+    workers can replace clients whose connections must not be shared.
+    """
+
+    def __init__(self, name, factory):
+        self._name = name
+        self._factory = factory
+
+    def _resolve(self):
+        return _shared(self._name, self._factory)
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+
+def _close_connection_pools(client):
+    # boto3 clients are expensive to build but only open connections on first use
+    session = getattr(getattr(client, "_endpoint", None), "http_session", None)
+    if session is None:
+        return False
+    session.close()
+    return True
+
+
+def reset_connections():
+    """
+    Drops connections opened by another process image: run in each forked worker
+    and after a Lambda snapshot restore. In-process stubs and boto3 clients (with
+    their connection pools closed) are kept; other clients are rebuilt on first use.
+    """
+    global _clients_lock
+    _clients_lock = threading.RLock()
+    for name, client in list(_clients.items()):
+        if getattr(client, "fork_safe", False) or _close_connection_pools(client):
+            continue
+        del _clients[name]
+
+
+os.register_at_fork(after_in_child=reset_connections)
+
+
+def _aws_bedrock():
+    import boto3
+
+    # Retrieve AWS credentials from environment variables
+    aws_access_key_id = os.getenv("aws_access_key_id")
+    aws_secret_access_key = os.getenv("aws_secret_access_key")
+
+    if aws_secret_access_key is None or aws_access_key_id is None:
+        print("AWS credentials not found in environment variables.")
+        raise ValueError("Please set AWS credentials in the environment variables.")
+
+    return boto3.client(service_name='bedrock-runtime', region_name=AWS_REGION, aws_access_key_id=aws_access_key_id, aws_secret_access_key=aws_secret_access_key)
+
+
+def _pinecone():
+    from pinecone import Pinecone
+
+    api_key = os.getenv("PINECONE_API_KEY")
+    if not api_key:
+        print("Pinecone API key not found in environment variables.")
+        raise ValueError("Please set PINECONE_API_KEY in the environment variables.")
+    return Pinecone(api_key=api_key)
+
+
+def _pinecone_index():
+    return _pinecone().Index(PINECONE_INDEX_NAME)
+
+
+def _cassette():
+    from rag.replay import Cassette, recordings_path
+    return _shared("cassette", lambda: Cassette(recordings_path()))
+
+
+def _stub_bedrock():
+    from rag.stubs import StubBedrock
+
+    recorded = {}
+    if STUB_RECORDED_EMBEDDINGS:
+        with open(STUB_RECORDED_EMBEDDINGS, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    recorded[entry["text"]] = entry["embedding"]
+    return StubBedrock(latency_ms=STUB_LATENCY_MS, recorded_embeddings=recorded)
+
+
+def _stub_index():
+    from rag.stubs import build_stub_index
+    from rag.tenants import partner_corpora
+
+    index = build_stub_index(get_bedrock_client(), EMBEDDING_MODEL_ID, chunks=[] if STUB_VECTOR_EXPORT else None,
+                             latency_ms=STUB_LATENCY_MS, namespaces=partner_corpora(), dtype=STUB_INDEX_DTYPE,
+                             rescore=STUB_INDEX_RESCORE)
+    if STUB_VECTOR_EXPORT:
+        from rag.vectors import import_vectors
+        import_vectors(STUB_VECTOR_EXPORT, index, namespace="", batch_size=10000)
+    return index
+
+
+def _bedrock_factory():
+    if RAG_BACKEND == "stub":
+        return _stub_bedrock
+    if RAG_BACKEND == "http":
+        from rag.stub_client import HttpBedrock
+        return HttpBedrock
+    if RAG_BACKEND == "record":
+        from rag.replay import RecordingBedrock
+        return lambda: RecordingBedrock(_aws_bedrock(), _cassette())
+    return _aws_bedrock
+
+
+def _index_factory():
+    if RAG_BACKEND == "stub":
+        return _stub_index
+    if RAG_BACKEND == "http":
+        from rag.stub_client import HttpIndex
+        return HttpIndex
+    if RAG_BACKEND == "record":
+        from rag.replay import RecordingIndex
+        return lambda: RecordingIndex(_pinecone_index(), _cassette())
+    return _pinecone_index
+
+
+_handles = {}
+
+
+def _handle(name, factory):
+    with _clients_lock:
+        if name not in _handles:
+            _handles[name] = _SharedClient(name, factory())
+        return _handles[name]
+
+
+def get_bedrock_client():
+    """Returns the process-wide Bedrock runtime client for the configured backend."""
+    return _handle("bedrock", _bedrock_factory)
+
+
+def get_vector_index():
+    """Returns the process-wide vector index for the configured backend."""
+    return _handle("index", _index_factory)
+
+
+def preload_clients():
+    """Builds the configured clients now rather than on the first request."""
+    get_bedrock_client()._resolve()
+    get_vector_index()._resolve()
+
+
+def ensure_vector_index():
+    """
+    Creates the Pinecone index if it does not exist yet (a no-op for the stub backends).
+    """
+    if RAG_BACKEND not in ("aws", "record"):
+        return
+    from pinecone import ServerlessSpec
+
+    pc = _pinecone()
+    # Check if index already exists to avoid re-creation
+    if PINECONE_INDEX_NAME not in pc.list_indexes().names():
+        # Create index with the serverless spec for AWS
+        pc.create_index(
+            name=PINECONE_INDEX_NAME,
+            dimension=PINECONE_DIMENSION,
+            metric=PINECONE_METRIC,
+            spec=ServerlessSpec(cloud="aws", region=AWS_REGION)
+        )
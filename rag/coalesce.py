@@ -0,0 +1,138 @@
+import os
+import threading
+
+from rag.deadline import DeadlineExceeded, SharedDeadline
+
+# Coalesce identical concurrent queries into one upstream call
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        self.deadline = SharedDeadline()
+
+
+class SingleFlight:
+    """
+    Lets concurrent callers with the same key share one in-flight call.
+
+    The first caller for a key becomes the leader and runs the call; callers
+    arriving while it is in flight wait for and receive the same result (or
+    exception). Nothing is cached once the call completes.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.stats = {"calls": 0, "leaders": 0, "coalesced": 0, "errors": 0, "timeouts": 0, "max_waiters": 0}
+
+    def _join(self, key):
+        with self.lock:
+            self.stats["calls"] += 1
+            call = self.calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats["coalesced"] += 1
+                self.stats["max_waiters"] = max(self.stats["max_waiters"], call.waiters)
+                return call, False
+            call = self.calls[key] = _Call()
+            self.stats["leaders"] += 1
+            return call, True
+
+    def _finish(self, key, call, fn, *args):
+        try:
+            call.result = fn(*args)
+        except BaseException as e:
+            call.error = e
+            with self.lock:
+                self.stats["errors"] += 1
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.done.set()
+
+    def _outcome(self, call):
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key, fn):
+        """
+        Runs fn() once for all concurrent callers with the same key, in the leader's thread.
+
+        Args:
+            key (hashable): Identifies identical calls.
+            fn (callable): The call to make, taking no arguments.
+
+        Returns:
+            The result of fn().
+        """
+        call, leader = self._join(key)
+        if leader:
+            self._finish(key, call, fn)
+        else:
+            call.done.wait()
+        return self._outcome(call)
+
+    def do_with_deadline(self, key, fn, deadline=None):
+        """
+        Runs fn(shared_deadline) once for all concurrent callers with the same key, in
+        the leader's thread.
+
+        The call runs under a deadline shared by all its callers, so one caller
+        disconnecting or timing out does not cut it short for the others. Followers
+        wait only as long as their own deadline allows; the leader returns when the
+        call does, which may be later than its own deadline if others still wait
+        for the result.
+
+        The call is not handed to a pool: a pool thread running one shared call (a
+        query) that waits for another (its embedding) on the same pool could wait
+        for a thread that never frees up.
+
+        Args:
+            key (hashable): Identifies identical calls.
+            fn (callable): The call to make, taking the shared deadline.
+            deadline (Deadline, optional): This caller's deadline.
+
+        Returns:
+            The result of fn().
+
+        Raises:
+            DeadlineExceeded: If this caller's deadline passes before the call completes.
+        """
+        call, leader = self._join(key)
+        call.deadline.join(deadline)
+        if leader:
+            self._finish(key, call, fn, call.deadline)
+        elif deadline is None:
+            call.done.wait()
+        else:
+            # Wake up periodically to notice client disconnects as well as expiry
+            while not call.done.wait(timeout=min(deadline.remaining_ms() / 1000, 0.25)):
+                if deadline.cancelled or deadline.expired:
+                    with self.lock:
+                        self.stats["timeouts"] += 1
+                    raise DeadlineExceeded(f"Deadline exceeded waiting for shared {self.name} call")
+        return self._outcome(call)
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, in_flight=len(self.calls))
+
+
+query_flight = SingleFlight("query")
+embedding_flight = SingleFlight("embedding")
+
+
+def get_coalescing_stats():
+    """Returns coalescing counters for the FAQ query and embedding single-flight groups."""
+    return {
+        "enabled": COALESCE_REQUESTS,
+        "query": query_flight.get_stats(),
+        "embedding": embedding_flight.get_stats(),
+    }
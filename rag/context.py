@@ -0,0 +1,161 @@
+import json
+import os
+
+from rag import metrics
+from rag.lexical import tokenize
+
+# Chunks scoring below these cutoffs are never sent to the model. Re-ranked chunks
+# (hybrid retrieval) carry a rerank_score in [0, 1]; otherwise the dense cosine
+# similarity is used.
+MIN_RERANK_SCORE = float(os.getenv("CONTEXT_MIN_RERANK_SCORE", "0.3"))
+MIN_SIMILARITY = float(os.getenv("CONTEXT_MIN_SIMILARITY", "0.35"))
+
+# Stop adding chunks once the score falls by more than this fraction from the previous one
+MAX_SCORE_DROP = float(os.getenv("CONTEXT_MAX_SCORE_DROP", "0.35"))
+
+# Answers whose token sets overlap by at least this Jaccard similarity count as duplicates
+DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", "0.7"))
+
+# Upper bound on the estimated tokens of context pasted into a prompt
+MAX_CONTEXT_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "600"))
+
+# Rough characters-per-token ratio for English text
+CHARS_PER_TOKEN = 4
+
+# Bedrock on-demand prices in USD per 1K (input, output) tokens, for cost metrics
+MODEL_PRICES_PER_1K = {
+    "anthropic.claude-3-5-sonnet-20240620-v1:0": (0.003, 0.015),
+    "anthropic.claude-3-haiku-20240307-v1:0": (0.00025, 0.00125),
+}
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def relevance(chunk):
+    """The score a chunk is ranked and cut off by, with the cutoff that applies to it."""
+    if "rerank_score" in chunk:
+        return chunk["rerank_score"], MIN_RERANK_SCORE
+    return chunk.get("score", 0.0), MIN_SIMILARITY
+
+
+def format_chunk(chunk):
+    return f"Q: {chunk['question']}\nA: {chunk['answer']}"
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def select_context(retrieved_chunks, max_chunks, max_tokens=None, pipeline="rag"):
+    """
+    Picks the chunks worth sending to the model from a retrieved candidate list.
+
+    Chunks are taken best first until one falls below the relevance cutoff, its
+    score drops sharply from the previous chunk, or the token budget is spent.
+    Chunks whose answer nearly duplicates one already selected are skipped.
+
+    Args:
+        retrieved_chunks (list): Retrieved chunks with 'score' (and optionally 'rerank_score').
+        max_chunks (int): Upper bound on selected chunks.
+        max_tokens (int, optional): Estimated token budget for the formatted context (default: CONTEXT_MAX_TOKENS).
+        pipeline (str): Pipeline name used for logging and metrics.
+
+    Returns:
+        list: The selected chunks, best first.
+    """
+    max_tokens = MAX_CONTEXT_TOKENS if max_tokens is None else max_tokens
+    ranked = sorted(retrieved_chunks or [], key=lambda c: relevance(c)[0], reverse=True)
+
+    selected, selected_answers = [], []
+    context_tokens = 0
+    previous_score = None
+    stop_reason = "exhausted"
+
+    for chunk in ranked:
+        if len(selected) >= max_chunks:
+            stop_reason = "max_chunks"
+            break
+
+        score, cutoff = relevance(chunk)
+        if score < cutoff:
+            stop_reason = "below_cutoff"
+            break
+        if previous_score and (previous_score - score) / previous_score > MAX_SCORE_DROP:
+            stop_reason = "score_gap"
+            break
+
+        answer_tokens = set(tokenize(chunk["answer"]))
+        if any(_jaccard(answer_tokens, other) >= DUPLICATE_SIMILARITY for other in selected_answers):
+            metrics.increment(f"{pipeline}.context.duplicates_dropped")
+            continue
+
+        tokens = estimate_tokens(format_chunk(chunk))
+        if selected and context_tokens + tokens > max_tokens:
+            stop_reason = "token_budget"
+            break
+
+        selected.append(chunk)
+        selected_answers.append(answer_tokens)
+        context_tokens += tokens
+        previous_score = score
+
+    metrics.observe(f"{pipeline}.context.retrieved_chunks", len(ranked))
+    metrics.observe(f"{pipeline}.context.selected_chunks", len(selected))
+    metrics.observe(f"{pipeline}.context.tokens", context_tokens)
+    metrics.increment(f"{pipeline}.context.stop.{stop_reason}")
+    print(json.dumps({
+        "event": "context_selection",
+        "pipeline": pipeline,
+        "retrieved": len(ranked),
+        "selected": len(selected),
+        "context_tokens": context_tokens,
+        "stop_reason": stop_reason,
+    }))
+
+    return selected
+
+
+def estimate_cost(model_id, input_tokens, output_tokens):
+    """Estimated USD cost of a generation call, or None for a model without a known price."""
+    prices = MODEL_PRICES_PER_1K.get(model_id)
+    if prices is None:
+        return None
+    return (input_tokens * prices[0] + (output_tokens or 0) * prices[1]) / 1000
+
+
+def record_generation(pipeline, prompt, latency_ms, usage=None, model_id=None):
+    """
+    Logs and records prompt size, token usage, cost and latency of one generation call.
+
+    Args:
+        pipeline (str): Pipeline name.
+        prompt (str): The prompt sent to the model.
+        latency_ms (float): Wall-clock generation time.
+        usage (dict, optional): Bedrock 'usage' block with input/output token counts.
+        model_id (str, optional): Bedrock model ID, used to estimate cost.
+    """
+    usage = usage or {}
+    input_tokens = usage.get("input_tokens") or estimate_tokens(prompt)
+    output_tokens = usage.get("output_tokens")
+    cost_usd = estimate_cost(model_id, input_tokens, output_tokens)
+
+    metrics.observe(f"{pipeline}.generation.latency_ms", latency_ms)
+    metrics.observe(f"{pipeline}.generation.input_tokens", input_tokens)
+    if output_tokens is not None:
+        metrics.observe(f"{pipeline}.generation.output_tokens", output_tokens)
+    if cost_usd is not None:
+        metrics.increment(f"{pipeline}.generation.cost_usd", cost_usd)
+    print(json.dumps({
+        "event": "generation",
+        "pipeline": pipeline,
+        "model_id": model_id,
+        "prompt_chars": len(prompt),
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cost_usd": cost_usd,
+        "latency_ms": round(latency_ms, 1),
+    }))
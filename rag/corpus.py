@@ -0,0 +1,43 @@
+import hashlib
+import json
+import os
+
+# FAQ corpus used for ingestion and for the local lexical index
+DEFAULT_FAQ_CHUNKS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "faq_chunks.json")
+
+
+def faq_chunks_path():
+    return os.getenv("FAQ_CHUNKS_PATH", DEFAULT_FAQ_CHUNKS_PATH)
+
+
+def load_faq_chunks(path=None):
+    """
+    Loads the FAQ corpus.
+
+    Args:
+        path (str, optional): JSON file with a list of {'question', 'answer'} objects
+            (default: FAQ_CHUNKS_PATH or data/faq_chunks.json).
+
+    Returns:
+        list: List of dictionaries containing 'question' and 'answer' keys.
+    """
+    with open(path or faq_chunks_path(), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def chunk_key(chunk):
+    """
+    Stable identity of a FAQ chunk, independent of the vector ID it was upserted under.
+    """
+    text = f"{chunk['question']}\n{chunk['answer']}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def corpus_fingerprint(chunks):
+    """
+    Hash of the whole corpus, used to detect FAQ content changes.
+    """
+    digest = hashlib.sha1()
+    for chunk in chunks:
+        digest.update(chunk_key(chunk).encode("ascii"))
+    return digest.hexdigest()
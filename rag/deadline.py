@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+# Default end-to-end budget for a RAG request when the client does not send one
+DEFAULT_TIMEOUT_MS = float(os.getenv("RAG_REQUEST_TIMEOUT_MS", "15000"))
+
+# Generation is skipped when less than this much budget is left after retrieval
+MIN_GENERATION_MS = float(os.getenv("RAG_MIN_GENERATION_MS", "1500"))
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request runs out of time or its client has gone away."""
+
+
+class Deadline:
+    """
+    Time budget for a single request, shared by every pipeline stage.
+
+    The HTTP layer creates one per request and cancels it when the client
+    disconnects; retrieval and generation check it between upstream calls.
+    """
+
+    def __init__(self, timeout_ms: Optional[float] = None):
+        timeout_ms = DEFAULT_TIMEOUT_MS if timeout_ms is None else timeout_ms
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + timeout_ms / 1000
+        self._cancelled = threading.Event()
+
+    def remaining_ms(self) -> float:
+        if self._cancelled.is_set():
+            return 0.0
+        return max(0.0, (self.expires_at - time.monotonic()) * 1000)
+
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.started_at) * 1000
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining_ms() <= 0
+
+    def cancel(self) -> None:
+        """Mark the request as abandoned, e.g. on client disconnect."""
+        self._cancelled.set()
+
+    def check(self, stage: str) -> None:
+        """Raise DeadlineExceeded if the request should stop before the given stage."""
+        if self.cancelled:
+            raise DeadlineExceeded(f"Request cancelled before {stage}")
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+    def allows_generation(self) -> bool:
+        """Whether enough budget is left to be worth starting a generation call."""
+        return self.remaining_ms() >= MIN_GENERATION_MS
+
+
+class SharedDeadline(Deadline):
+    """
+    Deadline for upstream work shared by several requests.
+
+    The work stays alive while any participant still wants it: the budget is the
+    longest remaining one, and it is only cancelled once every participant is.
+    A participant without a deadline keeps it alive indefinitely.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self._participants = []
+        self._unbounded = False
+        self._lock = threading.Lock()
+
+    def join(self, deadline: Optional[Deadline]) -> None:
+        with self._lock:
+            if deadline is None:
+                self._unbounded = True
+            else:
+                self._participants.append(deadline)
+
+    def remaining_ms(self) -> float:
+        with self._lock:
+            if self._unbounded:
+                return float("inf")
+            return max((d.remaining_ms() for d in self._participants), default=0.0)
+
+    @property
+    def cancelled(self) -> bool:
+        with self._lock:
+            return not self._unbounded and all(d.cancelled for d in self._participants)
+
+    def cancel(self) -> None:
+        with self._lock:
+            participants = list(self._participants)
+        for deadline in participants:
+            deadline.cancel()
+
+
+def generate_with_deadline(bedrock, generation_model_id: str, input_data: dict, deadline: Deadline,
+                           usage: Optional[dict] = None) -> str:
+    """
+    Run a Claude generation on Bedrock as a stream so it can be abandoned mid-way.
+
+    The response stream is closed as soon as the deadline expires or is
+    cancelled, which stops the upstream generation instead of waiting for it.
+
+    Args:
+        bedrock (boto3.client): Bedrock runtime client.
+        generation_model_id (str): Bedrock model ID for text generation.
+        input_data (dict): Anthropic messages request body.
+        deadline (Deadline): The request deadline.
+        usage (dict, optional): Filled with the input/output token counts reported by the stream.
+
+    Returns:
+        str: The generated text.
+    """
+    deadline.check("generation")
+
+    response = bedrock.invoke_model_with_response_stream(
+        modelId=generation_model_id,
+        contentType="application/json",
+        accept="*/*",
+        body=json.dumps(input_data).encode('utf-8')
+    )
+    stream = response['body']
+
+    parts = []
+    try:
+        for event in stream:
+            if deadline.cancelled or deadline.expired:
+                raise DeadlineExceeded("Generation stopped at deadline")
+
+            chunk = event.get("chunk")
+            if not chunk:
+                continue
+            payload = json.loads(chunk["bytes"])
+            if payload.get("type") == "content_block_delta":
+                parts.append(payload.get("delta", {}).get("text", ""))
+            elif payload.get("type") == "message_start" and usage is not None:
+                usage.update(payload.get("message", {}).get("usage", {}))
+            elif payload.get("type") == "message_delta" and usage is not None:
+                usage.update(payload.get("usage", {}))
+            elif payload.get("type") == "message_stop":
+                break
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+    return "".join(parts)
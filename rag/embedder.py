@@ -0,0 +1,295 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import shared_cache
+from rag import metrics
+from rag.clients import EMBEDDING_DIMENSIONS
+from rag.coalesce import COALESCE_REQUESTS, embedding_flight
+from rag.deadline import DeadlineExceeded
+from rag.resilience import guarded
+
+# Collect query embeddings from concurrent requests into micro-batches
+EMBEDDING_BATCHING = os.getenv("EMBEDDING_BATCHING", "true").lower() == "true"
+
+# Largest batch, and how long the first query in a batch may wait for others to join
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "16"))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+
+# Bedrock calls in flight at once across all batches (keeps bursts under throttling limits)
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "8"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+WAIT_MS_BUCKETS = (0.5, 1, 2, 5, 10, 25, 50, 100)
+
+# Query embeddings kept in each worker's memory, and how long they stay there and in
+# the cross-worker shared cache (when enabled)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "86400"))
+
+# When this process last called Bedrock for an embedding (monotonic clock)
+_last_call_at = None
+
+
+class EmbeddingCache:
+    """
+    Thread-safe LRU cache of query embeddings in this process, with a TTL. Each
+    partner tenant has its own (see rag.tenants).
+
+    Misses fall through to the cross-worker shared cache when it is enabled.
+    """
+
+    def __init__(self, max_size, ttl_seconds=EMBEDDING_CACHE_TTL_SECONDS, namespace="embeddings",
+                 shared_max_entries=shared_cache.SHARED_CACHE_MAX_ENTRIES):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.shared = shared_cache.get_cache(namespace, ttl_seconds, max_entries=shared_max_entries)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                embedding, stored_at = entry
+                if time.monotonic() - stored_at <= self.ttl_seconds:
+                    self.entries.move_to_end(key)
+                    return embedding
+                del self.entries[key]
+
+        embedding = self.shared.get(key)
+        if embedding is not None:
+            self._store(key, embedding)
+        return embedding
+
+    def put(self, key, embedding):
+        self._store(key, embedding)
+        self.shared.put(key, embedding)
+
+    def _store(self, key, embedding):
+        with self.lock:
+            self.entries[key] = (embedding, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_SIZE)
+
+
+def seconds_since_last_call():
+    """Seconds since this process last called Bedrock for an embedding (None: never)."""
+    return None if _last_call_at is None else time.monotonic() - _last_call_at
+
+
+def invoke_embedding(text, bedrock, embedding_model_id, dimensions=EMBEDDING_DIMENSIONS):
+    """
+    Embeds a single text with a Titan embedding model on Bedrock.
+
+    Args:
+        text (str): Text to embed.
+        bedrock (boto3.client): Bedrock runtime client.
+        embedding_model_id (str): Bedrock model ID for embedding.
+        dimensions (int): Embedding dimensions.
+
+    Returns:
+        list: The normalized embedding vector.
+    """
+    global _last_call_at
+    _last_call_at = time.monotonic()
+
+    # Prepare the input for embedding
+    input_data = {
+        "inputText": text,
+        "dimensions": dimensions,
+        "normalize": True
+    }
+
+    # Serialize to JSON
+    body = json.dumps(input_data).encode('utf-8')
+
+    # Generate query embedding using Bedrock
+    response = bedrock.invoke_model(
+        modelId=embedding_model_id,
+        contentType="application/json",
+        accept="*/*",
+        body=body
+    )
+
+    response_body = response['body'].read()
+    response_json = json.loads(response_body)
+    return response_json['embedding']
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batches query embeddings from concurrent requests.
+
+    Callers enqueue a text and block on its result. A dispatcher thread takes the
+    first queued text, waits up to max_wait_ms for more to arrive (or until the
+    batch is full), drops duplicate texts and sends the batch to Bedrock as one
+    pipelined burst over a bounded pool, then routes each vector back to its caller.
+
+    Titan text embeddings take one input per invoke_model call, so a batch is a
+    burst of concurrent calls rather than a single request.
+    """
+
+    def __init__(self, bedrock, embedding_model_id, dimensions=EMBEDDING_DIMENSIONS,
+                 max_batch_size=EMBEDDING_BATCH_MAX_SIZE, max_wait_ms=EMBEDDING_BATCH_MAX_WAIT_MS,
+                 max_concurrency=EMBEDDING_MAX_CONCURRENCY):
+        self.bedrock = bedrock
+        self.embedding_model_id = embedding_model_id
+        self.dimensions = dimensions
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.pending = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embedding")
+        self.dispatcher = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self.dispatcher.start()
+
+    def embed(self, text, deadline=None):
+        """
+        Embeds one text as part of the next batch.
+
+        Raises:
+            DeadlineExceeded: If the deadline passes (or is cancelled) first. A text
+                whose callers have all given up is not sent to Bedrock.
+        """
+        future = Future()
+        self.pending.put((text, future, time.monotonic()))
+        if deadline is None:
+            return future.result()
+        # Wake up periodically to notice client disconnects as well as expiry
+        while True:
+            try:
+                return future.result(timeout=min(deadline.remaining_ms() / 1000, 0.25))
+            except FutureTimeoutError:
+                if deadline.cancelled or deadline.expired:
+                    future.cancel()
+                    metrics.increment("embedding.batch.timeouts")
+                    raise DeadlineExceeded("Deadline exceeded waiting for a batched embedding")
+
+    def _collect(self):
+        batch = [self.pending.get()]
+        flush_at = batch[0][2] + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = flush_at - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            dispatched_at = time.monotonic()
+
+            waiters = {}
+            for text, future, enqueued_at in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue  # The caller's deadline passed while it was queued
+                waiters.setdefault(text, []).append(future)
+                metrics.observe("embedding.batch.added_latency_ms", (dispatched_at - enqueued_at) * 1000, WAIT_MS_BUCKETS)
+            metrics.observe("embedding.batch.size", len(batch), BATCH_SIZE_BUCKETS)
+            metrics.observe("embedding.batch.unique_texts", len(waiters), BATCH_SIZE_BUCKETS)
+            metrics.increment("embedding.batches")
+
+            for text, futures in waiters.items():
+                self.executor.submit(self._embed_one, text, futures)
+
+    def _embed_one(self, text, futures):
+        try:
+            embedding = guarded("bedrock_embedding", None, invoke_embedding, text, self.bedrock, self.embedding_model_id, self.dimensions)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future in futures:
+            future.set_result(embedding)
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(bedrock, embedding_model_id, dimensions=EMBEDDING_DIMENSIONS):
+    """Returns the shared batcher for a Bedrock client, model and dimension."""
+    key = (id(bedrock), embedding_model_id, dimensions)
+    batcher = _batchers.get(key)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.get(key)
+            if batcher is None:
+                batcher = _batchers[key] = EmbeddingBatcher(bedrock, embedding_model_id, dimensions)
+    return batcher
+
+
+def _after_fork():
+    # Dispatcher threads do not survive a fork; workers start their own batchers
+    global _batchers, _batchers_lock
+    _batchers, _batchers_lock = {}, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _embed(text, bedrock, embedding_model_id, dimensions, deadline=None):
+    if EMBEDDING_BATCHING:
+        return get_batcher(bedrock, embedding_model_id, dimensions).embed(text, deadline)
+    return guarded("bedrock_embedding", deadline, invoke_embedding, text, bedrock, embedding_model_id, dimensions)
+
+
+def embed_query(text, bedrock, embedding_model_id, dimensions=EMBEDDING_DIMENSIONS, cache=None, deadline=None):
+    """
+    Embeds a query, sharing one Bedrock call between concurrent requests for the same
+    text and micro-batching it with other concurrent queries. Embeddings computed by
+    any worker are reused from the shared cache when it is enabled.
+
+    Args:
+        text (str): Query to embed.
+        bedrock (boto3.client): Bedrock runtime client.
+        embedding_model_id (str): Bedrock model ID for embedding.
+        dimensions (int): Embedding dimensions.
+        cache (EmbeddingCache, optional): Cache to use instead of the process-wide
+            one (each partner tenant has its own).
+        deadline (Deadline, optional): Request deadline; waiting for the embedding
+            stops when it passes.
+
+    Returns:
+        list: The normalized embedding vector.
+
+    Raises:
+        DeadlineExceeded: If the deadline passes before the embedding arrives.
+    """
+    cache = embedding_cache if cache is None else cache
+    cache_key = f"{embedding_model_id}|{dimensions}|{text}"
+    embedding = cache.get(cache_key)
+    if embedding is not None:
+        return embedding
+
+    if not COALESCE_REQUESTS:
+        embedding = _embed(text, bedrock, embedding_model_id, dimensions, deadline)
+    elif deadline is None:
+        embedding = embedding_flight.do(
+            (embedding_model_id, dimensions, text),
+            lambda: _embed(text, bedrock, embedding_model_id, dimensions)
+        )
+    else:
+        # Shared by every caller still waiting, so one giving up doesn't cancel it for the others
+        embedding = embedding_flight.do_with_deadline(
+            (embedding_model_id, dimensions, text),
+            lambda shared_deadline: _embed(text, bedrock, embedding_model_id, dimensions, shared_deadline),
+            deadline
+        )
+    cache.put(cache_key, embedding)
+    return embedding
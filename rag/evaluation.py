@@ -0,0 +1,355 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, redirect_stdout
+
+import numpy as np
+
+from rag import metrics
+from rag.corpus import chunk_key, load_faq_chunks
+from rag.lexical import tokenize
+
+# Offline evaluation of retrieval quality, answer quality, latency and token usage
+# across pipeline configurations. Run against the stub backend (RAG_BACKEND=stub)
+# so no Bedrock quota or live Pinecone index is used.
+
+DEFAULT_GOLDEN_SET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "eval_golden_set.json")
+
+# Settings every configuration starts from; each entry in DEFAULT_CONFIGS overrides some
+BASE_CONFIG = {
+    "top_k": 5,
+    "hybrid": True,
+    "max_context_tokens": 600,
+    "coalescing": True,
+    "embedding_batching": True,
+    "concurrency": 1,
+    "stream": False,
+    "rate_limited": False,
+    # Answer FAQ questions and close paraphrases from the answer index, as /query_faq does
+    "faq_fast_path": False,
+    # Keep query embeddings in memory; each configuration starts with an empty cache
+    "embedding_cache": True,
+    # Times the golden set is run; later passes show the effect of the caches
+    "passes": 1,
+    # RAG_BACKEND to evaluate with (None: the current one); others run in a subprocess
+    "backend": None,
+}
+
+DEFAULT_CONFIGS = [
+    {"name": "baseline"},
+    {"name": "dense_only", "hybrid": False},
+    {"name": "top_k_3", "top_k": 3},
+    {"name": "tight_context", "max_context_tokens": 300},
+    {"name": "concurrent", "concurrency": 8},
+    {"name": "concurrent_no_sharing", "concurrency": 8, "coalescing": False, "embedding_batching": False},
+    {"name": "faq_fast_path", "faq_fast_path": True},
+    {"name": "repeat_cached", "passes": 2},
+    {"name": "repeat_uncached", "passes": 2, "embedding_cache": False},
+]
+
+# Largest acceptable drop in a quality metric before a run counts as a regression
+QUALITY_TOLERANCE = 0.02
+QUALITY_METRICS = ("recall_at_k", "mrr", "context_recall", "answer_f1")
+
+
+def load_golden_set(path=DEFAULT_GOLDEN_SET_PATH, chunks=None):
+    """
+    Loads golden questions and resolves each to the FAQ chunks that answer it.
+
+    Each entry is {"query": paraphrase, "question": FAQ question it paraphrases}.
+
+    Returns:
+        list: Entries with added 'relevant_keys' (chunk keys) and 'reference_answer'.
+    """
+    chunks = load_faq_chunks() if chunks is None else chunks
+    with open(path, encoding="utf-8") as f:
+        golden = json.load(f)
+
+    items = []
+    for entry in golden:
+        matching = [chunk for chunk in chunks if chunk["question"] == entry["question"]]
+        if not matching:
+            raise ValueError(f"Golden question not in FAQ corpus: {entry['question']!r}")
+        items.append(dict(
+            entry,
+            relevant_keys=[chunk_key(chunk) for chunk in matching],
+            reference_answer=matching[0]["answer"],
+        ))
+    return items
+
+
+def token_f1(prediction, reference):
+    """Token-level F1 between a generated answer and the reference FAQ answer."""
+    predicted, expected = tokenize(prediction), tokenize(reference)
+    if not predicted or not expected:
+        return 0.0
+    common = sum(min(predicted.count(t), expected.count(t)) for t in set(predicted))
+    if common == 0:
+        return 0.0
+    precision, recall = common / len(predicted), common / len(expected)
+    return 2 * precision * recall / (precision + recall)
+
+
+@contextmanager
+def applied_config(config):
+    """Temporarily applies a configuration's module-level pipeline settings."""
+    from rag import answer_index, context, embedder, resilience
+    import rag.querying as querying
+
+    saved = (querying.hybrid_retrieval, context.MAX_CONTEXT_TOKENS, querying.COALESCE_REQUESTS,
+             embedder.COALESCE_REQUESTS, embedder.EMBEDDING_BATCHING, embedder.embedding_cache,
+             answer_index.FAQ_FAST_PATH)
+    saved_buckets = {name: upstream.bucket for name, upstream in resilience.upstreams.items()}
+    querying.hybrid_retrieval = config["hybrid"]
+    context.MAX_CONTEXT_TOKENS = config["max_context_tokens"]
+    querying.COALESCE_REQUESTS = embedder.COALESCE_REQUESTS = config["coalescing"]
+    embedder.EMBEDDING_BATCHING = config["embedding_batching"]
+    embedder.embedding_cache = embedder.EmbeddingCache(embedder.EMBEDDING_CACHE_SIZE if config["embedding_cache"] else 0)
+    answer_index.FAQ_FAST_PATH = config["faq_fast_path"]
+    if not config["rate_limited"]:
+        # Client-side quotas would otherwise dominate latency at evaluation speed
+        for upstream in resilience.upstreams.values():
+            upstream.bucket = resilience.TokenBucket(float("inf"))
+    try:
+        yield
+    finally:
+        (querying.hybrid_retrieval, context.MAX_CONTEXT_TOKENS, querying.COALESCE_REQUESTS,
+         embedder.COALESCE_REQUESTS, embedder.EMBEDDING_BATCHING, embedder.embedding_cache,
+         answer_index.FAQ_FAST_PATH) = saved
+        for name, bucket in saved_buckets.items():
+            resilience.upstreams[name].bucket = bucket
+
+
+def _evaluate_item(item, config):
+    from rag.answer_index import lookup_faq_answer
+    from rag.context import select_context
+    from rag.deadline import Deadline
+    from rag.embedder import embed_query
+    import rag.querying as querying
+
+    top_k = config["top_k"]
+    deadline = Deadline() if config["stream"] else None
+
+    started = time.perf_counter()
+    answer, query_embedding = lookup_faq_answer(
+        item["query"], lambda: embed_query(item["query"], querying.bedrock, querying.embedding_model_id, deadline=deadline), deadline)
+    if answer is not None:
+        # Answered from the FAQ answer index without retrieval or generation
+        total_ms = (time.perf_counter() - started) * 1000
+        correct = answer == item["reference_answer"]
+        return {
+            "query": item["query"],
+            "fast_path": True,
+            "hit": correct,
+            "reciprocal_rank": 1.0 if correct else 0.0,
+            "in_context": correct,
+            "context_chunks": 0,
+            "answer_f1": token_f1(answer, item["reference_answer"]),
+            "retrieval_ms": total_ms,
+            "total_ms": total_ms,
+        }
+
+    retrieved = querying.retrieve_similar_chunks(item["query"], top_k=top_k, deadline=deadline, query_embedding=query_embedding)
+    retrieval_ms = (time.perf_counter() - started) * 1000
+    context_chunks = select_context(retrieved, max_chunks=top_k, pipeline="faq")
+    answer = querying.generate_answer(item["query"], context_chunks, deadline=deadline)
+    total_ms = (time.perf_counter() - started) * 1000
+
+    relevant = set(item["relevant_keys"])
+    retrieved_keys = [chunk_key(chunk) for chunk in retrieved]
+    rank = next((i + 1 for i, key in enumerate(retrieved_keys) if key in relevant), None)
+
+    return {
+        "query": item["query"],
+        "fast_path": False,
+        "hit": rank is not None,
+        "reciprocal_rank": 1 / rank if rank else 0.0,
+        "in_context": any(chunk_key(chunk) in relevant for chunk in context_chunks),
+        "context_chunks": len(context_chunks),
+        "answer_f1": token_f1(answer, item["reference_answer"]),
+        "retrieval_ms": retrieval_ms,
+        "total_ms": total_ms,
+    }
+
+
+def _percentiles(values):
+    return {f"p{q}": float(np.percentile(values, q)) for q in (50, 95, 99)} if values else {}
+
+
+def _histogram_total(snapshot, name):
+    histogram = snapshot["histograms"].get(name)
+    return histogram["mean"] * histogram["count"] if histogram and histogram["count"] else 0
+
+
+def evaluate_config(golden, config):
+    """
+    Runs the golden set through retrieval, context selection and generation with one configuration.
+
+    Args:
+        golden (list): Items from load_golden_set.
+        config (dict): Overrides of BASE_CONFIG, with a 'name'.
+
+    Returns:
+        dict: Quality, latency and token usage summary for the configuration.
+    """
+    from rag.clients import RAG_BACKEND
+    config = dict(BASE_CONFIG, **config)
+    if config["backend"] not in (None, RAG_BACKEND):
+        raise ValueError(f"Configuration {config['name']} needs RAG_BACKEND={config['backend']} (see run_evaluation)")
+    config["backend"] = RAG_BACKEND
+    metrics.reset()
+
+    # Keep per-request pipeline logging out of the report
+    with applied_config(config), redirect_stdout(io.StringIO()):
+        if config["faq_fast_path"]:
+            from rag.answer_index import wait_for_answer_index
+            wait_for_answer_index(timeout=60)
+        started = time.perf_counter()
+        passes = []
+        with ThreadPoolExecutor(max_workers=config["concurrency"]) as pool:
+            for _ in range(config["passes"]):
+                passes.append(list(pool.map(lambda item: _evaluate_item(item, config), golden)))
+        wall_ms = (time.perf_counter() - started) * 1000
+
+    usage = metrics.snapshot("faq.generation")
+    results = [result for results in passes for result in results]
+    n = len(results)
+    input_tokens = _histogram_total(usage, "faq.generation.input_tokens")
+    output_tokens = _histogram_total(usage, "faq.generation.output_tokens")
+
+    return {
+        "config": config,
+        "queries": n,
+        "recall_at_k": sum(r["hit"] for r in results) / n,
+        "mrr": sum(r["reciprocal_rank"] for r in results) / n,
+        "context_recall": sum(r["in_context"] for r in results) / n,
+        "mean_context_chunks": sum(r["context_chunks"] for r in results) / n,
+        "answer_f1": sum(r["answer_f1"] for r in results) / n,
+        "latency_ms": _percentiles([r["total_ms"] for r in results]),
+        "retrieval_latency_ms": _percentiles([r["retrieval_ms"] for r in results]),
+        "repeat_latency_ms": _percentiles([r["total_ms"] for results in passes[1:] for r in results]),
+        "throughput_qps": n / (wall_ms / 1000) if wall_ms else None,
+        "fast_path_rate": sum(r["fast_path"] for r in results) / n,
+        "tokens": {
+            "input": input_tokens,
+            "output": output_tokens,
+            "input_per_query": input_tokens / n,
+            "output_per_query": output_tokens / n,
+        },
+        "cost_usd": usage["counters"].get("faq.generation.cost_usd", 0.0),
+        "misses": sorted({r["query"] for r in results if not r["hit"]}),
+    }
+
+
+def _evaluate_in_subprocess(configs, golden_path, backend):
+    """Evaluates configurations with another RAG_BACKEND, which is fixed when the pipeline modules are imported."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp:
+        configs_path, out_path = os.path.join(tmp, "configs.json"), os.path.join(tmp, "results.json")
+        with open(configs_path, "w", encoding="utf-8") as f:
+            json.dump(configs, f)
+        subprocess.run(
+            [sys.executable, "-m", "rag.evaluation", "--configs", configs_path, "--golden", golden_path, "--out", out_path],
+            cwd=root, env=dict(os.environ, RAG_BACKEND=backend), stdout=subprocess.DEVNULL, check=True
+        )
+        with open(out_path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def run_evaluation(configs=None, golden_path=DEFAULT_GOLDEN_SET_PATH):
+    """
+    Evaluates each configuration on the golden set. Configurations for another
+    'backend' than the current RAG_BACKEND are run in a subprocess with that backend.
+
+    Returns:
+        dict: Results keyed by configuration name, in configuration order.
+    """
+    from rag.clients import RAG_BACKEND
+    configs = configs or DEFAULT_CONFIGS
+    golden = load_golden_set(golden_path)
+
+    results = {}
+    other_backends = {}
+    for config in configs:
+        backend = config.get("backend") or RAG_BACKEND
+        if backend == RAG_BACKEND:
+            results[config["name"]] = evaluate_config(golden, config)
+        else:
+            other_backends.setdefault(backend, []).append(config)
+    for backend, backend_configs in other_backends.items():
+        results.update(_evaluate_in_subprocess(backend_configs, golden_path, backend))
+    return {config["name"]: results[config["name"]] for config in configs}
+
+
+def find_regressions(baseline, current, tolerance=QUALITY_TOLERANCE):
+    """
+    Lists quality metrics that dropped by more than `tolerance` against a baseline run.
+
+    Args:
+        baseline (dict): Results from an earlier run_evaluation.
+        current (dict): Results from this run.
+
+    Returns:
+        list: Human-readable regression descriptions.
+    """
+    regressions = []
+    for name, result in current.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in QUALITY_METRICS:
+            if result[metric] < previous[metric] - tolerance:
+                regressions.append(f"{name}: {metric} {previous[metric]:.3f} -> {result[metric]:.3f}")
+    return regressions
+
+
+def format_results(results):
+    lines = [f"{'config':<24}{'recall@k':>9}{'mrr':>7}{'ctx':>7}{'f1':>7}{'p50 ms':>9}{'p95 ms':>9}{'in tok/q':>10}{'qps':>8}{'fast':>6}"]
+    for name, r in results.items():
+        lines.append(
+            f"{name:<24}{r['recall_at_k']:>9.3f}{r['mrr']:>7.3f}{r['context_recall']:>7.3f}{r['answer_f1']:>7.3f}"
+            f"{r['latency_ms']['p50']:>9.1f}{r['latency_ms']['p95']:>9.1f}{r['tokens']['input_per_query']:>10.0f}"
+            f"{r['throughput_qps']:>8.1f}{r['fast_path_rate']:>6.2f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Offline run: python -m rag.evaluation [--configs configs.json] [--out results.json] [--baseline results.json]
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Evaluate RAG retrieval quality, latency and token usage offline.")
+    parser.add_argument("--configs", help="JSON file with a list of configurations (default: built-in set)")
+    parser.add_argument("--golden", default=DEFAULT_GOLDEN_SET_PATH, help="Golden question set")
+    parser.add_argument("--out", help="Write full results as JSON")
+    parser.add_argument("--baseline", help="Earlier results to check for quality regressions")
+    args = parser.parse_args()
+
+    # Never touch live upstreams unless explicitly asked to
+    os.environ.setdefault("RAG_BACKEND", "stub")
+
+    configs = None
+    if args.configs:
+        with open(args.configs, encoding="utf-8") as f:
+            configs = json.load(f)
+
+    results = run_evaluation(configs, args.golden)
+    print(format_results(results))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = find_regressions(json.load(f), results)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
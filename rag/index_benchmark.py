@@ -0,0 +1,158 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from rag.corpus import chunk_key, load_faq_chunks
+from rag.evaluation import DEFAULT_GOLDEN_SET_PATH, _percentiles, load_golden_set
+
+# Recall, query latency and memory of the local vector index for each embedding
+# length and storage type, on the FAQ corpus and the golden question set. Run
+# against the stub backend (RAG_BACKEND=stub) unless real embeddings are wanted.
+
+DEFAULT_DIMENSIONS = (256, 512, 1024)
+DEFAULT_DTYPES = ("float32", "float16", "int8")
+
+# Matches compared per query, as retrieval requests them
+DEFAULT_TOP_K = 5
+
+# Random unit vectors added per FAQ vector, so latency and memory are measured at a
+# realistic index size and the top-k includes distractors whose order quantization can change
+DEFAULT_PADDING = 200
+
+# Times each query is repeated for the latency percentiles
+LATENCY_REPEATS = 5
+
+
+def _settings(dtypes):
+    for dtype in dtypes:
+        yield dtype, False
+        if dtype != "float32":
+            yield dtype, True
+
+
+def _padding(count, dimensions, rng):
+    vectors = rng.standard_normal((count, dimensions)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def benchmark_dimension(bedrock, embedding_model_id, chunks, golden, dimensions, dtypes=DEFAULT_DTYPES,
+                        top_k=DEFAULT_TOP_K, padding=DEFAULT_PADDING, seed=0):
+    """
+    Benchmarks each storage setting for one embedding length.
+
+    Args:
+        bedrock: Bedrock client used for embeddings.
+        embedding_model_id (str): Bedrock model ID for embedding.
+        chunks (list): FAQ chunks.
+        golden (list): Items from load_golden_set.
+        dimensions (int): Embedding length.
+        dtypes (tuple): Storage types to compare; quantized ones run with and without rescoring.
+        top_k (int): Matches per query.
+        padding (int): Random vectors added per FAQ vector.
+        seed (int): Seed of the random vectors.
+
+    Returns:
+        dict: Results keyed by "<dimensions>/<dtype>[+rescore]".
+    """
+    # Imported here so the __main__ block can pick the backend first
+    from rag.embedder import invoke_embedding
+    from rag.stubs import StubIndex
+
+    keys = [chunk_key(chunk) for chunk in chunks]
+    vectors = np.asarray([
+        invoke_embedding(f"Q: {chunk['question']}\nA: {chunk['answer']}", bedrock, embedding_model_id, dimensions)
+        for chunk in chunks
+    ], dtype=np.float32)
+    queries = [invoke_embedding(item["query"], bedrock, embedding_model_id, dimensions) for item in golden]
+    extra = _padding(len(chunks) * padding, dimensions, np.random.default_rng(seed))
+    records = [(key, vector, {}) for key, vector in zip(keys, vectors)]
+    records += [(f"padding-{i}", vector, {}) for i, vector in enumerate(extra)]
+
+    results, exact = {}, None
+    for dtype, rescore in _settings(dtypes):
+        index = StubIndex(dtype=dtype, rescore=rescore)
+        for start in range(0, len(records), 1000):
+            index.upsert(vectors=records[start:start + 1000])
+
+        latencies, rankings = [], []
+        for query in queries:
+            for _ in range(LATENCY_REPEATS):
+                started = time.perf_counter()
+                response = index.query(vector=query, top_k=top_k)
+                latencies.append((time.perf_counter() - started) * 1000)
+            rankings.append([match["id"] for match in response["matches"]])
+        if exact is None and dtype == "float32":
+            exact = rankings
+
+        name = f"{dimensions}/{dtype}" + ("+rescore" if rescore else "")
+        results[name] = {
+            "dimensions": dimensions,
+            "dtype": dtype,
+            "rescore": rescore,
+            "vectors": len(records),
+            "recall_at_k": sum(
+                any(key in ranking for key in item["relevant_keys"]) for item, ranking in zip(golden, rankings)
+            ) / len(golden),
+            # Share of the exact float32 top-k the setting returns (1.0: quantization changed nothing)
+            "overlap_at_k": None if exact is None else float(np.mean([
+                len(set(ranking) & set(reference)) / len(reference) for ranking, reference in zip(rankings, exact)
+            ])),
+            "latency_ms": _percentiles(latencies),
+            **index.memory_usage(),
+        }
+    return results
+
+
+def run_benchmark(dimensions=DEFAULT_DIMENSIONS, dtypes=DEFAULT_DTYPES, top_k=DEFAULT_TOP_K, padding=DEFAULT_PADDING,
+                  golden_path=DEFAULT_GOLDEN_SET_PATH):
+    """
+    Benchmarks every embedding length and storage setting with the configured backend's embeddings.
+
+    Returns:
+        dict: Results keyed by "<dimensions>/<dtype>[+rescore]".
+    """
+    from rag.clients import EMBEDDING_MODEL_ID, get_bedrock_client
+    bedrock = get_bedrock_client()
+    chunks = load_faq_chunks()
+    golden = load_golden_set(golden_path, chunks)
+    results = {}
+    for size in dimensions:
+        results.update(benchmark_dimension(bedrock, EMBEDDING_MODEL_ID, chunks, golden, size, dtypes, top_k, padding))
+    return results
+
+
+def format_results(results):
+    lines = [f"{'setting':<22}{'vectors':>9}{'recall@k':>10}{'overlap':>9}{'p50 ms':>9}{'p95 ms':>9}{'search MB':>11}{'rescore MB':>12}"]
+    for name, r in results.items():
+        overlap = f"{r['overlap_at_k']:>9.3f}" if r["overlap_at_k"] is not None else f"{'-':>9}"
+        lines.append(
+            f"{name:<22}{r['vectors']:>9}{r['recall_at_k']:>10.3f}{overlap}{r['latency_ms']['p50']:>9.3f}"
+            f"{r['latency_ms']['p95']:>9.3f}{r['search_bytes'] / 1e6:>11.2f}{r['rescore_bytes'] / 1e6:>12.2f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Offline run: python -m rag.index_benchmark [--dimensions 256 512 1024] [--padding 200] [--out results.json]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare recall, latency and memory of embedding lengths and vector storage types.")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=list(DEFAULT_DIMENSIONS), choices=DEFAULT_DIMENSIONS)
+    parser.add_argument("--dtypes", nargs="+", default=list(DEFAULT_DTYPES), choices=DEFAULT_DTYPES)
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--padding", type=int, default=DEFAULT_PADDING, help="Random vectors added per FAQ vector")
+    parser.add_argument("--golden", default=DEFAULT_GOLDEN_SET_PATH, help="Golden question set")
+    parser.add_argument("--out", help="Write full results as JSON")
+    args = parser.parse_args()
+
+    # Never touch live upstreams unless explicitly asked to
+    os.environ.setdefault("RAG_BACKEND", "stub")
+
+    results = run_benchmark(args.dimensions, args.dtypes, args.top_k, args.padding, args.golden)
+    print(format_results(results))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,195 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+from rag.corpus import chunk_key, load_faq_chunks
+
+# Local BM25 index written at ingest time
+DEFAULT_LEXICAL_INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "faq_lexical_index.json")
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Reciprocal rank fusion constant
+RRF_K = 60
+
+# Number of candidates taken from each retriever before fusion
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "10"))
+
+_token = re.compile(r"[a-z0-9]+")
+_stopwords = frozenset(
+    "a an and are as at be by can do does for from how i if in is it its me my of on or our so that the "
+    "their there this to was we what when where which who why will with you your".split()
+)
+
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords removed; short acronyms like 'bvn' or '2fa' are kept."""
+    return [t for t in _token.findall((text or "").lower()) if t not in _stopwords]
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over FAQ question and answer text.
+    """
+
+    def __init__(self, docs, postings, doc_lengths):
+        self.docs = docs
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.avg_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+        n = len(docs)
+        self.idf = {
+            term: math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in postings.items()
+        }
+
+    @classmethod
+    def build(cls, chunks, ids=None):
+        """
+        Builds the index from FAQ chunks.
+
+        Args:
+            chunks (list): List of dictionaries containing 'question' and 'answer' keys.
+            ids (list, optional): Vector IDs the chunks were upserted under.
+
+        Returns:
+            LexicalIndex: The built index.
+        """
+        docs, doc_lengths = [], []
+        postings = defaultdict(list)
+        for i, chunk in enumerate(chunks):
+            tokens = tokenize(f"{chunk['question']} {chunk['answer']}")
+            for term, tf in Counter(tokens).items():
+                postings[term].append((i, tf))
+            doc_lengths.append(len(tokens))
+            docs.append({
+                "id": ids[i] if ids else chunk_key(chunk),
+                "key": chunk_key(chunk),
+                "question": chunk["question"],
+                "answer": chunk["answer"],
+            })
+        return cls(docs, dict(postings), doc_lengths)
+
+    def search(self, query, top_k=RETRIEVAL_CANDIDATES):
+        """
+        Scores documents against the query with BM25.
+
+        Returns:
+            list: (doc_index, bm25_score) pairs, best first.
+        """
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for doc, tf in plist:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc] / (self.avg_length or 1))
+                scores[doc] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    def coverage(self, query, text):
+        """IDF-weighted fraction of query terms that appear in a text."""
+        terms = set(tokenize(query))
+        known = [t for t in terms if t in self.idf]
+        if not known:
+            return 0.0
+        doc_terms = set(tokenize(text))
+        total = sum(self.idf[t] for t in known)
+        return sum(self.idf[t] for t in known if t in doc_terms) / total
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "docs": self.docs,
+                "doc_lengths": self.doc_lengths,
+                "postings": {term: plist for term, plist in self.postings.items()},
+            }, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        postings = {term: [tuple(p) for p in plist] for term, plist in data["postings"].items()}
+        return cls(data["docs"], postings, data["doc_lengths"])
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def lexical_index_path():
+    return os.getenv("LEXICAL_INDEX_PATH", DEFAULT_LEXICAL_INDEX_PATH)
+
+
+def get_lexical_index():
+    """
+    Returns the process-wide lexical index, loading the file written at ingest time
+    or building it from the FAQ corpus if no index file exists.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                path = lexical_index_path()
+                if os.path.exists(path):
+                    _index = LexicalIndex.load(path)
+                else:
+                    _index = LexicalIndex.build(load_faq_chunks())
+    return _index
+
+
+def set_lexical_index(index):
+    """Replaces the process-wide lexical index, e.g. after re-ingestion."""
+    global _index
+    with _index_lock:
+        _index = index
+
+
+def hybrid_rerank(query, dense_chunks, top_k, index=None):
+    """
+    Fuses dense and BM25 results with reciprocal rank fusion, then re-ranks the
+    fused candidates locally and keeps the best top_k.
+
+    Args:
+        query (str): The user query.
+        dense_chunks (list): Chunks returned by vector search, best first.
+        top_k (int): Number of chunks to keep.
+        index (LexicalIndex, optional): Lexical index (default: the process-wide index).
+
+    Returns:
+        list: Chunk dictionaries with 'score' (dense similarity, 0 if lexical-only),
+            'lexical_score', 'rrf_score' and 'rerank_score', best first.
+    """
+    index = index or get_lexical_index()
+    candidates = {}
+
+    for rank, chunk in enumerate(dense_chunks):
+        key = chunk_key(chunk)
+        entry = candidates.setdefault(key, dict(chunk, lexical_score=0.0, rrf_score=0.0))
+        entry["rrf_score"] += 1 / (RRF_K + rank + 1)
+
+    for rank, (doc, bm25) in enumerate(index.search(query, RETRIEVAL_CANDIDATES)):
+        d = index.docs[doc]
+        entry = candidates.setdefault(d["key"], {
+            "id": d["id"], "score": 0.0, "question": d["question"], "answer": d["answer"],
+            "lexical_score": 0.0, "rrf_score": 0.0,
+        })
+        entry["lexical_score"] = bm25
+        entry["rrf_score"] += 1 / (RRF_K + rank + 1)
+
+    # Cheap local re-rank: fused rank plus how much of the query each chunk covers,
+    # with extra weight for matches in the FAQ question itself
+    max_rrf = 2 / (RRF_K + 1)
+    for entry in candidates.values():
+        coverage = index.coverage(query, f"{entry['question']} {entry['answer']}")
+        question_coverage = index.coverage(query, entry["question"])
+        entry["rerank_score"] = 0.5 * entry["rrf_score"] / max_rrf + 0.3 * coverage + 0.2 * question_coverage
+
+    ranked = sorted(candidates.values(), key=lambda c: c["rerank_score"], reverse=True)
+    return ranked[:top_k]
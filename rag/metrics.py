@@ -0,0 +1,84 @@
+import bisect
+import threading
+
+# Default histogram bucket upper bounds (suits milliseconds and token counts alike)
+DEFAULT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 60000)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with approximate percentiles.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q):
+        """Upper bound of the bucket containing the q-th quantile."""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            cumulative += n
+            if cumulative >= target:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["inf"], self.counts)),
+        }
+
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+def increment(name, value=1):
+    """Adds to a named counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS):
+    """Records a value in a named histogram, creating it with the given buckets on first use."""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram(buckets)
+        histogram.observe(value)
+
+
+def snapshot(prefix=None):
+    """
+    Returns all counters and histogram summaries, optionally only those whose name starts with prefix.
+    """
+    with _lock:
+        return {
+            "counters": {k: v for k, v in sorted(_counters.items()) if prefix is None or k.startswith(prefix)},
+            "histograms": {k: h.snapshot() for k, h in sorted(_histograms.items()) if prefix is None or k.startswith(prefix)},
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
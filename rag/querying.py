@@ -1,37 +1,32 @@
 import json
-import boto3
-from pinecone import Pinecone
 import uuid
-from dotenv import load_dotenv
 import os
-
-# Load environment variables from .env file (for local development)
-load_dotenv()
-
-# Retrieve AWS credentials from environment variables
-aws_access_key_id = os.getenv("aws_access_key_id")
-aws_secret_access_key = os.getenv("aws_secret_access_key")
-aws_region = "us-east-1"
-
-if aws_secret_access_key is None or aws_access_key_id is None:
-    print("AWS credentials not found in environment variables.")
-    raise ValueError("Please set AWS credentials in the environment variables.")
-
-# Initialize Pinecone connection
-pc = Pinecone(api_key="pcsk_5pEARi_DNbj63Mj7ABLU113t4z64p68KZeFwK5UoYMvRHzjWcGycbb3PUi5WNE1LsZ76vs")
-
-# Initialize Bedrock client
-bedrock = boto3.client(service_name='bedrock-runtime', region_name='us-east-1',aws_access_key_id=aws_access_key_id, aws_secret_access_key=aws_secret_access_key)
-
-# Pinecone index name
-index_name = "farmcredit"
-index = pc.Index(index_name)
+import time
+from rag import metrics
+from rag.answer_index import lookup_faq_answer, record_full_answer
+from rag.answers import ERROR_MESSAGE, fallback_answer, normalize_query
+from rag.clients import EMBEDDING_MODEL_ID, get_bedrock_client, get_vector_index
+from rag.coalesce import COALESCE_REQUESTS, query_flight
+from rag.context import format_chunk, record_generation, select_context
+from rag.deadline import DeadlineExceeded, generate_with_deadline
+from rag.embedder import embed_query
+from rag.lexical import RETRIEVAL_CANDIDATES, hybrid_rerank
+from rag.resilience import UpstreamUnavailable, guarded
+from rag.tenants import get_tenant
+
+# Bedrock client and Pinecone index for the configured backend (RAG_BACKEND)
+bedrock = get_bedrock_client()
+index = get_vector_index()
+
+# Fuse vector search with the local BM25 index and re-rank locally
+hybrid_retrieval = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
 
 # Model IDs
-embedding_model_id = "amazon.titan-embed-text-v2:0"
+embedding_model_id = EMBEDDING_MODEL_ID
 generation_model_id = "anthropic.claude-3-5-sonnet-20240620-v1:0"
 
-def retrieve_similar_chunks(query, top_k=5, bedrock=bedrock, embedding_model_id=embedding_model_id, index=index):
+def retrieve_similar_chunks(query, top_k=5, bedrock=bedrock, embedding_model_id=embedding_model_id, index=index, deadline=None,
+                            query_embedding=None, tenant=None):
     """
     Embeds the query using Bedrock and retrieves the top_k most similar chunks from Pinecone.
 
@@ -41,58 +36,70 @@ def retrieve_similar_chunks(query, top_k=5, bedrock=bedrock, embedding_model_id=
         bedrock (boto3.client): Bedrock client for embedding.
         embedding_model_id (str): Bedrock model ID for embedding.
         index (pinecone.Index): Pinecone index to query.
+        deadline (Deadline, optional): Request deadline checked before each upstream call.
+        query_embedding (list, optional): The query's embedding, if already computed.
+        tenant (Tenant, optional): Tenant whose FAQ namespace and lexical index to
+            search (default: FarmCredit's own).
 
     Returns:
         list: List of dictionaries containing the top_k chunks with their metadata and scores.
     """
+    tenant = tenant or get_tenant()
     try:
-        # Prepare the input for embedding
-        input_data = {
-            "inputText": query,
-            "dimensions": 512,
-            "normalize": True
-        }
-
-        # Serialize to JSON
-        body = json.dumps(input_data).encode('utf-8')
-
-        # Generate query embedding using Bedrock
-        response = bedrock.invoke_model(
-            modelId=embedding_model_id,
-            contentType="application/json",
-            accept="*/*",
-            body=body
-        )
-
-        response_body = response['body'].read()
-        response_json = json.loads(response_body)
-        query_embedding = response_json['embedding']
-
-        # Query Pinecone for top_k similar chunks
-        query_results = index.query(
-            vector=query_embedding,
-            top_k=top_k,
-            include_metadata=True
-        )
-
-        # Format results as a list of dictionaries
-        retrieved_chunks = [
-            {
-                "id": match["id"],
-                "score": match["score"],
-                "question": match["metadata"]["question"],
-                "answer": match["metadata"]["answer"]
-            }
-            for match in query_results["matches"]
-        ]
+        if deadline is not None and query_embedding is None:
+            deadline.check("embedding")
+
+        try:
+            # Generate query embedding using Bedrock (shared with concurrent identical queries)
+            if query_embedding is None:
+                query_embedding = embed_query(query, bedrock, embedding_model_id, cache=tenant.embedding_cache, deadline=deadline)
+
+            if deadline is not None:
+                deadline.check("vector search")
+
+            # Query Pinecone for similar chunks, with extra candidates for re-ranking
+            query_results = guarded(
+                "pinecone",
+                deadline,
+                index.query,
+                vector=query_embedding,
+                top_k=max(top_k, RETRIEVAL_CANDIDATES) if hybrid_retrieval else top_k,
+                include_metadata=True,
+                namespace=tenant.namespace
+            )
+
+            # Format results as a list of dictionaries
+            retrieved_chunks = [
+                {
+                    "id": match["id"],
+                    "score": match["score"],
+                    "question": match["metadata"]["question"],
+                    "answer": match["metadata"]["answer"]
+                }
+                for match in query_results["matches"]
+            ]
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if not hybrid_retrieval:
+                raise
+            # Degraded mode: lexical-only retrieval from the local BM25 index
+            print(f"Vector search unavailable ({e}), using lexical retrieval only")
+            metrics.increment("faq.degraded.lexical_retrieval")
+            retrieved_chunks = []
+
+        if hybrid_retrieval:
+            retrieved_chunks = hybrid_rerank(query, retrieved_chunks, top_k, index=tenant.lexical_index())
 
         return retrieved_chunks
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"Error retrieving chunks: {e}")
         raise
 
-def generate_answer(query, retrieved_chunks, bedrock=bedrock, generation_model_id=generation_model_id):
+def generate_answer(query, retrieved_chunks, bedrock=bedrock, generation_model_id=generation_model_id, deadline=None):
     """
     Generates a final answer using Bedrock based on the query and retrieved chunks.
 
@@ -101,16 +108,14 @@ def generate_answer(query, retrieved_chunks, bedrock=bedrock, generation_model_i
         retrieved_chunks (list): List of retrieved chunks with metadata.
         bedrock (boto3.client): Bedrock client for text generation.
         generation_model_id (str): Bedrock model ID for text generation.
+        deadline (Deadline, optional): Request deadline; generation is streamed and stopped when it expires.
 
     Returns:
         str: The generated answer.
     """
     try:
         # Format the context from retrieved chunks
-        context = "\n\n".join(
-            f"Q: {chunk['question']}\nA: {chunk['answer']}"
-            for chunk in retrieved_chunks
-        )
+        context = "\n\n".join(format_chunk(chunk) for chunk in retrieved_chunks)
 
         # Create the prompt for the generation model
         prompt = f"""You are a helpful assistant for FarmCredit, a platform supporting Nigerian youth farmers. Use the following context to answer the user's query concisely and accurately. If the context doesn't fully address the query, provide a general response based on FarmCredit's mission and services.
@@ -136,6 +141,14 @@ Answer:"""
             ]
         }
 
+        started_at = time.monotonic()
+        if deadline is not None:
+            # Stream so the generation can be abandoned when the deadline passes
+            usage = {}
+            answer = generate_with_deadline(bedrock, generation_model_id, input_data, deadline, usage=usage)
+            record_generation("faq", prompt, (time.monotonic() - started_at) * 1000, usage, generation_model_id)
+            return answer.strip()
+
         # Serialize to JSON
         body = json.dumps(input_data).encode('utf-8')
 
@@ -152,33 +165,92 @@ Answer:"""
 
         # Extract the generated answer
         answer = response_json['content'][0]['text']
+        record_generation("faq", prompt, (time.monotonic() - started_at) * 1000, response_json.get('usage'), generation_model_id)
 
         return answer.strip()
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"Error generating answer: {e}")
         raise
 
-def rag_pipeline(query):
+def rag_pipeline(query, deadline=None, tenant=None):
+    """
+    Answers a query, sharing one retrieval and generation call between
+    concurrent requests for the same normalized query.
+
+    Args:
+        query (str): The user query.
+        deadline (Deadline, optional): Request deadline. If it passes while waiting
+            for a shared call, a cached answer or retry message is returned.
+        tenant (Tenant, optional): Tenant whose FAQ answers the query (default: FarmCredit's own).
+
+    Returns:
+        str: The final generated answer.
     """
-    Combines retrieval and generation to answer a query.
+    tenant = tenant or get_tenant()
+    if not COALESCE_REQUESTS:
+        return answer_query(query, deadline=deadline, tenant=tenant)
+    try:
+        return query_flight.do_with_deadline(
+            (tenant.id, normalize_query(query)),
+            lambda shared_deadline: answer_query(query, deadline=shared_deadline, tenant=tenant),
+            deadline
+        )
+    except DeadlineExceeded as e:
+        print(f"RAG pipeline stopped: {e}")
+        return fallback_answer(query, cache=tenant.answer_cache)
+
+def answer_query(query, deadline=None, tenant=None):
+    """
+    Combines retrieval and generation to answer a query, unless it is an FAQ
+    question (or a close paraphrase of one) that is answered from the answer index.
 
     Args:
         query (str): The user query.
+        deadline (Deadline, optional): Request deadline. When too little budget is
+            left for generation, a cached or retrieval-only answer is returned.
+        tenant (Tenant, optional): Tenant whose FAQ answers the query (default: FarmCredit's own).
 
     Returns:
         str: The final generated answer.
     """
+    tenant = tenant or get_tenant()
+    started_at = time.monotonic()
+    retrieved_chunks = None
     try:
-        # Retrieve top 5 similar chunks
-        retrieved_chunks = retrieve_similar_chunks(query, top_k=5)
-        print(retrieved_chunks)
+        # The query is an FAQ question or a close paraphrase: answer with the FAQ's answer
+        answer, query_embedding = lookup_faq_answer(
+            query, lambda: embed_query(query, bedrock, embedding_model_id, cache=tenant.embedding_cache, deadline=deadline), deadline, tenant=tenant)
+        if answer is not None:
+            return answer
+
+        # Retrieve up to 5 re-ranked chunks and keep only those relevant enough to help
+        retrieved_chunks = retrieve_similar_chunks(query, top_k=5, deadline=deadline, query_embedding=query_embedding, tenant=tenant)
+        context_chunks = select_context(retrieved_chunks, max_chunks=5, pipeline="faq")
+
+        if deadline is not None and not deadline.allows_generation():
+            print(f"Skipping generation with {deadline.remaining_ms():.0f}ms left")
+            return fallback_answer(query, retrieved_chunks, cache=tenant.answer_cache)
+
         # Generate answer using retrieved chunks
-        answer = generate_answer(query, retrieved_chunks)
+        answer = guarded("bedrock_generation", deadline, generate_answer, query, context_chunks, deadline=deadline)
+        tenant.answer_cache.put(query, answer)
+        record_full_answer((time.monotonic() - started_at) * 1000)
         return answer
+    except DeadlineExceeded as e:
+        print(f"RAG pipeline stopped: {e}")
+        return fallback_answer(query, retrieved_chunks, cache=tenant.answer_cache)
+    except UpstreamUnavailable as e:
+        # Degraded mode: Bedrock is over quota or failing, answer without generation
+        print(f"RAG pipeline degraded: {e}")
+        metrics.increment("faq.degraded.no_generation")
+        return fallback_answer(query, retrieved_chunks, cache=tenant.answer_cache)
     except Exception as e:
-        print(f"Error in RAG pipeline: {e}")
-        return "Sorry, an error occurred while processing your query. Please try again."
+        print(f"Error in RAG pipeline: {e!r}")
+        metrics.increment("faq.errors")
+        return ERROR_MESSAGE
 
 
 #print(rag_pipeline("frank and nancy are in diagreement of who should be the lead of data innovations"))
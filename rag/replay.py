@@ -0,0 +1,174 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+# Recorded upstream traffic ("cassette"): one JSON object per line with the request
+# key, operation, request, and either the response body or the streamed events with
+# their offsets, plus the observed latency.
+DEFAULT_RECORDINGS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "recordings.jsonl")
+
+# Upstream operations
+EMBEDDING = "embedding"
+GENERATION = "generation"
+GENERATION_STREAM = "generation_stream"
+VECTOR_QUERY = "vector_query"
+
+
+def recordings_path():
+    return os.getenv("RECORDINGS_PATH", DEFAULT_RECORDINGS_PATH)
+
+
+def bedrock_operation(request, stream=False):
+    if stream:
+        return GENERATION_STREAM
+    return EMBEDDING if "inputText" in request else GENERATION
+
+
+def request_key(operation, target, request):
+    """
+    Stable key for an upstream request.
+
+    Args:
+        operation (str): Upstream operation.
+        target (str): Model ID or index namespace.
+        request (dict): Request body; vectors are rounded so float noise does not change the key.
+    """
+    if operation == VECTOR_QUERY:
+        request = dict(request, vector=[round(v, 6) for v in request["vector"]])
+    canonical = json.dumps({"operation": operation, "target": target, "request": request}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    Thread-safe store of recorded upstream responses, appended to a JSON lines file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def record(self, operation, target, request, latency_ms, response=None, events=None):
+        key = request_key(operation, target, request)
+        entry = {"key": key, "operation": operation, "target": target, "request": request, "latency_ms": round(latency_ms, 2)}
+        if events is not None:
+            entry["events"] = events
+        else:
+            entry["response"] = response
+        with self.lock:
+            self.entries[key] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        return entry
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class _RecordedStream:
+    """
+    Passes stream events through to the caller while recording payloads and their timing.
+
+    Only complete streams are recorded; one abandoned at a deadline is dropped.
+    """
+
+    def __init__(self, stream, on_complete, started_at):
+        self.stream = stream
+        self.on_complete = on_complete
+        self.started_at = started_at
+        self.events = []
+        self.completed = False
+
+    def _complete(self):
+        if not self.completed:
+            self.completed = True
+            self.on_complete(self.events)
+
+    def __iter__(self):
+        for event in self.stream:
+            chunk = event.get("chunk")
+            if chunk:
+                offset_ms = (time.monotonic() - self.started_at) * 1000
+                payload = json.loads(chunk["bytes"])
+                self.events.append({"offset_ms": round(offset_ms, 2), "payload": payload})
+                # Callers stop reading at message_stop, so record it before handing it over
+                if payload.get("type") == "message_stop":
+                    self._complete()
+            yield event
+        self._complete()
+
+    def close(self):
+        close = getattr(self.stream, "close", None)
+        if close is not None:
+            close()
+
+
+class RecordingBedrock:
+    """
+    Wraps a real Bedrock runtime client and records every response to a cassette.
+    """
+
+    def __init__(self, client, cassette):
+        self.client = client
+        self.cassette = cassette
+
+    def invoke_model(self, modelId, body, **kwargs):
+        request = json.loads(body)
+        started_at = time.monotonic()
+        response = self.client.invoke_model(modelId=modelId, body=body, **kwargs)
+        raw = response["body"].read()
+        latency_ms = (time.monotonic() - started_at) * 1000
+        self.cassette.record(bedrock_operation(request), modelId, request, latency_ms, response=json.loads(raw))
+        return dict(response, body=io.BytesIO(raw))
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs):
+        request = json.loads(body)
+        started_at = time.monotonic()
+        response = self.client.invoke_model_with_response_stream(modelId=modelId, body=body, **kwargs)
+
+        def on_complete(events):
+            latency_ms = events[0]["offset_ms"] if events else (time.monotonic() - started_at) * 1000
+            self.cassette.record(GENERATION_STREAM, modelId, request, latency_ms, events=events)
+
+        return dict(response, body=_RecordedStream(response["body"], on_complete, started_at))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def _to_dict(response):
+    return response.to_dict() if hasattr(response, "to_dict") else response
+
+
+class RecordingIndex:
+    """
+    Wraps a real Pinecone index and records every query response to a cassette.
+    """
+
+    def __init__(self, index, cassette):
+        self.index = index
+        self.cassette = cassette
+
+    def query(self, vector, top_k=10, include_metadata=False, namespace=None, **kwargs):
+        request = {"vector": list(vector), "top_k": top_k, "include_metadata": include_metadata}
+        started_at = time.monotonic()
+        response = _to_dict(self.index.query(vector=vector, top_k=top_k, include_metadata=include_metadata, namespace=namespace, **kwargs))
+        latency_ms = (time.monotonic() - started_at) * 1000
+        self.cassette.record(VECTOR_QUERY, namespace or "", request, latency_ms, response=response)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
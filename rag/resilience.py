@@ -0,0 +1,258 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from rag.deadline import DeadlineExceeded
+
+# Server worker processes on this host; each takes an equal share of the upstream quotas
+SERVER_WORKERS = max(1, int(os.getenv("SERVER_WORKERS", "1")))
+
+# Client-side request rates per upstream, tuned to the account quotas (requests per second)
+UPSTREAM_RATES = {
+    "bedrock_embedding": float(os.getenv("BEDROCK_EMBEDDING_RPS", "50")) / SERVER_WORKERS,
+    "bedrock_generation": float(os.getenv("BEDROCK_GENERATION_RPS", "10")) / SERVER_WORKERS,
+    "pinecone": float(os.getenv("PINECONE_RPS", "100")) / SERVER_WORKERS,
+}
+
+# How long a call may wait for a rate-limit token before it is rejected
+RATE_LIMIT_MAX_WAIT_MS = float(os.getenv("RATE_LIMIT_MAX_WAIT_MS", "250"))
+
+# Consecutive failures that open a circuit, and how long it stays open before a trial call
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+# Concurrent request slots, how many are kept free for credit scoring,
+# and the most AI (FAQ/conversation) requests admitted at once
+SHED_CAPACITY = int(os.getenv("SHED_CAPACITY", "40"))
+SHED_RESERVED_FOR_SCORING = int(os.getenv("SHED_RESERVED_FOR_SCORING", "8"))
+SHED_MAX_AI_CONCURRENT = int(os.getenv("SHED_MAX_AI_CONCURRENT", "24"))
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when an upstream call is not attempted because the upstream is unhealthy or over quota."""
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    """Raised when an upstream's circuit breaker is open."""
+
+
+class RateLimited(UpstreamUnavailable):
+    """Raised when no rate-limit token became available in time."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `rate` tokens per second.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, timeout_ms=0.0):
+        """
+        Takes one token, waiting up to timeout_ms for one to become available.
+
+        Returns:
+            bool: True if a token was taken.
+        """
+        give_up_at = time.monotonic() + timeout_ms / 1000
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+            if now + wait > give_up_at:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated upstream failures.
+
+    Closed: calls pass through. After `failure_threshold` consecutive failures the
+    circuit opens and calls are rejected for `reset_seconds`; then a single trial
+    call is let through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self.trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+    def release(self):
+        """Ends a call that neither succeeded nor failed (e.g. stopped at a deadline)."""
+        with self.lock:
+            self.trial_in_flight = False
+
+
+class Upstream:
+    """
+    Rate limiter, circuit breaker and counters for one upstream dependency.
+    """
+
+    def __init__(self, name, rate):
+        self.name = name
+        self.bucket = TokenBucket(rate)
+        self.breaker = CircuitBreaker()
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "failures": 0, "rejected_open": 0, "rejected_rate": 0}
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def call(self, deadline, fn, /, *args, **kwargs):
+        """
+        Calls fn(*args, **kwargs) through the rate limiter and circuit breaker.
+
+        Args:
+            deadline (Deadline or None): Caps how long to wait for a rate-limit token.
+            fn (callable): The upstream call.
+
+        Returns:
+            The result of fn.
+
+        Raises:
+            CircuitOpenError: If the circuit is open.
+            RateLimited: If no token became available in time.
+        """
+        if not self.breaker.allow():
+            self._count("rejected_open")
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        max_wait = RATE_LIMIT_MAX_WAIT_MS
+        if deadline is not None:
+            max_wait = min(max_wait, deadline.remaining_ms())
+        if not self.bucket.acquire(max_wait):
+            self.breaker.release()
+            self._count("rejected_rate")
+            raise RateLimited(f"{self.name} rate limit reached")
+
+        self._count("calls")
+        try:
+            result = fn(*args, **kwargs)
+        except DeadlineExceeded:
+            self.breaker.release()
+            raise
+        except Exception:
+            self._count("failures")
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, state=self.breaker.state)
+
+
+upstreams = {name: Upstream(name, rate) for name, rate in UPSTREAM_RATES.items()}
+
+
+def guarded(name, deadline, fn, /, *args, **kwargs):
+    """Calls fn(*args, **kwargs) through the named upstream's rate limiter and circuit breaker."""
+    return upstreams[name].call(deadline, fn, *args, **kwargs)
+
+
+class LoadShedder:
+    """
+    Priority admission control for request handlers.
+
+    Credit scoring ("high") is always admitted. AI requests ("low") are admitted
+    only while fewer than max_low are running and the total leaves `reserved`
+    slots free, so FAQ and conversation spikes cannot starve scoring.
+    """
+
+    def __init__(self, capacity=SHED_CAPACITY, reserved=SHED_RESERVED_FOR_SCORING, max_low=SHED_MAX_AI_CONCURRENT):
+        self.capacity = capacity
+        self.reserved = reserved
+        self.max_low = max_low
+        self.in_flight = {"high": 0, "low": 0}
+        self.shed = 0
+        self.lock = threading.Lock()
+
+    def try_acquire(self, priority):
+        with self.lock:
+            if priority == "low":
+                total = self.in_flight["high"] + self.in_flight["low"]
+                if self.in_flight["low"] >= self.max_low or total >= self.capacity - self.reserved:
+                    self.shed += 1
+                    return False
+            self.in_flight[priority] += 1
+            return True
+
+    def release(self, priority):
+        with self.lock:
+            self.in_flight[priority] -= 1
+
+    @contextmanager
+    def admit(self, priority):
+        """
+        Context manager yielding whether the request was admitted; releases the slot on exit.
+        """
+        admitted = self.try_acquire(priority)
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self.release(priority)
+
+    def get_stats(self):
+        with self.lock:
+            return {"in_flight": dict(self.in_flight), "shed": self.shed}
+
+
+load_shedder = LoadShedder()
+
+
+def get_resilience_stats():
+    """Returns rate-limit, circuit-breaker and load-shedding counters."""
+    return {
+        "upstreams": {name: upstream.get_stats() for name, upstream in upstreams.items()},
+        "load_shedding": load_shedder.get_stats(),
+    }
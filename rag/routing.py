@@ -0,0 +1,195 @@
+import os
+import re
+
+from rag.answers import normalize_query
+
+# Bedrock models for simple and complex conversation turns
+SMALL_MODEL_ID = os.getenv("CONVERSE_SMALL_MODEL_ID", "anthropic.claude-3-haiku-20240307-v1:0")
+LARGE_MODEL_ID = os.getenv("CONVERSE_LARGE_MODEL_ID", "anthropic.claude-3-5-sonnet-20240620-v1:0")
+
+# Output token budgets per model route
+SMALL_MAX_TOKENS = int(os.getenv("CONVERSE_SMALL_MAX_TOKENS", "200"))
+LARGE_MAX_TOKENS = int(os.getenv("CONVERSE_LARGE_MAX_TOKENS", "500"))
+
+# Turns longer than this many words go to the large model
+COMPLEX_MIN_WORDS = int(os.getenv("CONVERSE_COMPLEX_MIN_WORDS", "20"))
+
+# Lender named in templated replies; partner tenants use their own name
+DEFAULT_BRAND = "FarmCredit"
+
+# Routes
+GREETING = "greeting"
+ACCOUNT = "account"
+SMALL = "small"
+LARGE = "large"
+
+_greeting_words = frozenset(
+    "hi hello hey hiya howdy yo good morning afternoon evening day there farmcredit".split()
+)
+
+# Closing turns ("thanks", "ok bye") get their own reply rather than a greeting
+CLOSING = "closing"
+_thanks_words = frozenset("thanks thank thx cheers".split())
+_goodbye_words = frozenset("bye goodbye later".split())
+_closing_words = _thanks_words | _goodbye_words | frozenset("you see ok okay alright great".split())
+
+# Account lookups answered straight from user_info. A turn is only a lookup if the
+# rest of it is filler, so "what is my loan interest rate" or "what loans can I get
+# with my farm" go to a model instead.
+_account_intents = {
+    "balance": re.compile(r"\b(wallet )?balance\b|\bhow much (money )?(is )?in my wallet\b|\bmy wallet\b"),
+    "credit_score": re.compile(r"\b(credit )?(score|rating)\b"),
+    "loans": re.compile(r"\b(my|any|current|active|existing) loans?\b|\bhow many loans\b"),
+}
+_lookup_filler = frozenset(
+    "what whats is are my the a an me show tell check see view current how much many do i have "
+    "any in of on please can could you give total now today".split()
+)
+
+# "Why is my score low?" or "how do I improve my score?", answered from the score's reason codes
+SCORE_REASONS = "score_reasons"
+_score_words = re.compile(r"\b(score|rating)\b")
+_score_reason_markers = re.compile(
+    r"\b(why|low|lower|improve|increase|raise|boost|better|higher|affects?|factors?|hurting|reasons?)\b"
+)
+
+# Reason codes suggested in a score explanation
+SCORE_REASONS_SHOWN = int(os.getenv("SCORE_REASONS_SHOWN", "3"))
+
+# Requests to do something with the account rather than look it up
+_action_words = frozenset(
+    "pay repay apply withdraw deposit transfer fund send borrow take request cancel update change".split()
+)
+
+# Words that signal the user wants advice, reasoning or a multi-step answer
+_complex_markers = re.compile(
+    r"\b(why|how (can|do|should|would)|explain|compare|difference|should i|improve|increase|reduce|"
+    r"plan|advice|recommend|calculate|eligible|qualify|what if|pros|cons)\b"
+)
+
+
+def classify_turn(query):
+    """
+    Classifies a conversation turn with cheap local heuristics.
+
+    Args:
+        query (str): The user message.
+
+    Returns:
+        tuple: (route, intent) where route is one of GREETING, ACCOUNT, SMALL or
+            LARGE and intent names the account lookup for ACCOUNT turns (and is
+            CLOSING for greeting turns that end the conversation).
+    """
+    text = normalize_query(query)
+    words = text.split()
+
+    if words and len(words) <= 5 and all(w in _greeting_words or w in _closing_words for w in words):
+        return GREETING, (CLOSING if _closing_words.intersection(words) else None)
+
+    if ("my" in words and _score_words.search(text) and _score_reason_markers.search(text)
+            and not _action_words.intersection(words)):
+        return ACCOUNT, SCORE_REASONS
+
+    complex_turn = (
+        len(words) > COMPLEX_MIN_WORDS
+        or (query or "").count("?") > 1
+        or _complex_markers.search(text) is not None
+    )
+
+    if not complex_turn and len(words) <= 8 and not _action_words.intersection(words):
+        for intent, pattern in _account_intents.items():
+            match = pattern.search(text)
+            if match and all(w in _lookup_filler for w in (text[:match.start()] + " " + text[match.end():]).split()):
+                return ACCOUNT, intent
+
+    return (LARGE if complex_turn else SMALL), None
+
+
+def _naira(amount):
+    return f"₦{amount:,.2f}"
+
+
+def explain_score(user_info, brand=DEFAULT_BRAND):
+    """
+    Answers "why is my score what it is" from the score's reason codes: the
+    factors with the most points to gain that the farmer can act on.
+
+    Args:
+        user_info (dict): The signed-in user's details, with "reason_codes".
+        brand (str): Name of the lender the user is talking to.
+
+    Returns:
+        str: The explanation.
+    """
+    from credit_score import REASONS  # Only loaded for score explanations
+
+    rating = f" ({user_info['credit_rating']})" if user_info.get("credit_rating") else ""
+    opening = f"Your {brand} credit score is {user_info['credit_score']:.0f}{rating}."
+
+    steps = []
+    for reason in user_info["reason_codes"]:
+        label, action = REASONS.get(reason["code"], (None, None))
+        gain = (reason["next"]["points"] if reason.get("next") else reason["max_points"]) - reason["points"]
+        if action and gain > 0:
+            # Factor points are scaled onto the 300-850 score range
+            steps.append(f"{action[0].lower()}{action[1:]} (up to +{max(1, round(gain * 550 / 850))})")
+        if len(steps) == SCORE_REASONS_SHOWN:
+            break
+
+    if not steps:
+        return f"{opening} Every factor you can act on is already in its best band; keep repaying on time and using your wallet to hold it there."
+    return f"{opening} The quickest ways to raise it: {'; '.join(steps)}."
+
+
+def template_answer(route, intent, user_info, brand=DEFAULT_BRAND, query=None):
+    """
+    Answers greeting and account-lookup turns from user_info without calling a model.
+
+    Args:
+        route (str): GREETING or ACCOUNT.
+        intent (str): The account lookup for ACCOUNT turns, or CLOSING.
+        user_info (dict, optional): The signed-in user's details.
+        brand (str): Name of the lender the user is talking to (the tenant's).
+        query (str, optional): The user message, to tell thanks from goodbyes.
+
+    Returns:
+        str: The templated reply.
+    """
+    first_name = user_info["name"].split()[0] if user_info and user_info.get("name") else None
+    name = f" {first_name}" if first_name else ""
+
+    if route == GREETING and intent == CLOSING:
+        words = set(normalize_query(query).split())
+        if _thanks_words.intersection(words):
+            return f"You're welcome{name}! Is there anything else I can help you with on {brand}?"
+        if _goodbye_words.intersection(words):
+            return f"Goodbye{name}! Come back any time you need help with {brand}."
+        return f"Great{name}! Is there anything else I can help you with on {brand}?"
+
+    if route == GREETING:
+        return f"Hello{name}! How can I help you with {brand} today?"
+
+    if not user_info:
+        return f"Please sign in or sign up on {brand} to see your account details."
+
+    if intent == "balance":
+        return f"Your {brand} wallet balance is {_naira(user_info['wallet_balance'])}."
+    if intent == "credit_score":
+        return f"Your current {brand} credit score is {user_info['credit_score']:.0f}."
+    if intent == SCORE_REASONS:
+        return explain_score(user_info, brand)
+    if intent == "loans":
+        loans = user_info.get("available_loans") or []
+        if not loans:
+            return f"You don't have any loans on {brand} at the moment."
+        total = sum(loan["amount_disbursed"] for loan in loans)
+        noun = "loan" if len(loans) == 1 else "loans"
+        return f"You have {len(loans)} {noun} on {brand} with {_naira(total)} disbursed in total."
+    raise ValueError(f"No template for route {route!r} intent {intent!r}")
+
+
+def model_for_route(route):
+    """Returns the (model_id, max_tokens) used for a SMALL or LARGE turn."""
+    if route == SMALL:
+        return SMALL_MODEL_ID, SMALL_MAX_TOKENS
+    return LARGE_MODEL_ID, LARGE_MAX_TOKENS
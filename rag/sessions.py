@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any
+
+import numpy as np
+
+import shared_cache
+from rag import metrics
+
+# Conversations are kept server-side for this long after their last turn
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+
+# The trail kept for a conversation: its most recent messages, each cut to a length
+SESSION_TRAIL_MESSAGES = int(os.getenv("SESSION_TRAIL_MESSAGES", "10"))
+SESSION_MESSAGE_CHARS = int(os.getenv("SESSION_MESSAGE_CHARS", "500"))
+
+# A follow-up whose embedding is at least this similar to the query that last
+# retrieved chunks for the conversation re-ranks those chunks instead of searching again
+SESSION_REUSE_SIMILARITY = float(os.getenv("SESSION_REUSE_SIMILARITY", "0.8"))
+
+
+def compact_trail(messages: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Keep the most recent messages of a conversation trail, cut to SESSION_MESSAGE_CHARS
+    and renumbered from 1.
+    """
+    messages = sorted(messages or [], key=lambda m: m.get("message_position", 0))[-SESSION_TRAIL_MESSAGES:]
+    return [
+        {"message_position": position, "sender": m.get("sender"), "message": (m.get("message") or "")[:SESSION_MESSAGE_CHARS]}
+        for position, m in enumerate(messages, 1)
+    ]
+
+
+class Session:
+    """
+    Server-side state of one conversation: the signed-in user's details, the
+    compacted trail and the chunks last retrieved with the embedding of their query.
+    """
+
+    def __init__(self, conversation_id: str, user_info: Optional[Dict[str, Any]] = None,
+                 trail: Optional[List[Dict[str, Any]]] = None, retrieval: Optional[Dict[str, Any]] = None,
+                 tenant_id: Optional[str] = None):
+        self.conversation_id = conversation_id
+        self.tenant_id = tenant_id
+        self.user_info = user_info
+        self.trail = trail or []
+        self.retrieval = retrieval
+        self.resumed = False
+
+    def add_turn(self, query: str, answer: Optional[str]) -> None:
+        """Append a user query and its answer to the trail."""
+        position = len(self.trail)
+        self.trail = compact_trail(self.trail + [
+            {"message_position": position + 1, "sender": "user", "message": query},
+            {"message_position": position + 2, "sender": "assistant", "message": answer or ""},
+        ])
+
+    def reusable_chunks(self, query_embedding: List[float]) -> Optional[List[Dict[str, Any]]]:
+        """
+        The chunks last retrieved for this conversation, if the query that retrieved
+        them is similar enough to this one (the same topic).
+        """
+        if not self.retrieval or not self.retrieval.get("embedding"):
+            return None
+        anchor = np.asarray(self.retrieval["embedding"], dtype=np.float32)
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        if anchor.shape != vector.shape:
+            return None
+        norms = float(np.linalg.norm(anchor) * np.linalg.norm(vector))
+        if norms == 0 or float(anchor @ vector) / norms < SESSION_REUSE_SIMILARITY:
+            return None
+        return self.retrieval["chunks"]
+
+    def remember_retrieval(self, query_embedding: List[float], chunks: List[Dict[str, Any]]) -> None:
+        """Keep vector search results (before re-ranking) and the embedding of their query."""
+        self.retrieval = {"embedding": list(query_embedding), "chunks": chunks}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "conversation_id": self.conversation_id,
+            "tenant_id": self.tenant_id,
+            "user_info": self.user_info,
+            "trail": self.trail,
+            "retrieval": self.retrieval,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Session":
+        return cls(data["conversation_id"], data.get("user_info"), data.get("trail"), data.get("retrieval"), data.get("tenant_id"))
+
+
+class SessionStore:
+    """
+    Thread-safe LRU store of conversation sessions keyed by conversation id, with
+    sessions expiring SESSION_TTL_SECONDS after their last turn.
+
+    Misses fall through to the cross-worker shared cache when it is enabled, so a
+    follow-up turn can be served by any worker.
+    """
+
+    def __init__(self, max_size: int = SESSION_MAX_COUNT, ttl_seconds: float = SESSION_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.shared = shared_cache.get_cache("sessions", ttl_seconds)
+        self.evictions = 0
+
+    def get(self, conversation_id: str) -> Optional[Session]:
+        with self.lock:
+            entry = self.entries.get(conversation_id)
+            if entry is not None:
+                data, stored_at = entry
+                if time.monotonic() - stored_at <= self.ttl_seconds:
+                    self.entries.move_to_end(conversation_id)
+                    return Session.from_dict(data)
+                del self.entries[conversation_id]
+                self.evictions += 1
+
+        data = self.shared.get(conversation_id)
+        if data is None:
+            return None
+        self._store(conversation_id, data)
+        return Session.from_dict(data)
+
+    def save(self, session: Session) -> None:
+        data = session.to_dict()
+        self._store(session.conversation_id, data)
+        self.shared.put(session.conversation_id, data)
+
+    def _store(self, conversation_id: str, data: Dict[str, Any]) -> None:
+        with self.lock:
+            self.entries[conversation_id] = (data, time.monotonic())
+            self.entries.move_to_end(conversation_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+session_store = SessionStore()
+
+
+def open_session(conversation_id: Optional[str], user_info: Optional[Dict[str, Any]] = None,
+                 user_info_sent: bool = True, context: Optional[List[Dict[str, Any]]] = None,
+                 tenant_id: Optional[str] = None) -> Session:
+    """
+    Resume a conversation, or start one when the id is missing, unknown or expired.
+
+    Only ids issued by the server are resumed, so a client can't pick an id that
+    another user's conversation might use. A session is also not resumed for a
+    different farmer or tenant than the one it was started for.
+
+    Args:
+        conversation_id (str, optional): Id returned with an earlier turn.
+        user_info (dict, optional): The signed-in user's details sent with this turn.
+        user_info_sent (bool): Whether the request included user_info; if not, the
+            session's user_info is kept.
+        context (list, optional): Conversation trail sent with this turn; replaces
+            the session's trail when given.
+        tenant_id (str, optional): Tenant the conversation is with.
+
+    Returns:
+        Session: The conversation's session, with `resumed` set if it existed.
+    """
+    session = session_store.get(conversation_id) if conversation_id else None
+    if session is not None and session.tenant_id != tenant_id:
+        session = None
+    if session is not None and user_info_sent and user_info and session.user_info \
+            and user_info.get("farmer_id") != session.user_info.get("farmer_id"):
+        session = None
+
+    if session is None:
+        metrics.increment("converse.session.miss" if conversation_id else "converse.session.new")
+        session = Session(uuid.uuid4().hex, tenant_id=tenant_id)
+    else:
+        metrics.increment("converse.session.hit")
+        session.resumed = True
+
+    if user_info_sent:
+        session.user_info = user_info
+    if context:
+        session.trail = compact_trail(context)
+    return session
+
+
+def get_session_stats() -> Dict[str, Any]:
+    return {"sessions": len(session_store), "evictions": session_store.evictions}
@@ -0,0 +1,115 @@
+import http.client
+import io
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+
+from botocore.exceptions import ClientError
+
+# Client shims that talk to rag.stub_server with the same interface as the boto3
+# Bedrock runtime client and the Pinecone index the pipelines use.
+
+STUB_SERVER_URL = os.getenv("STUB_SERVER_URL", "http://127.0.0.1:8100")
+STUB_SERVER_TIMEOUT_SECONDS = float(os.getenv("STUB_SERVER_TIMEOUT_SECONDS", "30"))
+
+
+class _Connection:
+    """Keep-alive HTTP connection per thread."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.local = threading.local()
+
+    def _get(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = self.connection_class(self.host, self.port, timeout=STUB_SERVER_TIMEOUT_SECONDS)
+        return connection
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"}
+        for attempt in range(2):
+            connection = self._get()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                return connection.getresponse()
+            except (http.client.HTTPException, ConnectionError):
+                # Stale keep-alive connection: reconnect once
+                connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+
+    def json(self, method, path, payload=None, operation_name="Request"):
+        response = self.request(method, path, payload)
+        data = json.loads(response.read() or b"null")
+        _raise_for_status(response, data, operation_name)
+        return data
+
+
+def _raise_for_status(response, data, operation_name):
+    if response.status < 400:
+        return
+    error = (data or {}).get("error") if isinstance(data, dict) else None
+    if error is None:
+        error = {"Code": "ServiceUnavailableException" if response.status >= 500 else "ValidationException",
+                 "Message": json.dumps(data)}
+    raise ClientError({"Error": error, "ResponseMetadata": {"HTTPStatusCode": response.status}}, operation_name)
+
+
+class _NdjsonStream:
+    def __init__(self, response):
+        self.response = response
+
+    def __iter__(self):
+        for line in self.response:
+            if line.strip():
+                yield {"chunk": {"bytes": line.strip()}}
+
+    def close(self):
+        # Drain so the keep-alive connection can be reused
+        self.response.read()
+
+
+class HttpBedrock:
+    """
+    Bedrock runtime client shim for the stub server.
+    """
+
+    def __init__(self, base_url=STUB_SERVER_URL):
+        self.connection = _Connection(base_url)
+
+    def invoke_model(self, modelId, body, **kwargs):
+        data = self.connection.json("POST", "/bedrock/invoke", {"modelId": modelId, "body": json.loads(body)}, "InvokeModel")
+        return {"body": io.BytesIO(json.dumps(data["body"]).encode("utf-8")), "contentType": "application/json"}
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs):
+        response = self.connection.request("POST", "/bedrock/invoke-stream", {"modelId": modelId, "body": json.loads(body)})
+        if response.status >= 400:
+            _raise_for_status(response, json.loads(response.read() or b"null"), "InvokeModelWithResponseStream")
+        return {"body": _NdjsonStream(response), "contentType": "application/x-ndjson"}
+
+
+class HttpIndex:
+    """
+    Pinecone index shim for the stub server.
+    """
+
+    def __init__(self, base_url=STUB_SERVER_URL):
+        self.connection = _Connection(base_url)
+
+    def query(self, vector, top_k=10, include_metadata=False, namespace=None, **kwargs):
+        payload = {"vector": list(vector), "top_k": top_k, "include_metadata": include_metadata, "namespace": namespace}
+        return self.connection.json("POST", "/pinecone/query", payload, "Query")
+
+    def upsert(self, vectors, namespace=None, **kwargs):
+        vectors = [v if isinstance(v, dict) else {"id": v[0], "values": list(v[1]), "metadata": v[2] if len(v) > 2 else {}} for v in vectors]
+        return self.connection.json("POST", "/pinecone/upsert", {"vectors": vectors, "namespace": namespace}, "Upsert")
+
+    def describe_index_stats(self, **kwargs):
+        return self.connection.json("GET", "/pinecone/stats", operation_name="DescribeIndexStats")
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import math
+import os
+import random
+import threading
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from rag import replay
+from rag.clients import EMBEDDING_MODEL_ID, STUB_INDEX_DTYPE, STUB_INDEX_RESCORE
+from rag.stubs import StubBedrock, build_stub_index
+from rag.tenants import partner_corpora
+
+# Local stand-in for Bedrock and Pinecone used for load testing. Responses come from
+# a recorded cassette (RECORDINGS_PATH) when one matches, otherwise from the offline
+# stubs. Latency, throttling and stream chunk timing are shaped per operation by a
+# JSON config (STUB_SERVER_CONFIG), e.g.:
+#
+#   {
+#     "embedding":         {"latency": {"median_ms": 40, "p95_ms": 120}, "throttle_rate": 0.01},
+#     "generation_stream": {"latency": {"median_ms": 600, "p95_ms": 1500},
+#                           "chunk_delay": {"median_ms": 15, "p95_ms": 40}},
+#     "vector_query":      {"latency": "recorded"}
+#   }
+#
+# A latency or chunk_delay of "recorded" replays the timing captured in the cassette.
+
+DEFAULT_OPERATION_CONFIG = {"latency": None, "throttle_rate": 0.0, "chunk_delay": None}
+
+# What to do when a request is not in the cassette: "stub" answers it offline, "error" returns 404
+REPLAY_MISS = os.getenv("STUB_REPLAY_MISS", "stub")
+
+
+def load_server_config(path=None):
+    path = path or os.getenv("STUB_SERVER_CONFIG")
+    config = {}
+    if path:
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+    return {
+        operation: dict(DEFAULT_OPERATION_CONFIG, **config.get(operation, {}))
+        for operation in (replay.EMBEDDING, replay.GENERATION, replay.GENERATION_STREAM, replay.VECTOR_QUERY)
+    }
+
+
+def sample_ms(spec, recorded_ms=None):
+    """
+    Draws a delay in milliseconds from a spec: a number, "recorded", or a
+    log-normal distribution given by {"median_ms", "p95_ms"}.
+    """
+    if spec is None:
+        return 0.0
+    if spec == "recorded":
+        return recorded_ms or 0.0
+    if isinstance(spec, (int, float)):
+        return float(spec)
+    median = spec["median_ms"]
+    p95 = spec.get("p95_ms", median)
+    sigma = math.log(p95 / median) / 1.645 if p95 > median else 0.0
+    return random.lognormvariate(math.log(median), sigma)
+
+
+def create_app(config=None, cassette=None):
+    """
+    Builds the stub server app.
+
+    Args:
+        config (dict, optional): Per-operation latency/throttling config (default: load_server_config()).
+        cassette (replay.Cassette, optional): Recorded responses (default: RECORDINGS_PATH).
+    """
+    config = config or load_server_config()
+    cassette = cassette if cassette is not None else replay.Cassette(replay.recordings_path())
+    stub_bedrock = StubBedrock()
+    lock = threading.Lock()
+    state = {"index": None}
+    stats = {"hits": 0, "misses": 0, "throttled": 0}
+
+    def get_index():
+        with lock:
+            if state["index"] is None:
+                state["index"] = build_stub_index(stub_bedrock, EMBEDDING_MODEL_ID, namespaces=partner_corpora(),
+                                                  dtype=STUB_INDEX_DTYPE, rescore=STUB_INDEX_RESCORE)
+            return state["index"]
+
+    def count(key):
+        with lock:
+            stats[key] += 1
+
+    def lookup(operation, target, request):
+        entry = cassette.get(replay.request_key(operation, target, request))
+        if entry is None:
+            count("misses")
+            if REPLAY_MISS == "error":
+                raise HTTPException(status_code=404, detail=f"No recording for {operation} request")
+        else:
+            count("hits")
+        return entry
+
+    async def shape(operation, entry):
+        """Applies the configured latency and throttling; returns a throttle response or None."""
+        settings = config[operation]
+        await asyncio.sleep(sample_ms(settings["latency"], entry and entry.get("latency_ms")) / 1000)
+        if settings["throttle_rate"] and random.random() < settings["throttle_rate"]:
+            count("throttled")
+            return JSONResponse(status_code=429, content={"error": {"Code": "ThrottlingException", "Message": "Too many requests, please wait before trying again."}})
+        return None
+
+    app = FastAPI(title="FarmCredit upstream stub")
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok", "recordings": len(cassette), **stats}
+
+    @app.post("/bedrock/invoke")
+    async def invoke(request: Request):
+        payload = await request.json()
+        model_id, body = payload["modelId"], payload["body"]
+        operation = replay.bedrock_operation(body)
+        entry = lookup(operation, model_id, body)
+        throttled = await shape(operation, entry)
+        if throttled is not None:
+            return throttled
+        return {"body": entry["response"] if entry else stub_bedrock.respond(model_id, body)}
+
+    @app.post("/bedrock/invoke-stream")
+    async def invoke_stream(request: Request):
+        payload = await request.json()
+        model_id, body = payload["modelId"], payload["body"]
+        entry = lookup(replay.GENERATION_STREAM, model_id, body)
+        throttled = await shape(replay.GENERATION_STREAM, entry)
+        if throttled is not None:
+            return throttled
+
+        if entry:
+            events = entry["events"]
+        else:
+            events = [{"offset_ms": None, "payload": p} for p in stub_bedrock.stream_payloads(model_id, body)]
+        chunk_delay = config[replay.GENERATION_STREAM]["chunk_delay"]
+
+        async def generate():
+            previous_offset = events[0]["offset_ms"] if events else None
+            for event in events:
+                recorded_gap = None
+                if event["offset_ms"] is not None and previous_offset is not None:
+                    recorded_gap = event["offset_ms"] - previous_offset
+                    previous_offset = event["offset_ms"]
+                await asyncio.sleep(sample_ms(chunk_delay, recorded_gap) / 1000)
+                yield json.dumps(event["payload"]) + "\n"
+
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+    @app.post("/pinecone/query")
+    async def query(request: Request):
+        payload = await request.json()
+        namespace = payload.pop("namespace", None) or ""
+        entry = lookup(replay.VECTOR_QUERY, namespace, payload)
+        throttled = await shape(replay.VECTOR_QUERY, entry)
+        if throttled is not None:
+            return throttled
+        if entry:
+            return entry["response"]
+        return get_index().query(namespace=namespace, **payload)
+
+    @app.post("/pinecone/upsert")
+    async def upsert(request: Request):
+        payload = await request.json()
+        return get_index().upsert(vectors=payload["vectors"], namespace=payload.get("namespace"))
+
+    @app.get("/pinecone/stats")
+    def describe_index_stats():
+        return get_index().describe_index_stats()
+
+    return app
+
+
+if __name__ == "__main__":
+    # Local upstream stand-in: python -m rag.stub_server [--port 8100] [--config shaping.json] [--recordings recordings.jsonl]
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve recorded or stubbed Bedrock and Pinecone responses for load testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--config", help="Per-operation latency, throttling and chunk timing (JSON)")
+    parser.add_argument("--recordings", default=replay.recordings_path(), help="Cassette of recorded responses")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(load_server_config(args.config), replay.Cassette(args.recordings)), host=args.host, port=args.port)
@@ -0,0 +1,390 @@
+import hashlib
+import io
+import json
+import re
+import threading
+import time
+
+import numpy as np
+
+from rag.clients import EMBEDDING_DIMENSIONS
+from rag.corpus import chunk_key, load_faq_chunks
+from rag.embedder import invoke_embedding
+from rag.lexical import tokenize
+
+# Offline stand-ins for the Bedrock runtime client and the Pinecone index.
+# Embeddings are hashed bag-of-words vectors, so texts sharing words land close
+# together and retrieval quality is still meaningful without the real models.
+
+_context_answer = re.compile(r"^A: (.+)$", re.MULTILINE)
+_sentence_end = re.compile(r"(?<=[.!?])\s")
+
+# Vector storage types of the stub index: float16 halves and int8 (with a scale per
+# vector) quarters the memory of float32, at some cost in score precision
+INDEX_DTYPES = ("float32", "float16", "int8")
+
+# With rescoring, this many times top_k quantized matches are rescored with float32 vectors
+RESCORE_SHORTLIST_FACTOR = 4
+
+# Quantized vectors are converted to float32 this many rows at a time while scoring
+SCAN_BLOCK_ROWS = 2048
+
+
+def hashed_embedding(text, dimensions=EMBEDDING_DIMENSIONS):
+    """
+    Deterministic, normalized embedding from hashed word unigrams and bigrams.
+
+    Args:
+        text (str): Text to embed.
+        dimensions (int): Vector length.
+
+    Returns:
+        list: The embedding.
+    """
+    tokens = tokenize(text)
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        vector[value % dimensions] += 1.0 if (value >> 63) == 0 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector.tolist()
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class _StreamBody:
+    def __init__(self, events, chunk_delay_ms=0.0):
+        self.events = events
+        self.chunk_delay_ms = chunk_delay_ms
+        self.closed = False
+
+    def __iter__(self):
+        for event in self.events:
+            if self.closed:
+                return
+            if self.chunk_delay_ms:
+                time.sleep(self.chunk_delay_ms / 1000)
+            yield event
+
+    def close(self):
+        self.closed = True
+
+
+class StubBedrock:
+    """
+    Offline Bedrock runtime client.
+
+    Titan embedding requests return recorded embeddings when available, else
+    hashed embeddings. Claude requests answer extractively with the first
+    sentence of the first FAQ answer in the prompt's context, and report
+    estimated token usage like the real API.
+    """
+
+    # Holds no connections, so forked workers can share the preloaded instance
+    fork_safe = True
+
+    def __init__(self, latency_ms=0.0, recorded_embeddings=None):
+        self.latency_ms = latency_ms
+        self.recorded_embeddings = recorded_embeddings or {}
+
+    def _sleep(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def _generate(self, request):
+        prompt = request["messages"][-1]["content"]
+        context = prompt.split("Context:", 1)[-1]
+        match = _context_answer.search(context)
+        if match:
+            text = _sentence_end.split(match.group(1).strip(), 1)[0]
+        else:
+            text = "FarmCredit helps Nigerian youth farmers access fair credit."
+        usage = {"input_tokens": _estimate_tokens(prompt), "output_tokens": _estimate_tokens(text)}
+        return text, usage
+
+    def respond(self, model_id, request):
+        """Response body (as a dict) for an invoke_model request."""
+        if "inputText" in request:
+            text = request["inputText"]
+            embedding = self.recorded_embeddings.get(text) or hashed_embedding(text, request.get("dimensions", EMBEDDING_DIMENSIONS))
+            return {"embedding": embedding, "inputTextTokenCount": len(text.split())}
+        text, usage = self._generate(request)
+        return {
+            "type": "message",
+            "role": "assistant",
+            "model": model_id,
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "usage": usage,
+        }
+
+    def stream_payloads(self, model_id, request):
+        """Event payloads (as dicts) for an invoke_model_with_response_stream request."""
+        text, usage = self._generate(request)
+        payloads = [{"type": "message_start", "message": {"model": model_id, "usage": {"input_tokens": usage["input_tokens"], "output_tokens": 0}}}]
+        payloads += [
+            {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": word}}
+            for word in re.findall(r"\S+\s*", text)
+        ]
+        payloads += [
+            {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": usage["output_tokens"]}},
+            {"type": "message_stop"},
+        ]
+        return payloads
+
+    def invoke_model(self, modelId, body, **kwargs):
+        self._sleep()
+        response = self.respond(modelId, json.loads(body))
+        return {"body": io.BytesIO(json.dumps(response).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs):
+        self._sleep()
+        payloads = self.stream_payloads(modelId, json.loads(body))
+        events = [{"chunk": {"bytes": json.dumps(p).encode("utf-8")}} for p in payloads]
+        return {"body": _StreamBody(events)}
+
+
+def quantize(vectors, dtype):
+    """
+    Converts float32 vectors to a storage type.
+
+    Args:
+        vectors (np.ndarray): Float32 vectors, one per row.
+        dtype (str): "float32", "float16" or "int8".
+
+    Returns:
+        tuple: (stored vectors, per-row scales for int8 or None). An int8 row times
+            its scale approximates the original vector.
+    """
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127 if len(vectors) else np.zeros(0, dtype=np.float32)
+        scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales
+    return vectors.astype(dtype), None
+
+
+class _VectorStore:
+    """
+    The vectors of one stub index namespace as one contiguous matrix in the index's
+    storage type, with their metadata. Upserts build a new store rather than change
+    this one, so queries read it without holding the index lock.
+    """
+
+    def __init__(self, dtype="float32", rescore=False, dimension=0):
+        self.dtype = dtype
+        self.rescore = rescore and dtype != "float32"
+        self.ids = []
+        self.positions = {}
+        self.metadata = []
+        self.vectors = np.zeros((0, dimension), dtype=dtype)
+        self.scales = np.zeros(0, dtype=np.float32) if dtype == "int8" else None
+        self.norms = np.zeros(0, dtype=np.float32)
+        # Float32 copies of the vectors for rescoring quantized matches
+        self.full = np.zeros((0, dimension), dtype=np.float32) if self.rescore else None
+
+    def upserted(self, records):
+        """A copy of the store with the (id, values, metadata) records added or replaced."""
+        store = _VectorStore(self.dtype, self.rescore)
+        store.ids, store.positions, store.metadata = list(self.ids), dict(self.positions), list(self.metadata)
+        rows = {}
+        for vector_id, values, metadata in records:
+            position = store.positions.get(vector_id)
+            if position is None:
+                position = store.positions[vector_id] = len(store.ids)
+                store.ids.append(vector_id)
+                store.metadata.append(metadata)
+            else:
+                store.metadata[position] = metadata
+            rows[position] = values
+        if not rows:
+            return self
+
+        positions = np.fromiter(rows, dtype=np.int64, count=len(rows))
+        values = np.asarray(list(rows.values()), dtype=np.float32)
+        quantized, scales = quantize(values, self.dtype)
+
+        def extend(current, new):
+            grown = np.empty((len(store.ids),) + new.shape[1:], dtype=new.dtype)
+            grown[:len(current)] = current
+            grown[positions] = new
+            return grown
+
+        store.vectors = extend(self.vectors if len(self.vectors) else self.vectors.reshape(0, values.shape[1]), quantized)
+        store.norms = extend(self.norms, np.linalg.norm(values, axis=1).astype(np.float32))
+        if scales is not None:
+            store.scales = extend(self.scales, scales)
+        if store.rescore:
+            store.full = extend(self.full if len(self.full) else self.full.reshape(0, values.shape[1]), values)
+        return store
+
+    def values(self, position):
+        """A stored vector as float32 (the original when float32 copies are kept)."""
+        if self.full is not None:
+            return self.full[position]
+        vector = self.vectors[position].astype(np.float32)
+        return vector * self.scales[position] if self.scales is not None else vector
+
+    def scores(self, query):
+        """Cosine similarity of every stored vector to a unit-length query."""
+        if self.dtype == "float32":
+            dots = self.vectors @ query
+        else:
+            dots = np.empty(len(self.ids), dtype=np.float32)
+            for start in range(0, len(self.ids), SCAN_BLOCK_ROWS):
+                dots[start:start + SCAN_BLOCK_ROWS] = self.vectors[start:start + SCAN_BLOCK_ROWS].astype(np.float32) @ query
+            if self.scales is not None:
+                dots *= self.scales
+        return dots / np.where(self.norms == 0, 1.0, self.norms)
+
+    def rescored(self, query, candidates):
+        """Exact cosine similarity of the candidates to a unit-length query."""
+        norms = self.norms[candidates]
+        return (self.full[candidates] @ query) / np.where(norms == 0, 1.0, norms)
+
+    def memory_usage(self):
+        """Bytes searched by every query, and bytes of the float32 copies kept for rescoring."""
+        searched = self.vectors.nbytes + self.norms.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+        return {"search_bytes": searched, "rescore_bytes": self.full.nbytes if self.full is not None else 0}
+
+
+def _top(scores, k):
+    """Positions of the k highest scores, best first."""
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class StubIndex:
+    """
+    In-memory Pinecone index with cosine search over every vector.
+
+    Vectors are stored as float32, float16 or int8. With rescoring, quantized scores
+    only pick a shortlist of RESCORE_SHORTLIST_FACTOR times top_k matches, which are
+    ranked by their exact scores against float32 copies of their vectors.
+    """
+
+    fork_safe = True
+
+    def __init__(self, latency_ms=0.0, dtype="float32", rescore=False):
+        if dtype not in INDEX_DTYPES:
+            raise ValueError(f"Unsupported stub index dtype: {dtype}")
+        self.latency_ms = latency_ms
+        self.dtype = dtype
+        self.rescore = rescore
+        self.lock = threading.Lock()
+        self.namespaces = {}
+
+    def _store(self, namespace):
+        with self.lock:
+            return self.namespaces.get(namespace or "")
+
+    def upsert(self, vectors, namespace=None, **kwargs):
+        records = []
+        for vector in vectors:
+            if isinstance(vector, dict):
+                records.append((vector["id"], vector["values"], vector.get("metadata") or {}))
+            else:
+                records.append((vector[0], vector[1], vector[2] if len(vector) > 2 else {}))
+        with self.lock:
+            store = self.namespaces.get(namespace or "") or _VectorStore(self.dtype, self.rescore)
+            self.namespaces[namespace or ""] = store.upserted(records)
+        return {"upserted_count": len(vectors)}
+
+    def query(self, vector, top_k=10, include_metadata=False, namespace=None, **kwargs):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        store = self._store(namespace)
+        if store is None or not store.ids:
+            return {"matches": [], "namespace": namespace or ""}
+
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = store.scores(query)
+        if store.rescore:
+            shortlist = _top(scores, top_k * RESCORE_SHORTLIST_FACTOR)
+            exact = store.rescored(query, shortlist)
+            order = shortlist[_top(exact, top_k)]
+            scores = np.empty_like(scores)
+            scores[shortlist] = exact
+        else:
+            order = _top(scores, top_k)
+
+        matches = []
+        for i in order:
+            match = {"id": store.ids[i], "score": float(scores[i])}
+            if include_metadata:
+                match["metadata"] = store.metadata[i]
+            matches.append(match)
+        return {"matches": matches, "namespace": namespace or ""}
+
+    def list(self, namespace=None, limit=100, **kwargs):
+        """Yields pages of vector IDs, like Pinecone's list for serverless indexes."""
+        store = self._store(namespace)
+        ids = list(store.ids) if store is not None else []
+        for start in range(0, len(ids), limit):
+            yield ids[start:start + limit]
+
+    def fetch(self, ids, namespace=None, **kwargs):
+        store = self._store(namespace)
+        vectors = {}
+        for vector_id in ids:
+            position = store.positions.get(vector_id) if store is not None else None
+            if position is not None:
+                vectors[vector_id] = {"id": vector_id, "values": store.values(position).tolist(),
+                                      "metadata": store.metadata[position]}
+        return {"vectors": vectors, "namespace": namespace or ""}
+
+    def memory_usage(self):
+        """Bytes held for vectors across namespaces (see _VectorStore.memory_usage)."""
+        with self.lock:
+            stores = list(self.namespaces.values())
+        usage = {"search_bytes": 0, "rescore_bytes": 0}
+        for store in stores:
+            for key, value in store.memory_usage().items():
+                usage[key] += value
+        return usage
+
+    def describe_index_stats(self, **kwargs):
+        with self.lock:
+            namespaces = {ns: {"vector_count": len(store.ids)} for ns, store in self.namespaces.items()}
+        return {"namespaces": namespaces, "total_vector_count": sum(n["vector_count"] for n in namespaces.values())}
+
+
+def build_stub_index(bedrock, embedding_model_id, chunks=None, latency_ms=0.0, namespaces=None, dtype="float32",
+                     rescore=False):
+    """
+    Embeds the FAQ corpus with the given (stub) client into a new StubIndex,
+    using the same text and metadata as ingestion.
+
+    Args:
+        bedrock: Bedrock client used for embeddings.
+        embedding_model_id (str): Bedrock model ID for embedding.
+        chunks (list, optional): FAQ chunks (default: the FAQ corpus).
+        latency_ms (float): Simulated query latency.
+        namespaces (dict, optional): FAQ chunks of partner tenants by namespace.
+        dtype (str): Vector storage type ("float32", "float16" or "int8").
+        rescore (bool): Rescore quantized matches with float32 vectors.
+
+    Returns:
+        StubIndex: The populated index.
+    """
+    index = StubIndex(latency_ms=latency_ms, dtype=dtype, rescore=rescore)
+    chunks = load_faq_chunks() if chunks is None else chunks
+    for namespace, namespace_chunks in [(None, chunks)] + list((namespaces or {}).items()):
+        index.upsert(vectors=[
+            (
+                chunk_key(chunk),
+                invoke_embedding(f"Q: {chunk['question']}\nA: {chunk['answer']}", bedrock, embedding_model_id),
+                {"question": chunk["question"], "answer": chunk["answer"]},
+            )
+            for chunk in namespace_chunks
+        ], namespace=namespace)
+    return index
@@ -0,0 +1,224 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from rag import metrics
+from rag.answers import ANSWER_CACHE_TTL_SECONDS, AnswerCache, answer_cache
+from rag.corpus import load_faq_chunks
+from rag.lexical import LexicalIndex, get_lexical_index
+from rag.resilience import SERVER_WORKERS, TokenBucket
+
+# Partner lenders served from this deployment, each with its own FAQ content in its
+# own vector index namespace. Without this file only FarmCredit's own FAQ is served.
+DEFAULT_TENANTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "tenants.json")
+
+# Tenant of requests that don't name one: FarmCredit's FAQ in the default namespace,
+# with the process-wide caches and indexes and no quota
+DEFAULT_TENANT = "farmcredit"
+DEFAULT_TENANT_NAME = "FarmCredit"
+
+# Defaults for partner tenants, overridable per tenant in the tenants file: AI requests
+# per second (shared by all workers) and in flight at once per worker, and FAQ
+# answers and query embeddings kept in memory (and in the shared cache, when enabled)
+TENANT_RPS = float(os.getenv("TENANT_RPS", "10"))
+TENANT_MAX_CONCURRENT = int(os.getenv("TENANT_MAX_CONCURRENT", "8"))
+TENANT_ANSWER_CACHE_SIZE = int(os.getenv("TENANT_ANSWER_CACHE_SIZE", "200"))
+TENANT_EMBEDDING_CACHE_SIZE = int(os.getenv("TENANT_EMBEDDING_CACHE_SIZE", "5000"))
+
+
+class UnknownTenant(Exception):
+    """Raised when a request names a tenant that isn't configured."""
+
+
+class Tenant:
+    """
+    A partner lender's FAQ content and its own caches, indexes and request quota,
+    so one tenant's traffic can't evict another's cached entries or take all of
+    the server's AI request slots.
+
+    Partner FAQ chunks live in a directory of their own, next to the lexical and
+    answer indexes written for them at ingest time.
+    """
+
+    def __init__(self, tenant_id, namespace=None, faq_chunks_path=None, rate_per_second=None, max_concurrent=None,
+                 answer_cache_size=TENANT_ANSWER_CACHE_SIZE, embedding_cache_size=TENANT_EMBEDDING_CACHE_SIZE, name=None):
+        self.id = tenant_id
+        # Lender name used in templated replies
+        self.name = name or (DEFAULT_TENANT_NAME if faq_chunks_path is None else tenant_id)
+        self.namespace = namespace
+        self.faq_chunks_path = faq_chunks_path
+        self.bucket = TokenBucket(rate_per_second / SERVER_WORKERS) if rate_per_second else None
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.admitted = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+        self._lexical_index = None
+        self._lexical_lock = threading.Lock()
+
+        if faq_chunks_path is None:
+            # The default tenant uses the process-wide caches
+            self.answer_cache = answer_cache
+            self.embedding_cache = None
+        else:
+            self.answer_cache = AnswerCache(answer_cache_size, ANSWER_CACHE_TTL_SECONDS, namespace=f"answers:{tenant_id}",
+                                            shared_max_entries=answer_cache_size)
+            from rag.embedder import EMBEDDING_CACHE_TTL_SECONDS, EmbeddingCache
+            self.embedding_cache = EmbeddingCache(embedding_cache_size, EMBEDDING_CACHE_TTL_SECONDS,
+                                                  namespace=f"embeddings:{tenant_id}", shared_max_entries=embedding_cache_size)
+
+    @property
+    def is_default(self):
+        return self.faq_chunks_path is None
+
+    def _path(self, name):
+        return os.path.join(os.path.dirname(self.faq_chunks_path), name) if self.faq_chunks_path else None
+
+    @property
+    def lexical_index_path(self):
+        """Where ingestion writes the tenant's BM25 index (None: LEXICAL_INDEX_PATH)."""
+        return self._path("faq_lexical_index.json")
+
+    @property
+    def answer_index_path(self):
+        """Where ingestion writes the tenant's FAQ answer index (None: ANSWER_INDEX_PATH)."""
+        return self._path("faq_answer_index.npz")
+
+    def load_chunks(self):
+        return load_faq_chunks(self.faq_chunks_path)
+
+    def lexical_index(self):
+        """The tenant's BM25 index, loaded from its ingest-time file or built from its FAQ."""
+        if self.is_default:
+            return get_lexical_index()
+        if self._lexical_index is None:
+            with self._lexical_lock:
+                if self._lexical_index is None:
+                    if os.path.exists(self.lexical_index_path):
+                        self._lexical_index = LexicalIndex.load(self.lexical_index_path)
+                    else:
+                        self._lexical_index = LexicalIndex.build(self.load_chunks())
+        return self._lexical_index
+
+    def set_lexical_index(self, index):
+        """Replaces the tenant's lexical index, e.g. after re-ingestion."""
+        with self._lexical_lock:
+            self._lexical_index = index
+
+    def try_acquire(self):
+        with self.lock:
+            if (self.max_concurrent is not None and self.in_flight >= self.max_concurrent) \
+                    or (self.bucket is not None and not self.bucket.acquire()):
+                self.throttled += 1
+                return False
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    @contextmanager
+    def admit(self):
+        """
+        Context manager yielding whether an AI request is within the tenant's quota;
+        releases its slot on exit.
+        """
+        admitted = self.try_acquire()
+        if not admitted:
+            metrics.increment(f"tenant.{self.id}.throttled")
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self.release()
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "namespace": self.namespace or "",
+                "in_flight": self.in_flight,
+                "admitted": self.admitted,
+                "throttled": self.throttled,
+                "answer_cache_entries": len(self.answer_cache),
+                "embedding_cache_entries": len(self.embedding_cache) if self.embedding_cache is not None else None,
+            }
+
+
+_tenants = None
+_tenants_lock = threading.Lock()
+
+
+def tenants_path():
+    return os.getenv("TENANTS_PATH", DEFAULT_TENANTS_PATH)
+
+
+def load_tenants(path=None):
+    """
+    Loads the default tenant and the partner tenants configured in the tenants file.
+
+    Args:
+        path (str, optional): JSON file with a "tenants" list of objects with an 'id'
+            and 'faq_chunks' (a path relative to the file), and optionally a
+            'name' (shown in templated replies, default: the id), 'namespace'
+            (default: the id), 'rate_per_second', 'max_concurrent',
+            'answer_cache_size' and 'embedding_cache_size' (default: TENANTS_PATH
+            or data/tenants.json).
+
+    Returns:
+        dict: Tenants by id.
+    """
+    path = path or tenants_path()
+    tenants = {DEFAULT_TENANT: Tenant(DEFAULT_TENANT)}
+    if not os.path.exists(path):
+        return tenants
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    for entry in config.get("tenants", []):
+        if entry["id"] in tenants:
+            raise ValueError(f"Tenant {entry['id']} is configured twice")
+        tenants[entry["id"]] = Tenant(
+            entry["id"],
+            namespace=entry.get("namespace", entry["id"]),
+            faq_chunks_path=os.path.join(os.path.dirname(os.path.abspath(path)), entry["faq_chunks"]),
+            rate_per_second=entry.get("rate_per_second", TENANT_RPS),
+            max_concurrent=entry.get("max_concurrent", TENANT_MAX_CONCURRENT),
+            answer_cache_size=entry.get("answer_cache_size", TENANT_ANSWER_CACHE_SIZE),
+            embedding_cache_size=entry.get("embedding_cache_size", TENANT_EMBEDDING_CACHE_SIZE),
+            name=entry.get("name"),
+        )
+    return tenants
+
+
+def get_tenants():
+    """Returns the process-wide tenants by id, loading the tenants file on first use."""
+    global _tenants
+    if _tenants is None:
+        with _tenants_lock:
+            if _tenants is None:
+                _tenants = load_tenants()
+    return _tenants
+
+
+def get_tenant(tenant_id=None):
+    """
+    Returns a tenant by id, or the default tenant when no id is given.
+
+    Raises:
+        UnknownTenant: If no tenant with that id is configured.
+    """
+    tenant = get_tenants().get(tenant_id or DEFAULT_TENANT)
+    if tenant is None:
+        raise UnknownTenant(f"Unknown tenant: {tenant_id}")
+    return tenant
+
+
+def partner_corpora():
+    """FAQ chunks of each partner tenant by namespace, for loading the stub index."""
+    return {tenant.namespace: tenant.load_chunks() for tenant in get_tenants().values() if not tenant.is_default}
+
+
+def get_tenant_stats():
+    return {tenant_id: tenant.get_stats() for tenant_id, tenant in get_tenants().items()}
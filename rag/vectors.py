@@ -0,0 +1,213 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from rag.corpus import corpus_fingerprint
+
+# Vector corpus exports: the IDs, embeddings and metadata of one index namespace, so a
+# new environment (staging, load test, DR) is loaded without embedding the FAQ again.
+# An export is a directory of:
+#   vectors.npy            embeddings, one row per vector (float16 or float32)
+#   records.jsonl          {"id", "metadata"} per vector, in row order
+#   manifest.json          count, dimension, dtype, namespace, embedding model and corpus fingerprint
+#   faq_answer_index.npz   the FAQ answer index, when one was written for the corpus
+VECTORS_FILE = "vectors.npy"
+RECORDS_FILE = "records.jsonl"
+MANIFEST_FILE = "manifest.json"
+ANSWER_INDEX_FILE = "faq_answer_index.npz"
+
+# Storage type of exported embeddings; float16 halves the file with no effect on ranking
+VECTOR_EXPORT_DTYPE = os.getenv("VECTOR_EXPORT_DTYPE", "float16")
+
+# Vectors per upsert request when importing, and per fetch request when exporting
+VECTOR_IMPORT_BATCH_SIZE = int(os.getenv("VECTOR_IMPORT_BATCH_SIZE", "100"))
+FETCH_BATCH_SIZE = 100
+
+
+def _to_dict(response):
+    return response.to_dict() if hasattr(response, "to_dict") else response
+
+
+def _iter_ids(index, namespace):
+    for page in index.list(namespace=namespace or ""):
+        # Pinecone yields pages of IDs
+        yield from (page if isinstance(page, (list, tuple)) else [page])
+
+
+def _fetch(index, ids, namespace):
+    vectors = _to_dict(index.fetch(ids=ids, namespace=namespace or ""))["vectors"]
+    return [vectors[vector_id] for vector_id in ids if vector_id in vectors]
+
+
+def export_vectors(index, directory, namespace=None, dtype=VECTOR_EXPORT_DTYPE, embedding_model_id=None,
+                   answer_index_path=None):
+    """
+    Writes every vector in an index namespace to an export directory.
+
+    Args:
+        index (pinecone.Index): Index to export from (Pinecone serverless or the stub index).
+        directory (str): Export directory (created if needed).
+        namespace (str, optional): Namespace to export (default: the default namespace).
+        dtype (str): "float16" or "float32".
+        embedding_model_id (str, optional): Model the vectors come from (default: EMBEDDING_MODEL_ID).
+        answer_index_path (str, optional): FAQ answer index to include, if it exists.
+
+    Returns:
+        dict: The export manifest.
+    """
+    if dtype not in ("float16", "float32"):
+        raise ValueError(f"Unsupported export dtype: {dtype}")
+    if embedding_model_id is None:
+        from rag.clients import EMBEDDING_MODEL_ID as embedding_model_id
+    os.makedirs(directory, exist_ok=True)
+
+    rows, batch = [], []
+    for vector_id in _iter_ids(index, namespace):
+        batch.append(vector_id)
+        if len(batch) == FETCH_BATCH_SIZE:
+            rows.extend(_fetch(index, batch, namespace))
+            batch = []
+    if batch:
+        rows.extend(_fetch(index, batch, namespace))
+
+    vectors = np.asarray([row["values"] for row in rows], dtype=dtype)
+    dimension = int(vectors.shape[1]) if len(rows) else 0
+    with open(os.path.join(directory, RECORDS_FILE), "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps({"id": row["id"], "metadata": row.get("metadata") or {}}) + "\n")
+    np.save(os.path.join(directory, VECTORS_FILE), vectors.reshape(len(rows), dimension))
+
+    chunks = [row["metadata"] for row in rows if "question" in (row.get("metadata") or {})]
+    manifest = {
+        "count": len(rows),
+        "dimension": dimension,
+        "dtype": dtype,
+        "namespace": namespace or "",
+        "embedding_model_id": embedding_model_id,
+        "fingerprint": corpus_fingerprint(sorted(chunks, key=lambda c: (c["question"], c["answer"]))),
+    }
+    with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    if answer_index_path and os.path.exists(answer_index_path):
+        shutil.copyfile(answer_index_path, os.path.join(directory, ANSWER_INDEX_FILE))
+    return manifest
+
+
+def read_export(directory):
+    """
+    Reads an export directory.
+
+    Returns:
+        tuple: (manifest, vector IDs, embeddings as a memory-mapped array, metadata list).
+    """
+    with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+        manifest = json.load(f)
+    vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+    ids, metadata = [], []
+    with open(os.path.join(directory, RECORDS_FILE), encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                ids.append(record["id"])
+                metadata.append(record["metadata"])
+    if len(ids) != len(vectors) or len(ids) != manifest["count"]:
+        raise ValueError(f"Export {directory} is incomplete: {len(ids)} records, {len(vectors)} vectors")
+    return manifest, ids, vectors, metadata
+
+
+def import_vectors(directory, index, namespace=None, batch_size=VECTOR_IMPORT_BATCH_SIZE, embedding_model_id=None,
+                   dimension=None):
+    """
+    Upserts an export into an index in batches, without any embedding calls.
+
+    Args:
+        directory (str): Export directory written by export_vectors.
+        index (pinecone.Index): Index to load (Pinecone or the in-memory stub index).
+        namespace (str, optional): Namespace to load into (default: the export's namespace).
+        batch_size (int): Vectors per upsert request.
+        embedding_model_id (str, optional): Model queries are embedded with; the export
+            must come from the same one (default: EMBEDDING_MODEL_ID).
+        dimension (int, optional): The index dimension (default: PINECONE_DIMENSION).
+
+    Returns:
+        dict: The export manifest.
+    """
+    from rag.clients import EMBEDDING_MODEL_ID, PINECONE_DIMENSION
+    manifest, ids, vectors, metadata = read_export(directory)
+    embedding_model_id = embedding_model_id or EMBEDDING_MODEL_ID
+    dimension = dimension or PINECONE_DIMENSION
+    if manifest["embedding_model_id"] != embedding_model_id:
+        raise ValueError(f"Export is from {manifest['embedding_model_id']}, queries use {embedding_model_id}")
+    if manifest["count"] and manifest["dimension"] != dimension:
+        raise ValueError(f"Export has {manifest['dimension']} dimensions, the index has {dimension}")
+
+    namespace = manifest["namespace"] if namespace is None else namespace
+    for start in range(0, len(ids), batch_size):
+        block = np.asarray(vectors[start:start + batch_size], dtype=np.float32)
+        index.upsert(vectors=[
+            (ids[start + i], block[i].tolist(), metadata[start + i]) for i in range(len(block))
+        ], namespace=namespace or None)
+    return manifest
+
+
+def restore_indexes(directory, tenant=None):
+    """
+    Writes the lexical index and (if exported) the FAQ answer index for an imported
+    corpus, so the environment needs no embedding calls at startup either.
+
+    Args:
+        directory (str): Export directory written by export_vectors.
+        tenant (Tenant, optional): Tenant the corpus belongs to (default: FarmCredit's own).
+    """
+    from rag.answer_index import answer_index_path
+    from rag.lexical import LexicalIndex, lexical_index_path, set_lexical_index
+    from rag.tenants import get_tenant
+    tenant = tenant or get_tenant()
+
+    _, ids, _, metadata = read_export(directory)
+    chunks = [m for m in metadata if "question" in m]
+    lexical_index = LexicalIndex.build(chunks, [i for i, m in zip(ids, metadata) if "question" in m])
+    lexical_index.save(tenant.lexical_index_path or lexical_index_path())
+    if tenant.is_default:
+        set_lexical_index(lexical_index)
+    else:
+        tenant.set_lexical_index(lexical_index)
+
+    exported_answers = os.path.join(directory, ANSWER_INDEX_FILE)
+    if os.path.exists(exported_answers):
+        # Only used if it matches the corpus file (see rag.answer_index)
+        shutil.copyfile(exported_answers, tenant.answer_index_path or answer_index_path())
+
+
+if __name__ == "__main__":
+    #   python -m rag.vectors export exports/farmcredit [--tenant greenbank] [--dtype float32]
+    #   python -m rag.vectors import exports/farmcredit [--tenant greenbank] [--batch-size 100]
+    import argparse
+
+    from rag.clients import get_vector_index
+    from rag.tenants import get_tenant
+
+    parser = argparse.ArgumentParser(description="Export or import the FAQ vector corpus without re-embedding it.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Write a namespace's vectors and metadata to a directory")
+    export_parser.add_argument("directory")
+    export_parser.add_argument("--tenant", default=None)
+    export_parser.add_argument("--dtype", choices=("float16", "float32"), default=VECTOR_EXPORT_DTYPE)
+    import_parser = commands.add_parser("import", help="Upsert an export and write its lexical and answer indexes")
+    import_parser.add_argument("directory")
+    import_parser.add_argument("--tenant", default=None)
+    import_parser.add_argument("--batch-size", type=int, default=VECTOR_IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    from rag.answer_index import answer_index_path
+    selected = get_tenant(args.tenant)
+    if args.command == "export":
+        result = export_vectors(get_vector_index(), args.directory, selected.namespace, args.dtype,
+                                answer_index_path=selected.answer_index_path or answer_index_path())
+    else:
+        result = import_vectors(args.directory, get_vector_index(), selected.namespace or "", args.batch_size)
+        restore_indexes(args.directory, selected)
+    print(json.dumps(result))
@@ -0,0 +1,514 @@
+import datetime
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from scoring import markets
+from scoring import rules as scoring_rules
+from scoring.database import TABLES
+from scoring.rules import RuleSet
+
+# Nightly rescoring from columnar table snapshots. Each of the nine source
+# tables is a Parquet (or Arrow IPC/Feather) file named after its profile key,
+# e.g. snapshot/farmers.parquet and snapshot/loan_repayments.parquet. Child
+# tables are reduced to per-farmer aggregates held in numpy arrays aligned with
+# the farmers file (streaming the large tables one row group at a time), then
+# the farmers file is streamed again and scored a batch at a time with the same
+# rules as credit_score.calculate_credit_score, without building any per-farmer
+# dicts. Files are memory-mapped and only the needed columns are read.
+
+# Farmers scored per output batch (and rows read per batch from large tables)
+RESCORE_BATCH_ROWS = int(os.getenv("RESCORE_BATCH_ROWS", "65536"))
+
+SNAPSHOT_EXTENSIONS = (".parquet", ".arrow", ".feather")
+
+US_PER_DAY = 86_400_000_000
+NO_DAY = np.iinfo(np.int64).max
+
+MAX_POINTS = {
+    "personal_demographic": 100,
+    "financial_history": 200,
+    "loan_history": 250,
+    "agricultural_factors": 200,
+    "geographical": 100,
+}
+
+SCORE_SCHEMA = pa.schema([
+    ("farmer_id", pa.string()),
+    ("credit_score", pa.int64()),
+    ("credit_rating", pa.string()),
+    ("personal_demographic", pa.int64()),
+    ("financial_history", pa.int64()),
+    ("loan_history", pa.int64()),
+    ("agricultural_factors", pa.int64()),
+    ("geographical", pa.float64()),
+    ("raw_score", pa.float64()),
+    ("rules_version", pa.string()),
+])
+
+
+def snapshot_path(directory: str, table: str) -> str:
+    for extension in SNAPSHOT_EXTENSIONS:
+        path = os.path.join(directory, table + extension)
+        if os.path.isfile(path):
+            return path
+    raise FileNotFoundError(f"No '{table}' table in {directory} (expected {table}.parquet, .arrow or .feather)")
+
+
+def iter_batches(path: str, columns: List[str], batch_rows: int = RESCORE_BATCH_ROWS) -> Iterator[pa.RecordBatch]:
+    """Stream columns of a memory-mapped Parquet or Arrow IPC file, one record batch at a time."""
+    if path.endswith(".parquet"):
+        yield from pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=batch_rows, columns=columns)
+        return
+    with pa.memory_map(path) as source:
+        reader = ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i).select(columns)
+
+
+def read_columns(path: str, columns: List[str]) -> pa.Table:
+    """Read whole columns of a memory-mapped Parquet or Arrow IPC file."""
+    if path.endswith(".parquet"):
+        return pq.read_table(path, columns=columns, memory_map=True)
+    with pa.memory_map(path) as source:
+        return ipc.open_file(source).read_all().select(columns)
+
+
+def _array(column) -> pa.Array:
+    return column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+
+
+def _numpy(column) -> np.ndarray:
+    return _array(column).to_numpy(zero_copy_only=False)
+
+
+def _numbers(column, default: float = 0.0) -> np.ndarray:
+    return _numpy(pc.fill_null(pc.cast(column, pa.float64()), default))
+
+
+def _flags(column) -> np.ndarray:
+    return _numpy(pc.fill_null(pc.cast(column, pa.bool_()), False))
+
+
+def _present(column) -> np.ndarray:
+    """Whether each value is truthy as a string, like bool(farmer.get(...))."""
+    text = pc.cast(column, pa.string())
+    return _numpy(pc.fill_null(pc.greater(pc.utf8_length(text), 0), False))
+
+
+def _timestamps(column) -> Tuple[np.ndarray, np.ndarray]:
+    """Microseconds since the epoch (UTC) for ISO strings, dates or timestamps, and which values are set."""
+    column = _array(column)
+    if pa.types.is_date(column.type):
+        column = pc.cast(column, pa.timestamp("us"))
+    target = pa.timestamp("us", tz=column.type.tz if pa.types.is_timestamp(column.type) else "UTC")
+    column = pc.cast(column, target)
+    valid = _numpy(pc.is_valid(column))
+    values = _numpy(pc.fill_null(pc.cast(column, pa.int64()), 0))
+    return values, valid
+
+
+def _days_between(later_us, earlier_us) -> np.ndarray:
+    # Whole days, as timedelta.days counts them
+    return np.floor_divide(later_us - earlier_us, US_PER_DAY)
+
+
+def _positions(keys, value_set: pa.Array) -> np.ndarray:
+    """Position of each key in value_set, -1 where it is missing or null."""
+    keys = pc.cast(_array(keys), value_set.type)
+    return _numpy(pc.fill_null(pc.index_in(keys, value_set=value_set), -1)).astype(np.int64)
+
+
+def _map_values(column, func: Callable[[Optional[str]], Any], dtype=np.float64) -> np.ndarray:
+    """Apply func once per distinct value of a string column and spread the results."""
+    encoded = pc.dictionary_encode(pc.cast(_array(column), pa.string()))
+    mapped = np.array([func(value) for value in encoded.dictionary.to_pylist()] + [func(None)], dtype=dtype)
+    return mapped[_numpy(pc.fill_null(encoded.indices, len(encoded.dictionary)))]
+
+
+def _transaction_amounts(column) -> np.ndarray:
+    """The 'amount' entry of each transaction_data value (map, struct or JSON string)."""
+    column = _array(column)
+    if pa.types.is_map(column.type):
+        amounts = pc.map_lookup(column, pa.scalar("amount", column.type.key_type), "first")
+    elif pa.types.is_struct(column.type):
+        if column.type.get_field_index("amount") < 0:
+            return np.zeros(len(column))
+        amounts = pc.struct_field(column, "amount")
+    else:
+        amounts = pa.array([json.loads(value).get("amount", 0) if value else 0 for value in column.to_pylist()],
+                           type=pa.float64())
+    return _numbers(amounts)
+
+
+def _lookup(values: np.ndarray, positions: np.ndarray, missing: Any) -> np.ndarray:
+    """values[positions], with `missing` wherever the position is -1."""
+    return np.append(values, np.asarray([missing], dtype=values.dtype))[positions]
+
+
+def _count(positions: np.ndarray, size: int, weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """Per-farmer count (or sum of weights) over rows with a valid farmer position."""
+    keep = positions >= 0
+    return np.bincount(positions[keep], weights=None if weights is None else weights[keep], minlength=size)
+
+
+def _mean(total: np.ndarray, count: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+
+def aggregate_snapshot(directory: str, rules: RuleSet, now: datetime.datetime,
+                       batch_rows: int = RESCORE_BATCH_ROWS) -> Dict[str, np.ndarray]:
+    """
+    Reduce the child tables of a snapshot to per-farmer feature arrays.
+
+    Arrays are aligned with the rows of the farmers file and named after the
+    FarmerFeatures fields they stand for. Missing values are NaN.
+
+    Args:
+        directory (str): Snapshot directory with one file per table
+        rules (RuleSet): Rules used for the geopolitical zone lookup
+        now (datetime.datetime): Reference time for recency and experience
+        batch_rows (int): Rows read at a time from the streamed tables
+
+    Returns:
+        Dict[str, np.ndarray]: Feature arrays, one entry per farmer
+    """
+    now_us = int(now.timestamp() * 1_000_000)
+    today = (now.astimezone().date() - datetime.date(1970, 1, 1)).days
+
+    farmers = read_columns(snapshot_path(directory, "farmers"), ["id", "address_id"])
+    farmer_ids = _array(pc.cast(farmers["id"], pa.string()))
+    size = len(farmer_ids)
+    f: Dict[str, np.ndarray] = {}
+
+    # Next of kin
+    kin = np.zeros(size)
+    for batch in iter_batches(snapshot_path(directory, "farmer_next_of_kin"), ["farmer_id"], batch_rows):
+        kin += _count(_positions(batch["farmer_id"], farmer_ids), size)
+    f["has_next_of_kin"] = kin > 0
+
+    # Transactions: count, average positive amount, count in the last 90 days
+    transactions, amount_sum, amount_count, recent = (np.zeros(size) for _ in range(4))
+    for batch in iter_batches(snapshot_path(directory, "transaction_history"),
+                              ["farmer_id", "transaction_data", "created_at"], batch_rows):
+        position = _positions(batch["farmer_id"], farmer_ids)
+        amounts = _transaction_amounts(batch["transaction_data"])
+        created, created_valid = _timestamps(batch["created_at"])
+        transactions += _count(position, size)
+        amount_sum += _count(position, size, np.where(amounts > 0, amounts, 0.0))
+        amount_count += _count(position, size, (amounts > 0).astype(np.float64))
+        recent += _count(position, size, (created_valid & (_days_between(now_us, created) <= 90)).astype(np.float64))
+    f["transaction_count"] = transactions
+    f["avg_transaction_amount"] = _mean(amount_sum, amount_count)
+    f["recent_transaction_count"] = recent
+
+    # Farms (kept whole: production rows and farm addresses are joined to them)
+    farms = read_columns(snapshot_path(directory, "farms"),
+                         ["id", "farmer_id", "size", "start_date", "number_of_harvests", "address_id"])
+    farm_ids = _array(pc.cast(farms["id"], pa.string()))
+    farm_owner = _positions(farms["farmer_id"], farmer_ids)
+    start, start_valid = _timestamps(farms["start_date"])
+    oldest = np.full(size, NO_DAY, dtype=np.int64)
+    dated = (farm_owner >= 0) & start_valid
+    np.minimum.at(oldest, farm_owner[dated], np.floor_divide(start[dated], US_PER_DAY))
+    f["farm_count"] = _count(farm_owner, size)
+    f["total_farm_size"] = _count(farm_owner, size, _numbers(farms["size"]))
+    f["total_harvests"] = _count(farm_owner, size, _numbers(farms["number_of_harvests"]))
+    f["farming_experience"] = np.where(oldest != NO_DAY, (today - np.where(oldest != NO_DAY, oldest, today)) / 365.25, 0.0)
+
+    # Farm production, joined to its farmer through farm_id
+    productions, yield_sum, profit_sum, profit_count = (np.zeros(size) for _ in range(4))
+    crop_codes: Dict[str, int] = {}
+    crop_pairs = [np.empty((0, 2), dtype=np.int64)]
+    for batch in iter_batches(snapshot_path(directory, "farm_production"),
+                              ["farm_id", "type", "expected_yield", "expected_unit_profit"], batch_rows):
+        position = _lookup(farm_owner, _positions(batch["farm_id"], farm_ids), -1)
+        profits = _numbers(batch["expected_unit_profit"])
+        productions += _count(position, size)
+        yield_sum += _count(position, size, _numbers(batch["expected_yield"]))
+        profit_sum += _count(position, size, np.where(profits > 0, profits, 0.0))
+        profit_count += _count(position, size, (profits > 0).astype(np.float64))
+        crop = _map_values(batch["type"], lambda value: crop_codes.setdefault(value, len(crop_codes)) if value else -1,
+                           dtype=np.int64)
+        typed = (position >= 0) & (crop >= 0)
+        crop_pairs.append(np.unique(np.stack([position[typed], crop[typed]], axis=1), axis=0))
+    f["production_count"] = productions
+    f["avg_expected_yield"] = _mean(yield_sum, productions)
+    f["avg_profit_margin"] = _mean(profit_sum, profit_count)
+    f["crop_diversity"] = _count(np.unique(np.concatenate(crop_pairs), axis=0)[:, 0], size)
+
+    # Loan applications: the most recent approved one decides the debt load
+    applications = read_columns(snapshot_path(directory, "loan_application"),
+                                ["id", "farmer_id", "existing_loans", "total_existing_loan_amount", "status", "created_at"])
+    application_ids = _array(pc.cast(applications["id"], pa.string()))
+    applicant = _positions(applications["farmer_id"], farmer_ids)
+    approved = np.nonzero((applicant >= 0) & _numpy(pc.fill_null(pc.equal(applications["status"], "approved"), False)))[0]
+    applied, applied_valid = _timestamps(applications["created_at"])
+    applied = np.where(applied_valid, applied, np.iinfo(np.int64).min)
+    # Latest approved application per farmer; the first one listed wins a tie
+    ordered = approved[np.lexsort((-approved, applied[approved], applicant[approved]))]
+    owners = applicant[ordered]
+    latest = ordered[np.append(owners[1:] != owners[:-1], True)] if len(ordered) else ordered
+    existing = _flags(applications["existing_loans"])
+    f["has_approved_application"] = np.zeros(size, dtype=bool)
+    f["has_approved_application"][applicant[latest]] = True
+    f["has_existing_loans"] = np.zeros(size, dtype=bool)
+    f["has_existing_loans"][applicant[latest]] = existing[latest]
+    f["existing_loan_amount"] = np.zeros(size)
+    f["existing_loan_amount"][applicant[latest]] = np.where(
+        existing[latest], _numbers(applications["total_existing_loan_amount"])[latest], 0.0)
+
+    # Loan contracts, joined to their farmer through the application
+    contracts = read_columns(snapshot_path(directory, "loan_contract"), ["id", "loan_application_id"])
+    contract_ids = _array(pc.cast(contracts["id"], pa.string()))
+    borrower = _lookup(applicant, _positions(contracts["loan_application_id"], application_ids), -1)
+    f["loan_contract_count"] = _count(borrower, size)
+
+    # Repayments, joined to their farmer through the contract
+    repayments, on_time, days_late = (np.zeros(size) for _ in range(3))
+    contract_repayments = np.zeros(len(contract_ids))
+    contract_unpaid = np.zeros(len(contract_ids))
+    for batch in iter_batches(snapshot_path(directory, "loan_repayments"),
+                              ["loan_contract_id", "date_paid", "due_date"], batch_rows):
+        contract = _positions(batch["loan_contract_id"], contract_ids)
+        position = _lookup(borrower, contract, -1)
+        contract = np.where(position >= 0, contract, -1)
+        paid, paid_valid = _timestamps(batch["date_paid"])
+        due, due_valid = _timestamps(batch["due_date"])
+        dated = paid_valid & due_valid
+        late = dated & (paid > due)
+        repayments += _count(position, size)
+        on_time += _count(position, size, (dated & (paid <= due)).astype(np.float64))
+        days_late += _count(position, size, np.where(late, _days_between(paid, due), 0).astype(np.float64))
+        contract_repayments += _count(contract, len(contract_ids))
+        contract_unpaid += _count(contract, len(contract_ids), (~dated).astype(np.float64))
+    fully_repaid = (contract_repayments > 0) & (contract_unpaid == 0)
+    f["loan_repayment_count"] = repayments
+    f["repayment_count"] = repayments
+    f["on_time_count"] = on_time
+    f["days_late_sum"] = days_late
+    f["fully_repaid_loans"] = _count(np.where(fully_repaid, borrower, -1), size)
+
+    # Addresses: the farmer's own and each farm's, for the zone and market proximity
+    addresses = read_columns(snapshot_path(directory, "address"), ["id", "geopolitical_zone", "latitude", "longitude"])
+    address_ids = _array(pc.cast(addresses["id"], pa.string()))
+    risk_zones = rules.lookups["geopolitical_zone"]
+    zone_points = _map_values(addresses["geopolitical_zone"],
+                              lambda zone: risk_zones((zone or "").lower()) if (zone or "").lower() in risk_zones else np.nan)
+    has_coordinates = _numpy(pc.and_(pc.is_valid(addresses["latitude"]), pc.is_valid(addresses["longitude"])))
+    latitudes, longitudes = _numbers(addresses["latitude"]), _numbers(addresses["longitude"])
+
+    home = _positions(farmers["address_id"], address_ids)
+    home_owner = np.where(home >= 0, np.arange(size), -1)
+    farm_address = _positions(farms["address_id"], address_ids)
+    farm_address_owner = np.where((farm_address >= 0) & (farm_owner >= 0), farm_owner, -1)
+    location_owner = np.concatenate([home_owner, farm_address_owner])
+    location = np.concatenate([home, farm_address])
+    location_zone = _lookup(zone_points, location, np.nan)
+    zone_owner = np.where(np.isnan(location_zone), -1, location_owner)
+    zone_count = _count(zone_owner, size)
+    f["location_count"] = _count(location_owner, size)
+    f["zone_score"] = np.where(zone_count > 0, _mean(_count(zone_owner, size, np.nan_to_num(location_zone)), zone_count),
+                               risk_zones.default)
+
+    # Proximity uses the farm addresses, or the farmer's own when no farm has one
+    farm_located = _count(farm_address_owner, size) > 0
+    proximity_owner = np.concatenate([np.where(farm_located, -1, home_owner), farm_address_owner])
+    proximity_owner = np.where(_lookup(has_coordinates, location, False), proximity_owner, -1)
+    points = _count(proximity_owner, size)
+    f["has_coordinates"] = points > 0
+    index = markets.get_market_index()
+    if index is None:
+        f["market_distance_km"] = np.full(size, np.nan)
+    else:
+        needed = np.unique(location[proximity_owner >= 0])
+        distances = np.zeros(len(address_ids))
+        if len(needed):
+            distances[needed] = index.nearest_distances(latitudes[needed], longitudes[needed])
+        f["market_distance_km"] = _mean(_count(proximity_owner, size, _lookup(distances, location, 0.0)), points)
+    return f
+
+
+def score_arrays(f: Dict[str, np.ndarray], rules: RuleSet) -> Dict[str, np.ndarray]:
+    """
+    Vectorized credit_score.calculate_credit_score over feature arrays.
+
+    Returns:
+        Dict[str, np.ndarray]: Component scores, raw and final scores and ratings, one entry per farmer
+    """
+    def band(name: str, values: np.ndarray) -> np.ndarray:
+        return rules.bands[name].vectorized(np.nan_to_num(values))
+
+    # Personal & demographic (100)
+    personal = (band("age", f["age"]) + band("experience_years", f["experience_years"]) + f["education_points"]
+                + np.where(f["has_next_of_kin"], rules.award("next_of_kin"), 0))
+    personal = np.minimum(personal, 100)
+
+    # Financial history (200), transactions capped at 60
+    transactions = (band("transaction_count", f["transaction_count"])
+                    + np.where(np.isnan(f["avg_transaction_amount"]), 0,
+                               band("avg_transaction_amount", f["avg_transaction_amount"]))
+                    + band("recent_transactions", f["recent_transaction_count"]))
+    transactions = np.where(f["transaction_count"] > 0, np.minimum(transactions, 60), 0)
+    financial = (band("wallet_balance", f["wallet_balance"])
+                 + np.where(f["bvn_verified"], rules.award("bvn_verified"), 0)
+                 + np.where(f["has_alternative_income"], rules.award("alternative_income"), 0)
+                 + transactions)
+    financial = np.minimum(financial, 200)
+
+    # Loan history (250): repayments (150) and debt load (100)
+    repaid = f["repayment_count"] > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        on_time_ratio = f["on_time_count"] / np.maximum(f["repayment_count"], 1)
+        avg_days_late = f["days_late_sum"] / np.maximum(f["repayment_count"], 1)
+    repayment = (np.where(repaid, band("on_time_ratio", on_time_ratio), 30)
+                 + np.where(repaid, band("avg_days_late", avg_days_late), 20)
+                 + band("fully_repaid_loans", f["fully_repaid_loans"]))
+    repayment = np.where((f["loan_contract_count"] > 0) & (f["loan_repayment_count"] > 0),
+                         np.minimum(repayment, 150), 75)
+    debt = np.where(~f["has_approved_application"], 50,
+                    np.where(~f["has_existing_loans"], 100, band("existing_loan_amount", f["existing_loan_amount"])))
+    loan = np.minimum(repayment + np.minimum(debt, 100), 250)
+
+    # Agricultural factors (200)
+    production = np.minimum(band("total_harvests", f["total_harvests"])
+                            + np.where(np.nan_to_num(f["avg_expected_yield"]) > 0, 20, 0), 40)
+    profit = np.where((f["production_count"] > 0) & ~np.isnan(f["avg_profit_margin"]),
+                      band("avg_profit_margin", f["avg_profit_margin"]), 0)
+    agricultural = (band("farm_size", f["total_farm_size"]) + band("crop_diversity", f["crop_diversity"])
+                    + band("farming_experience", f["farming_experience"]) + production + profit)
+    agricultural = np.where(f["farm_count"] > 0, np.minimum(agricultural, 200), 50)
+
+    # Geographical (100)
+    proximity = np.where(~f["has_coordinates"], 20,
+                         np.where(np.isnan(f["market_distance_km"]), 40,
+                                  band("market_distance_km", f["market_distance_km"])))
+    geographical = np.where(f["location_count"] > 0, np.minimum(f["zone_score"] + proximity, 100), 50).astype(np.float64)
+
+    raw = (personal + financial + loan + agricultural).astype(np.float64) + geographical
+    max_possible = sum(MAX_POINTS.values())
+    scaled = 300 + (raw * (850 - 300) / max_possible)
+    final = np.round(np.clip(scaled, 300, 850)).astype(np.int64)
+    return {
+        "credit_score": final,
+        "credit_rating": rules.bands["credit_rating"].vectorized(final),
+        "personal_demographic": personal.astype(np.int64),
+        "financial_history": financial.astype(np.int64),
+        "loan_history": loan.astype(np.int64),
+        "agricultural_factors": agricultural.astype(np.int64),
+        "geographical": geographical,
+        "raw_score": raw,
+    }
+
+
+def rescore_snapshot(directory: str, out_path: str, rules: Optional[RuleSet] = None,
+                     batch_rows: int = RESCORE_BATCH_ROWS) -> Dict[str, Any]:
+    """
+    Score every farmer in a columnar snapshot and write the scores as Parquet.
+
+    Args:
+        directory (str): Snapshot directory with one file per table
+        out_path (str): Output Parquet file, one row group per batch of farmers
+        rules (RuleSet, optional): Compiled scoring rules, defaults to the active rule table
+        batch_rows (int): Farmers scored per batch
+
+    Returns:
+        Dict[str, Any]: Farmers scored, elapsed seconds and throughput
+    """
+    rules = rules or scoring_rules.get_rules()
+    started = time.perf_counter()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    now_us = int(now.timestamp() * 1_000_000)
+    aggregates = aggregate_snapshot(directory, rules, now, batch_rows)
+    education = rules.keywords["education"]
+
+    offset = 0
+    columns = ["id", "age", "created_at", "highest_education", "mobile_wallet_balance", "bvn", "other_sources_of_income"]
+    with pq.ParquetWriter(out_path, SCORE_SCHEMA) as writer:
+        for batch in iter_batches(snapshot_path(directory, "farmers"), columns, batch_rows):
+            rows = slice(offset, offset + batch.num_rows)
+            offset += batch.num_rows
+            created, created_valid = _timestamps(batch["created_at"])
+            f = {name: values[rows] for name, values in aggregates.items()}
+            f["age"] = _numbers(batch["age"])
+            f["experience_years"] = np.where(created_valid, _days_between(now_us, created) / 365.25, 0.0)
+            f["education_points"] = _map_values(batch["highest_education"], education)
+            f["wallet_balance"] = _numbers(batch["mobile_wallet_balance"])
+            f["bvn_verified"] = _present(batch["bvn"])
+            f["has_alternative_income"] = _present(batch["other_sources_of_income"])
+
+            scores = score_arrays(f, rules)
+            writer.write_table(pa.table(
+                {"farmer_id": pc.cast(batch["id"], pa.string()), **scores,
+                 "rules_version": pa.array([rules.version] * batch.num_rows, type=pa.string())},
+                schema=SCORE_SCHEMA
+            ))
+
+    elapsed = time.perf_counter() - started
+    return {"farmers": offset, "seconds": round(elapsed, 2),
+            "farmers_per_second": round(offset / elapsed, 1) if elapsed else None, "output": out_path}
+
+
+def _arrow_type(annotation) -> pa.DataType:
+    if annotation is datetime.datetime:
+        return pa.timestamp("us", tz="UTC")
+    if annotation is Dict[str, float]:
+        return pa.map_(pa.string(), pa.float64())
+    return {int: pa.int64(), float: pa.float64(), bool: pa.bool_()}.get(annotation, pa.string())
+
+
+def export_snapshot(profiles: Iterable[Dict[str, Any]], directory: str) -> int:
+    """
+    Write request profiles as a columnar snapshot, one Parquet file per table.
+
+    Returns:
+        int: Number of profiles written
+    """
+    rows: Dict[str, List[Dict[str, Any]]] = {key: [] for key in TABLES}
+    count = 0
+    for profile in profiles:
+        count += 1
+        for key in TABLES:
+            rows[key].extend([profile[key]] if key == "farmers" else profile.get(key, []))
+
+    os.makedirs(directory, exist_ok=True)
+    for key, (model, _) in TABLES.items():
+        schema = pa.schema([(name, _arrow_type(field.annotation)) for name, field in model.model_fields.items()])
+        # Timestamps arrive as ISO strings and are parsed by the cast
+        raw = pa.schema([pa.field(name, pa.string()) if pa.types.is_timestamp(field.type) else field for name, field in
+                         zip(schema.names, schema)])
+        table = pa.Table.from_pylist([{name: row.get(name) for name in schema.names} for row in rows[key]], schema=raw)
+        pq.write_table(table.cast(schema), os.path.join(directory, f"{key}.parquet"))
+    return count
+
+
+if __name__ == "__main__":
+    #   python -m scoring.columnar export profiles.jsonl snapshot/
+    #   python -m scoring.columnar score snapshot/ scores.parquet [--batch-rows 65536]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rescore farmers from columnar table snapshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Write JSON lines profiles as a Parquet snapshot")
+    export_parser.add_argument("profiles")
+    export_parser.add_argument("directory")
+    score_parser = commands.add_parser("score", help="Score every farmer in a snapshot")
+    score_parser.add_argument("directory")
+    score_parser.add_argument("out")
+    score_parser.add_argument("--batch-rows", type=int, default=RESCORE_BATCH_ROWS)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        with open(args.profiles, encoding="utf-8") as f:
+            exported = export_snapshot((json.loads(line) for line in f if line.strip()), args.directory)
+        print(f"Exported {exported} profiles to {args.directory}")
+    else:
+        print(json.dumps(rescore_snapshot(args.directory, args.out, batch_rows=args.batch_rows), indent=2))
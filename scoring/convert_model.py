@@ -0,0 +1,228 @@
+import json
+import math
+import os
+import pickle
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from scoring import ml
+
+# Converts models trained elsewhere into the compact format scoring.ml loads:
+#
+#   * XGBoost binary classifiers saved as JSON (booster.save_model("model.json"))
+#   * scikit-learn LogisticRegression (optionally in a Pipeline after a StandardScaler)
+#     or GradientBoostingClassifier, pickled or saved with joblib
+#
+# The positive class must be "repaid", and the model's features must be named after the
+# inputs built by scoring.ml.model_inputs (age, wallet_balance, on_time_ratio, ...).
+# Neither library is needed to load the converted model; scikit-learn (or joblib) is only
+# needed to unpickle its models here.
+
+
+def _tree_arrays(trees: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    Concatenate per-tree node arrays into one node table with absolute child indices.
+
+    Each tree has 'feature' (negative at leaves), 'threshold' (go left if x <= threshold),
+    'left', 'right' (indices within the tree) and 'value' (leaf margin contribution).
+    """
+    roots, feature, threshold, left, right, value = [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        is_leaf = tree["feature"] < 0
+        roots.append(offset)
+        feature.append(np.where(is_leaf, -1, tree["feature"]).astype(np.int64))
+        threshold.append(np.where(is_leaf, 0.0, tree["threshold"]).astype(np.float64))
+        left.append(np.where(is_leaf, -1, tree["left"] + offset).astype(np.int64))
+        right.append(np.where(is_leaf, -1, tree["right"] + offset).astype(np.int64))
+        value.append(np.where(is_leaf, tree["value"], 0.0).astype(np.float64))
+        offset += len(tree["feature"])
+    return {
+        "roots": np.array(roots, dtype=np.int64),
+        "feature": np.concatenate(feature),
+        "threshold": np.concatenate(threshold),
+        "left": np.concatenate(left),
+        "right": np.concatenate(right),
+        "value": np.concatenate(value),
+    }
+
+
+def _logit(probability: float) -> float:
+    return math.log(probability / (1.0 - probability))
+
+
+def _tree_depth(arrays: Dict[str, np.ndarray], root: int) -> int:
+    depth, level = 0, [root]
+    while True:
+        level = [child for node in level if arrays["feature"][node] >= 0
+                 for child in (int(arrays["left"][node]), int(arrays["right"][node]))]
+        if not level:
+            return depth
+        depth += 1
+
+
+def from_xgboost_json(model: Dict[str, Any], feature_names: Optional[List[str]] = None) -> Tuple[str, List[str], Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Convert an XGBoost model saved as JSON.
+
+    Args:
+        model (Dict[str, Any]): The parsed JSON model file.
+        feature_names (List[str], optional): Feature order, if the model was trained
+            without feature names.
+
+    Returns:
+        Tuple: Model type, feature names, arrays and params for scoring.ml.save_model.
+    """
+    learner = model["learner"]
+    objective = learner.get("objective", {}).get("name", "binary:logistic")
+    if objective not in ("binary:logistic", "binary:logitraw"):
+        raise ValueError(f"Unsupported XGBoost objective: {objective}")
+    booster = learner["gradient_booster"]
+    if booster.get("name", "gbtree") != "gbtree":
+        raise ValueError(f"Unsupported XGBoost booster: {booster.get('name')}")
+
+    feature_names = feature_names or learner.get("feature_names")
+    if not feature_names:
+        raise ValueError("The model has no feature names; pass them explicitly")
+
+    # base_score is a probability for binary:logistic, stored as "5E-1" or "[5E-1]"
+    base_score = float(str(learner["learner_model_param"].get("base_score", "0.5")).strip("[]"))
+    base_margin = _logit(base_score) if objective == "binary:logistic" else base_score
+
+    trees = []
+    for tree in booster["model"]["trees"]:
+        left = np.array(tree["left_children"], dtype=np.int64)
+        conditions = np.array(tree["split_conditions"], dtype=np.float64)
+        trees.append({
+            "feature": np.where(left < 0, -1, np.array(tree["split_indices"], dtype=np.int64)),
+            # XGBoost goes left when x < condition; the scorer goes left when x <= threshold
+            "threshold": np.nextafter(conditions, -np.inf),
+            "left": left,
+            "right": np.array(tree["right_children"], dtype=np.int64),
+            # Leaves keep their value in split_conditions
+            "value": conditions,
+        })
+
+    arrays = _tree_arrays(trees)
+    depth = max((_tree_depth(arrays, root) for root in arrays["roots"].tolist()), default=0)
+    return "gbt", list(feature_names), arrays, {"base_score": base_margin, "max_depth": depth}
+
+
+def from_sklearn(estimator: Any, feature_names: Optional[List[str]] = None) -> Tuple[str, List[str], Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Convert a fitted scikit-learn binary classifier.
+
+    Supports LogisticRegression, a Pipeline of StandardScaler and LogisticRegression, and
+    GradientBoostingClassifier with the default log-loss and prior initial estimate.
+
+    Args:
+        estimator: The fitted estimator or pipeline.
+        feature_names (List[str], optional): Feature order, if the estimator was fitted
+            on an array rather than a DataFrame.
+
+    Returns:
+        Tuple: Model type, feature names, arrays and params for scoring.ml.save_model.
+    """
+    scaler = None
+    if hasattr(estimator, "steps"):
+        steps = [step for _, step in estimator.steps if step not in (None, "passthrough")]
+        if len(steps) == 2 and type(steps[0]).__name__ == "StandardScaler":
+            scaler, estimator = steps
+        elif len(steps) == 1:
+            estimator = steps[0]
+        else:
+            raise ValueError("Only a StandardScaler followed by a classifier is supported in a Pipeline")
+
+    if feature_names is None:
+        source = scaler if scaler is not None else estimator
+        if not hasattr(source, "feature_names_in_"):
+            raise ValueError("The model has no feature names; pass them explicitly")
+        feature_names = [str(name) for name in source.feature_names_in_]
+    if list(getattr(estimator, "classes_", [0, 1])) != [0, 1]:
+        raise ValueError("Only binary classifiers with classes 0 and 1 (repaid) are supported")
+
+    kind = type(estimator).__name__
+    if kind == "LogisticRegression":
+        count = len(feature_names)
+        mean = np.asarray(scaler.mean_ if scaler is not None and scaler.with_mean else np.zeros(count), dtype=np.float64)
+        scale = np.asarray(scaler.scale_ if scaler is not None and scaler.with_std else np.ones(count), dtype=np.float64)
+        arrays = {"mean": mean, "scale": scale, "weights": np.asarray(estimator.coef_[0], dtype=np.float64)}
+        return "logistic", list(feature_names), arrays, {"bias": float(estimator.intercept_[0])}
+
+    if kind == "GradientBoostingClassifier":
+        if scaler is not None:
+            raise ValueError("Gradient-boosted trees are converted without a scaler")
+        init = getattr(estimator, "init_", None)
+        if init == "zero":
+            base_margin = 0.0
+        elif type(init).__name__ == "DummyClassifier" and getattr(init, "strategy", "prior") == "prior":
+            base_margin = _logit(float(init.class_prior_[1]))
+        else:
+            raise ValueError("Only the default prior initial estimate is supported")
+
+        trees = []
+        for stage in estimator.estimators_[:, 0]:
+            tree = stage.tree_
+            trees.append({
+                "feature": np.asarray(tree.feature, dtype=np.int64),
+                "threshold": np.asarray(tree.threshold, dtype=np.float64),
+                "left": np.asarray(tree.children_left, dtype=np.int64),
+                "right": np.asarray(tree.children_right, dtype=np.int64),
+                "value": np.asarray(tree.value, dtype=np.float64).reshape(tree.node_count, -1)[:, 0] * estimator.learning_rate,
+            })
+        arrays = _tree_arrays(trees)
+        depth = max((_tree_depth(arrays, root) for root in arrays["roots"].tolist()), default=0)
+        return "gbt", list(feature_names), arrays, {"base_score": base_margin, "max_depth": depth}
+
+    raise ValueError(f"Unsupported scikit-learn model: {kind}")
+
+
+def convert(source: str, output: str, framework: str, feature_names: Optional[List[str]] = None, version: str = "1") -> None:
+    """
+    Convert a model file and write it in the compact format.
+
+    Args:
+        source (str): XGBoost JSON model, or pickled/joblib scikit-learn estimator.
+        output (str): Path to write (e.g. data/credit_model.fcm, or ML_MODEL_PATH).
+        framework (str): 'xgboost' or 'sklearn'.
+        feature_names (List[str], optional): Feature order, if the model has none.
+        version (str): Model version label reported with predictions.
+    """
+    if framework == "xgboost":
+        with open(source, encoding="utf-8") as f:
+            converted = from_xgboost_json(json.load(f), feature_names)
+    elif framework == "sklearn":
+        try:
+            import joblib
+            estimator = joblib.load(source)
+        except ImportError:
+            with open(source, "rb") as f:
+                estimator = pickle.load(f)
+        converted = from_sklearn(estimator, feature_names)
+    else:
+        raise ValueError(f"Unknown framework: {framework}")
+
+    model_type, names, arrays, params = converted
+    # Written next to the target and moved into place, so workers never load a partial file
+    temp_path = f"{output}.tmp-{os.getpid()}"
+    ml.save_model(temp_path, model_type, names, arrays, params, version)
+    os.replace(temp_path, output)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert an XGBoost or scikit-learn model into the ML scoring model format.")
+    parser.add_argument("framework", choices=["xgboost", "sklearn"])
+    parser.add_argument("source", help="XGBoost JSON model, or pickled/joblib scikit-learn estimator")
+    parser.add_argument("output", nargs="?", default=ml.DEFAULT_MODEL_PATH)
+    parser.add_argument("--features", help="Comma-separated feature order, if the model has no feature names")
+    parser.add_argument("--version", default="1", help="Model version label")
+    args = parser.parse_args()
+
+    names = args.features.split(",") if args.features else None
+    convert(args.source, args.output, args.framework, names, args.version)
+    model = ml.CreditModel(args.output)
+    print(f"Wrote {model.model_type} model {model.version} with {len(model.feature_names)} features to {args.output}")
+    model.close()
@@ -0,0 +1,314 @@
+import datetime
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from models.request import (Address, Farm, Farmer, FarmerNextOfKin, FarmProduction, LoanApplication, LoanContract,
+                            LoanRepayment, TransactionHistory)
+from scoring.jobs import score_rows
+
+# Scores farmers straight from the lending database. Profiles are assembled a
+# batch of farmers at a time with one set-based query per table (nine per batch,
+# whatever the batch size), instead of nine queries per farmer. Works with any
+# DB-API connection; SQLite is used locally.
+
+# Farmers assembled and scored per batch
+DB_SCORING_BATCH_SIZE = int(os.getenv("DB_SCORING_BATCH_SIZE", "500"))
+
+# Rows fetched from a cursor at a time
+FETCH_SIZE = 1000
+
+# Profile key -> (table model, default table name)
+TABLES = {
+    "farmers": (Farmer, "farmers"),
+    "farmer_next_of_kin": (FarmerNextOfKin, "farmer_next_of_kin"),
+    "farms": (Farm, "farms"),
+    "farm_production": (FarmProduction, "farm_production"),
+    "address": (Address, "address"),
+    "loan_application": (LoanApplication, "loan_application"),
+    "loan_contract": (LoanContract, "loan_contract"),
+    "loan_repayments": (LoanRepayment, "loan_repayments"),
+    "transaction_history": (TransactionHistory, "transaction_history"),
+}
+
+# Per table: how its rows are tied to a farmer. Each query selects the owning
+# farmer id first, then the table's columns (aliased "t"), for the farmer ids in {ids}.
+_QUERIES = {
+    "farmers": "SELECT t.id, {columns} FROM {farmers} t WHERE t.id IN ({ids})",
+    "farmer_next_of_kin": "SELECT t.farmer_id, {columns} FROM {farmer_next_of_kin} t WHERE t.farmer_id IN ({ids})",
+    "farms": "SELECT t.farmer_id, {columns} FROM {farms} t WHERE t.farmer_id IN ({ids})",
+    "farm_production": (
+        "SELECT f.farmer_id, {columns} FROM {farm_production} t"
+        " JOIN {farms} f ON f.id = t.farm_id WHERE f.farmer_id IN ({ids})"
+    ),
+    "address": (
+        "SELECT o.farmer_id, {columns} FROM {address} t JOIN ("
+        " SELECT id AS farmer_id, address_id FROM {farmers} WHERE id IN ({ids})"
+        " UNION SELECT farmer_id, address_id FROM {farms} WHERE farmer_id IN ({ids})"
+        ") o ON t.id = o.address_id"
+    ),
+    "loan_application": "SELECT t.farmer_id, {columns} FROM {loan_application} t WHERE t.farmer_id IN ({ids})",
+    "loan_contract": (
+        "SELECT a.farmer_id, {columns} FROM {loan_contract} t"
+        " JOIN {loan_application} a ON a.id = t.loan_application_id WHERE a.farmer_id IN ({ids})"
+    ),
+    "loan_repayments": (
+        "SELECT a.farmer_id, {columns} FROM {loan_repayments} t"
+        " JOIN {loan_contract} c ON c.id = t.loan_contract_id"
+        " JOIN {loan_application} a ON a.id = c.loan_application_id WHERE a.farmer_id IN ({ids})"
+    ),
+    "transaction_history": "SELECT t.farmer_id, {columns} FROM {transaction_history} t WHERE t.farmer_id IN ({ids})",
+}
+
+# Lookup columns indexed by create_schema
+_INDEXES = {
+    "farmer_next_of_kin": "farmer_id",
+    "farms": "farmer_id",
+    "farm_production": "farm_id",
+    "loan_application": "farmer_id",
+    "loan_contract": "loan_application_id",
+    "loan_repayments": "loan_contract_id",
+    "transaction_history": "farmer_id",
+}
+
+
+def _columns(model) -> List[str]:
+    return list(model.model_fields)
+
+
+def _paramstyle(connection) -> str:
+    """The DB-API paramstyle of the driver that made `connection`."""
+    module = sys.modules.get(type(connection).__module__.split(".")[0])
+    return getattr(module, "paramstyle", "qmark")
+
+
+def _placeholders(paramstyle: str, count: int, start: int = 0) -> str:
+    if paramstyle == "qmark":
+        return ", ".join("?" * count)
+    if paramstyle in ("format", "pyformat"):
+        return ", ".join(["%s"] * count)
+    if paramstyle == "numeric":
+        return ", ".join(f":{start + i + 1}" for i in range(count))
+    raise ValueError(f"Unsupported DB-API paramstyle: {paramstyle}")
+
+
+def _iter_rows(cursor) -> Iterator[tuple]:
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            return
+        yield from rows
+
+
+class ProfileReader:
+    """
+    Assembles credit score request profiles from the database's tables.
+
+    Args:
+        connection: Open DB-API connection
+        paramstyle (str, optional): Driver paramstyle, detected from the connection if omitted
+        table_names (Dict[str, str], optional): Table name overrides keyed by profile key
+    """
+
+    def __init__(self, connection, paramstyle: Optional[str] = None, table_names: Optional[Dict[str, str]] = None):
+        self.connection = connection
+        self.paramstyle = paramstyle or _paramstyle(connection)
+        self.table_names = {key: name for key, (_, name) in TABLES.items()}
+        self.table_names.update(table_names or {})
+        self.queries = 0
+
+    def _query(self, key: str, farmer_ids: List[str]) -> Iterator[tuple]:
+        model, _ = TABLES[key]
+        template = _QUERIES[key]
+        # The address query binds the id list twice
+        sql = template.format(
+            columns=", ".join(f"t.{column}" for column in _columns(model)),
+            ids="{ids}",
+            **self.table_names
+        )
+        parts = sql.split("{ids}")
+        params: List[str] = []
+        for i in range(len(parts) - 1):
+            parts[i] += _placeholders(self.paramstyle, len(farmer_ids), len(params))
+            params.extend(farmer_ids)
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute("".join(parts), params)
+            self.queries += 1
+            yield from _iter_rows(cursor)
+        finally:
+            cursor.close()
+
+    def read_batch(self, farmer_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Read the profiles of a batch of farmers with one query per table.
+
+        Args:
+            farmer_ids (List[str]): Farmer ids, at most a few thousand
+
+        Returns:
+            List[Optional[Dict[str, Any]]]: Profiles in the order of `farmer_ids`; None for unknown farmers
+        """
+        unique_ids = list(dict.fromkeys(farmer_ids))
+        if not unique_ids:
+            return []
+        profiles: Dict[str, Dict[str, Any]] = {
+            farmer_id: {key: [] for key in TABLES if key != "farmers"} for farmer_id in unique_ids
+        }
+        for key, (model, _) in TABLES.items():
+            columns = _columns(model)
+            for row in self._query(key, unique_ids):
+                record = dict(zip(columns, row[1:]))
+                if isinstance(record.get("transaction_data"), (str, bytes)):
+                    record["transaction_data"] = json.loads(record["transaction_data"])
+                profile = profiles.get(row[0])
+                if profile is None:
+                    continue
+                if key == "farmers":
+                    profile["farmers"] = record
+                else:
+                    profile[key].append(record)
+        return [profiles[farmer_id] if "farmers" in profiles[farmer_id] else None for farmer_id in farmer_ids]
+
+    def farmer_ids(self) -> Iterator[str]:
+        """Stream the ids of every farmer in the database."""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"SELECT id FROM {self.table_names['farmers']} ORDER BY id")
+            for row in _iter_rows(cursor):
+                yield row[0]
+        finally:
+            cursor.close()
+
+    def iter_profiles(self, farmer_ids: Optional[Iterable[str]] = None,
+                      batch_size: int = DB_SCORING_BATCH_SIZE) -> Iterator[Tuple[List[str], List[Optional[Dict[str, Any]]]]]:
+        """Yield (farmer ids, profiles) a batch at a time, for the given farmers or every farmer."""
+        ids = iter(farmer_ids) if farmer_ids is not None else self.farmer_ids()
+        batch: List[str] = []
+        for farmer_id in ids:
+            batch.append(farmer_id)
+            if len(batch) == batch_size:
+                yield batch, self.read_batch(batch)
+                batch = []
+        if batch:
+            yield batch, self.read_batch(batch)
+
+
+def score_database(connection, farmer_ids: Optional[Iterable[str]] = None, batch_size: int = DB_SCORING_BATCH_SIZE,
+                   paramstyle: Optional[str] = None, table_names: Optional[Dict[str, str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Score farmers from the database, streaming one result per farmer.
+
+    Args:
+        connection: Open DB-API connection
+        farmer_ids (Iterable[str], optional): Farmers to score, defaults to every farmer
+        batch_size (int): Farmers assembled per batch
+        paramstyle (str, optional): Driver paramstyle, detected from the connection if omitted
+        table_names (Dict[str, str], optional): Table name overrides keyed by profile key
+
+    Returns:
+        Iterator[Dict[str, Any]]: Credit score results, or an "error" for farmers that failed or don't exist
+    """
+    reader = ProfileReader(connection, paramstyle, table_names)
+    position = 0
+    for ids, profiles in reader.iter_profiles(farmer_ids, batch_size):
+        found = [profile for profile in profiles if profile is not None]
+        results, _, _ = score_rows(found, position)
+        results = iter(results)
+        for farmer_id, profile in zip(ids, profiles):
+            if profile is None:
+                yield {"index": position, "farmer_id": farmer_id, "error": "Farmer not found"}
+            else:
+                yield {**next(results), "index": position}
+            position += 1
+
+
+def create_schema(connection) -> None:
+    """Create the profile tables and their lookup indexes in a SQLite database."""
+    types = {int: "INTEGER", float: "REAL", bool: "INTEGER"}
+    for key, (model, name) in TABLES.items():
+        columns = [
+            f"{column} {types.get(field.annotation, 'TEXT')}" + (" PRIMARY KEY" if column == "id" else "")
+            for column, field in model.model_fields.items()
+        ]
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {name} ({', '.join(columns)})")
+        if key in _INDEXES:
+            connection.execute(f"CREATE INDEX IF NOT EXISTS {name}_{_INDEXES[key]} ON {name} ({_INDEXES[key]})")
+    connection.commit()
+
+
+def _sql_value(value: Any) -> Any:
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return value
+
+
+def insert_profiles(connection, profiles: Iterable[Dict[str, Any]]) -> int:
+    """
+    Insert request profiles into a SQLite database created by create_schema.
+
+    Returns:
+        int: Number of profiles inserted
+    """
+    rows: Dict[str, List[tuple]] = {key: [] for key in TABLES}
+    count = 0
+    for profile in profiles:
+        count += 1
+        for key, (model, _) in TABLES.items():
+            records = [profile[key]] if key == "farmers" else profile.get(key, [])
+            rows[key].extend(tuple(_sql_value(record.get(column)) for column in _columns(model)) for record in records)
+    for key, (model, name) in TABLES.items():
+        columns = _columns(model)
+        connection.executemany(
+            f"INSERT OR REPLACE INTO {name} ({', '.join(columns)}) VALUES ({_placeholders('qmark', len(columns))})",
+            rows[key]
+        )
+    connection.commit()
+    return count
+
+
+if __name__ == "__main__":
+    # Local SQLite databases:
+    #   python -m scoring.database load farmers.sqlite profiles.jsonl
+    #   python -m scoring.database score farmers.sqlite [--ids ID ...] [--out scores.jsonl]
+    import argparse
+    import sqlite3
+    import time
+
+    parser = argparse.ArgumentParser(description="Score farmers directly from a database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    load_parser = commands.add_parser("load", help="Create the tables and insert JSON lines profiles")
+    load_parser.add_argument("database")
+    load_parser.add_argument("profiles")
+    score_parser = commands.add_parser("score", help="Score farmers and write JSON lines results")
+    score_parser.add_argument("database")
+    score_parser.add_argument("--ids", nargs="+", help="Farmers to score (default: all)")
+    score_parser.add_argument("--batch-size", type=int, default=DB_SCORING_BATCH_SIZE)
+    score_parser.add_argument("--out", help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.database)
+    if args.command == "load":
+        create_schema(connection)
+        with open(args.profiles, encoding="utf-8") as f:
+            count = insert_profiles(connection, (json.loads(line) for line in f if line.strip()))
+        print(f"Loaded {count} profiles into {args.database}")
+    else:
+        started = time.perf_counter()
+        scored = errors = 0
+        out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+        try:
+            for result in score_database(connection, args.ids, args.batch_size):
+                errors += "error" in result
+                scored += "error" not in result
+                out.write(json.dumps(result) + "\n")
+        finally:
+            if args.out:
+                out.close()
+        elapsed = time.perf_counter() - started
+        print(json.dumps({"scored": scored, "errors": errors, "seconds": round(elapsed, 2),
+                          "farmers_per_second": round((scored + errors) / elapsed, 1) if elapsed else None}),
+              file=sys.stderr)
@@ -0,0 +1,439 @@
+import csv
+import datetime
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, fields, astuple
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+from scoring import markets
+
+# Maximum number of feature vectors kept in the in-process cache
+DEFAULT_CACHE_SIZE = int(os.getenv("FEATURE_CACHE_SIZE", "10000"))
+
+
+@dataclass(frozen=True)
+class FarmerFeatures:
+    """
+    Raw signals extracted once per farmer profile.
+
+    Every scoring engine (heuristic bands, ML model, analytics exports)
+    reads these values instead of walking the nested farmer JSON again.
+    Optional fields are None when the underlying data is missing.
+    """
+    farmer_id: Optional[str]
+
+    # Personal & demographic
+    age: float
+    experience_years: float
+    highest_education: str
+    has_next_of_kin: bool
+
+    # Financial history
+    wallet_balance: float
+    bvn_verified: bool
+    has_alternative_income: bool
+    transaction_count: int
+    avg_transaction_amount: Optional[float]
+    recent_transaction_count: int
+
+    # Loan history
+    loan_contract_count: int
+    loan_repayment_count: int
+    repayment_count: int
+    on_time_count: int
+    days_late_sum: int
+    fully_repaid_loans: int
+    has_approved_application: bool
+    has_existing_loans: bool
+    existing_loan_amount: float
+
+    # Agricultural factors
+    farm_count: int
+    total_farm_size: float
+    crop_diversity: int
+    farming_experience: float
+    total_harvests: int
+    production_count: int
+    avg_expected_yield: Optional[float]
+    avg_profit_margin: Optional[float]
+
+    # Geographical
+    location_count: int
+    geopolitical_zones: Tuple[str, ...]
+    has_coordinates: bool
+    market_distance_km: Optional[float]
+
+    @property
+    def on_time_ratio(self) -> Optional[float]:
+        return self.on_time_count / self.repayment_count if self.repayment_count else None
+
+    @property
+    def avg_days_late(self) -> Optional[float]:
+        return self.days_late_sum / self.repayment_count if self.repayment_count else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+
+FEATURE_NAMES = [f.name for f in fields(FarmerFeatures)]
+
+
+def _parse_timestamp(value: Union[str, datetime.date]) -> datetime.datetime:
+    """
+    Timestamps arrive as ISO strings (JSON bodies, snapshots, database rows) or as
+    datetimes (validated request models); naive ones are taken to be UTC.
+    """
+    if isinstance(value, datetime.datetime):
+        parsed = value
+    elif isinstance(value, datetime.date):
+        parsed = datetime.datetime.combine(value, datetime.time())
+    else:
+        parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=datetime.timezone.utc)
+
+
+def calculate_years_of_experience(data: Dict[str, Any]) -> float:
+    """Calculate years of experience based on farmers.created_at."""
+    created_at_str = data.get("farmers", {}).get("created_at")
+    if not created_at_str:
+        return 0
+
+    try:
+        created_at = _parse_timestamp(created_at_str)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return (now - created_at).days / 365.25
+    except (ValueError, TypeError):
+        return 0
+
+
+def calculate_farming_experience(farms: List[Dict[str, Any]]) -> float:
+    """Calculate years of farming experience from the oldest farm start date."""
+    if not farms:
+        return 0
+
+    oldest_start_date = None
+    for farm in farms:
+        start_date_str = farm.get("start_date")
+        if not start_date_str:
+            continue
+
+        try:
+            start_date = _parse_timestamp(start_date_str).date()
+            if oldest_start_date is None or start_date < oldest_start_date:
+                oldest_start_date = start_date
+        except (ValueError, TypeError):
+            pass
+
+    if oldest_start_date:
+        now = datetime.datetime.now().date()
+        return (now - oldest_start_date).days / 365.25
+    return 0
+
+
+def _transaction_signals(transactions: List[Dict[str, Any]]) -> Tuple[Optional[float], int]:
+    """Return the average positive transaction amount and the count of the last 90 days."""
+    amounts = []
+    recent_count = 0
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    for tx in transactions:
+        tx_data = tx.get("transaction_data", {})
+        if isinstance(tx_data, str):
+            try:
+                tx_data = json.loads(tx_data)
+            except ValueError:
+                tx_data = {}
+
+        amount = tx_data.get("amount", 0)
+        if amount > 0:
+            amounts.append(amount)
+
+        tx_date_str = tx.get("created_at")
+        if tx_date_str:
+            try:
+                if (now - _parse_timestamp(tx_date_str)).days <= 90:
+                    recent_count += 1
+            except (ValueError, TypeError):
+                pass
+
+    avg_amount = sum(amounts) / len(amounts) if amounts else None
+    return avg_amount, recent_count
+
+
+def _repayment_signals(loan_contracts: List[Dict[str, Any]], loan_repayments: List[Dict[str, Any]]) -> Tuple[int, int, int, int]:
+    """Return total repayments, on-time repayments, total days late and fully repaid loans."""
+    contract_repayments = {}
+    for repayment in loan_repayments:
+        contract_id = repayment.get("loan_contract_id")
+        if contract_id:
+            contract_repayments.setdefault(contract_id, []).append(repayment)
+
+    total_on_time = 0
+    total_repayments = 0
+    days_late_sum = 0
+    fully_repaid_loans = 0
+
+    for contract in loan_contracts:
+        contract_id = contract.get("id")
+        if not contract_id or contract_id not in contract_repayments:
+            continue
+
+        repayments = contract_repayments[contract_id]
+        all_paid = True
+
+        for repayment in repayments:
+            due_date_str = repayment.get("due_date")
+            date_paid_str = repayment.get("date_paid")
+
+            if not due_date_str or not date_paid_str:
+                all_paid = False
+                continue
+
+            try:
+                due_date = _parse_timestamp(due_date_str)
+                date_paid = _parse_timestamp(date_paid_str)
+
+                if date_paid <= due_date:
+                    total_on_time += 1
+                else:
+                    days_late_sum += (date_paid - due_date).days
+            except (ValueError, TypeError):
+                all_paid = False
+                continue
+
+        total_repayments += len(repayments)
+        if all_paid and repayments:
+            fully_repaid_loans += 1
+
+    return total_repayments, total_on_time, days_late_sum, fully_repaid_loans
+
+
+def _most_recent_approved(loan_applications: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Find the most recent approved loan application."""
+    most_recent = None
+    for application in loan_applications:
+        if application.get("status") != "approved":
+            continue
+        if most_recent is None:
+            most_recent = application
+            continue
+
+        app_date_str = application.get("created_at")
+        recent_date_str = most_recent.get("created_at")
+        if app_date_str and recent_date_str:
+            try:
+                if _parse_timestamp(app_date_str) > _parse_timestamp(recent_date_str):
+                    most_recent = application
+            except (ValueError, TypeError):
+                pass
+    return most_recent
+
+
+def _locations(data: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Return the farmer and farm addresses, and the farm addresses alone."""
+    addresses = []
+    address_list = data.get("address", [])
+
+    farmer_address_id = data.get("farmers", {}).get("address_id")
+    if farmer_address_id:
+        for address in address_list:
+            if address.get("id") == farmer_address_id:
+                addresses.append(address)
+                break
+
+    farm_addresses = []
+    for farm in data.get("farms", []):
+        farm_address_id = farm.get("address_id")
+        if farm_address_id:
+            for address in address_list:
+                if address.get("id") == farm_address_id:
+                    farm_addresses.append(address)
+                    break
+
+    addresses.extend(farm_addresses)
+    return addresses, farm_addresses
+
+
+def extract_features(data: Dict[str, Any]) -> FarmerFeatures:
+    """
+    Walk a farmer profile once and collect every raw signal used for scoring.
+
+    Args:
+        data (Dict[str, Any]): JSON containing all relevant farmer data from database
+
+    Returns:
+        FarmerFeatures: The typed feature vector for this farmer
+    """
+    farmer = data.get("farmers", {})
+    transactions = data.get("transaction_history", [])
+    loan_contracts = data.get("loan_contract", [])
+    loan_repayments = data.get("loan_repayments", [])
+    farms = data.get("farms", [])
+    farm_production = data.get("farm_production", [])
+
+    avg_amount, recent_count = _transaction_signals(transactions)
+    repayment_count, on_time_count, days_late_sum, fully_repaid_loans = _repayment_signals(loan_contracts, loan_repayments)
+
+    most_recent = _most_recent_approved(data.get("loan_application", []))
+    has_existing_loans = bool(most_recent and most_recent.get("existing_loans", False))
+
+    profits = [p.get("expected_unit_profit", 0) for p in farm_production if p.get("expected_unit_profit", 0) > 0]
+
+    addresses, farm_addresses = _locations(data)
+    proximity_addresses = farm_addresses or addresses
+    has_coordinates = any(
+        address.get("latitude") is not None and address.get("longitude") is not None
+        for address in proximity_addresses
+    )
+
+    return FarmerFeatures(
+        farmer_id=farmer.get("id"),
+        age=farmer.get("age", 0),
+        experience_years=calculate_years_of_experience(data),
+        highest_education=farmer.get("highest_education", "") or "",
+        has_next_of_kin=len(data.get("farmer_next_of_kin", [])) > 0,
+        wallet_balance=farmer.get("mobile_wallet_balance", 0),
+        bvn_verified=bool(farmer.get("bvn")),
+        has_alternative_income=bool(farmer.get("other_sources_of_income")),
+        transaction_count=len(transactions),
+        avg_transaction_amount=avg_amount,
+        recent_transaction_count=recent_count,
+        loan_contract_count=len(loan_contracts),
+        loan_repayment_count=len(loan_repayments),
+        repayment_count=repayment_count,
+        on_time_count=on_time_count,
+        days_late_sum=days_late_sum,
+        fully_repaid_loans=fully_repaid_loans,
+        has_approved_application=most_recent is not None,
+        has_existing_loans=has_existing_loans,
+        existing_loan_amount=most_recent.get("total_existing_loan_amount", 0) if has_existing_loans else 0,
+        farm_count=len(farms),
+        total_farm_size=sum(farm.get("size", 0) for farm in farms),
+        crop_diversity=len({p.get("type") for p in farm_production if p.get("type")}),
+        farming_experience=calculate_farming_experience(farms),
+        total_harvests=sum(farm.get("number_of_harvests", 0) for farm in farms),
+        production_count=len(farm_production),
+        avg_expected_yield=sum(p.get("expected_yield", 0) for p in farm_production) / len(farm_production) if farm_production else None,
+        avg_profit_margin=sum(profits) / len(profits) if profits else None,
+        location_count=len(addresses),
+        geopolitical_zones=tuple(address.get("geopolitical_zone", "").lower() for address in addresses),
+        has_coordinates=has_coordinates,
+        market_distance_km=markets.nearest_market_distance(proximity_addresses) if has_coordinates else None,
+    )
+
+
+def profile_fingerprint(data: Dict[str, Any]) -> str:
+    """Stable hash of a farmer profile, used as the feature cache key."""
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class FeatureCache:
+    """
+    Thread-safe LRU cache of feature vectors keyed by profile fingerprint.
+
+    Keys include the current date, since recency and experience signals are
+    relative to today.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[Tuple[str, str], FarmerFeatures]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, data: Dict[str, Any]) -> FarmerFeatures:
+        key = (profile_fingerprint(data), datetime.date.today().isoformat())
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        features = extract_features(data)
+        with self.lock:
+            self.entries[key] = features
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return features
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else None,
+            }
+
+
+_cache = FeatureCache()
+
+
+def get_features(data: Dict[str, Any]) -> FarmerFeatures:
+    """Return the feature vector for a farmer profile, computing it only on a cache miss."""
+    return _cache.get(data)
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    return _cache.stats()
+
+
+def _export_row(features: FarmerFeatures) -> List[Any]:
+    row = list(astuple(features))
+    zones = FEATURE_NAMES.index("geopolitical_zones")
+    row[zones] = "|".join(row[zones])
+    return row
+
+
+def export_features(features: List[FarmerFeatures], path: str) -> None:
+    """
+    Write feature vectors in bulk for model training or analytics.
+
+    The format follows the file extension: .parquet (requires pyarrow) or .csv.
+    Geopolitical zones are written as a '|' separated string.
+
+    Args:
+        features (List[FarmerFeatures]): Feature vectors to export
+        path (str): Output file path
+    """
+    rows = [_export_row(f) for f in features]
+
+    if path.endswith(".parquet"):
+        import pyarrow as pa  # Optional dependency, only needed for Parquet export
+        import pyarrow.parquet as pq
+        columns = {name: [row[i] for row in rows] for i, name in enumerate(FEATURE_NAMES)}
+        pq.write_table(pa.table(columns), path)
+        return
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(FEATURE_NAMES)
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    # Bulk export: python -m scoring.features profiles.jsonl features.parquet
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python -m scoring.features <profiles.jsonl> <output.csv|output.parquet>")
+        sys.exit(1)
+
+    with open(sys.argv[1], encoding="utf-8") as f:
+        extracted = [extract_features(json.loads(line)) for line in f if line.strip()]
+    export_features(extracted, sys.argv[2])
+    print(f"Exported {len(extracted)} feature vectors to {sys.argv[2]}")
@@ -0,0 +1,558 @@
+import datetime
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import credit_score
+from models.request import CreditScoreRequestModel
+from scoring import rules as scoring_rules
+
+# Durable queue for bulk scoring jobs. A job is split into chunks stored in a
+# SQLite database; workers in any process claim a chunk with a lease, score it
+# and store its results. A chunk whose worker died is claimed again once its
+# lease expires, and finished chunks are never rescored, so jobs resume after a
+# crash or restart.
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_JOBS_DB_PATH = os.path.join(_root, "data", "jobs.sqlite")
+DEFAULT_JOBS_INPUT_DIR = os.path.join(_root, "data", "job_inputs")
+
+# Farmers per chunk, and the largest chunk a job may ask for
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "500"))
+MAX_CHUNK_SIZE = 10000
+
+# Worker threads per process (0 disables them, e.g. when workers run separately)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+
+# How long a claimed chunk is reserved for its worker, and how often it may be retried
+JOB_CHUNK_LEASE_SECONDS = float(os.getenv("JOB_CHUNK_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# How often idle workers check for chunks queued by other processes
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+
+# Largest page of results returned by get_job
+MAX_RESULTS_PAGE = 1000
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+COMPLETED_WITH_ERRORS = "completed_with_errors"
+FAILED = "failed"
+
+# Chunk statuses
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    source TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    job_id TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    first_row INTEGER NOT NULL,
+    row_count INTEGER NOT NULL,
+    start_offset INTEGER,
+    end_offset INTEGER,
+    payload TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    started_at REAL,
+    finished_at REAL,
+    scored INTEGER,
+    errors INTEGER,
+    results TEXT,
+    error TEXT,
+    PRIMARY KEY (job_id, chunk_index)
+);
+CREATE INDEX IF NOT EXISTS chunks_by_status ON chunks (status, lease_expires);
+"""
+
+
+class JobError(ValueError):
+    """Raised when a job submission is invalid."""
+
+
+def jobs_db_path() -> str:
+    return os.getenv("JOBS_DB_PATH", DEFAULT_JOBS_DB_PATH)
+
+
+def jobs_input_dir() -> str:
+    return os.getenv("JOBS_INPUT_DIR", DEFAULT_JOBS_INPUT_DIR)
+
+
+def _timestamp(seconds: Optional[float]) -> Optional[str]:
+    if seconds is None:
+        return None
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).isoformat()
+
+
+def resolve_input_file(name: str) -> str:
+    """Resolve a job's file reference, which must be inside JOBS_INPUT_DIR."""
+    base = os.path.realpath(jobs_input_dir())
+    path = os.path.realpath(os.path.join(base, name))
+    if not path.startswith(base + os.sep):
+        raise JobError(f"Job input files must be inside {base}")
+    if not os.path.isfile(path):
+        raise JobError(f"Job input file not found: {name}")
+    return path
+
+
+def plan_file_chunks(path: str, chunk_size: int) -> List[Tuple[int, int, int, int]]:
+    """
+    Split a JSON lines file into chunks of `chunk_size` non-empty lines.
+
+    Returns:
+        List[Tuple[int, int, int, int]]: (first_row, row_count, start_offset, end_offset) per chunk.
+    """
+    chunks = []
+    first_row = rows = 0
+    start = offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            offset += len(line)
+            if not line.strip():
+                continue
+            rows += 1
+            if rows == chunk_size:
+                chunks.append((first_row, rows, start, offset))
+                first_row += rows
+                rows, start = 0, offset
+    if rows:
+        chunks.append((first_row, rows, start, offset))
+    return chunks
+
+
+def score_rows(rows: List[Any], first_row: int) -> Tuple[List[Dict[str, Any]], int, int]:
+    """
+    Validate and score a chunk of farmer profiles. A profile that fails is
+    reported with its error instead of failing the chunk.
+
+    Args:
+        rows (List[Any]): Profiles as dicts or JSON strings
+        first_row (int): Position of the first profile in the job's input
+
+    Returns:
+        Tuple[List[Dict[str, Any]], int, int]: Per-farmer results, scored count, error count
+    """
+    rules = scoring_rules.get_rules()
+    results = []
+    errors = 0
+    for i, row in enumerate(rows):
+        farmer_id = None
+        try:
+            data = json.loads(row) if isinstance(row, (str, bytes)) else row
+            farmer_id = (data.get("farmers") or {}).get("id")
+            farmer_data = CreditScoreRequestModel(**data).model_dump()
+            result = credit_score.calculate_credit_score(farmer_data, rules)
+            results.append({"index": first_row + i, "farmer_id": farmer_id, **result})
+        except Exception as e:
+            errors += 1
+            results.append({"index": first_row + i, "farmer_id": farmer_id, "error": str(e)})
+    return results, len(rows) - errors, errors
+
+
+class JobStore:
+    """
+    SQLite-backed store of jobs, their chunks and results. Safe to share between
+    threads and processes; every operation uses its own connection.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or jobs_db_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._transaction() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30.0)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connect()
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def create_job(self, source: Dict[str, Any], chunks: List[Dict[str, Any]], chunk_size: int) -> str:
+        job_id = uuid.uuid4().hex
+        total = sum(chunk["row_count"] for chunk in chunks)
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, status, source, total, chunk_size, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED if chunks else COMPLETED, json.dumps(source), total, chunk_size, time.time())
+            )
+            connection.executemany(
+                "INSERT INTO chunks (job_id, chunk_index, status, first_row, row_count, start_offset, end_offset, payload)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(job_id, index, PENDING, chunk["first_row"], chunk["row_count"], chunk.get("start_offset"),
+                  chunk.get("end_offset"), chunk.get("payload")) for index, chunk in enumerate(chunks)]
+            )
+        return job_id
+
+    def claim_chunk(self, worker: str) -> Optional[sqlite3.Row]:
+        """
+        Claim the oldest pending chunk, or one whose worker's lease has expired.
+
+        Returns:
+            Optional[sqlite3.Row]: The claimed chunk joined with its job's source, or None.
+        """
+        while True:
+            now = time.time()
+            connection = self._connect()
+            try:
+                connection.execute("BEGIN IMMEDIATE")
+                chunk = connection.execute(
+                    "SELECT c.*, j.source FROM chunks c JOIN jobs j ON j.id = c.job_id"
+                    " WHERE c.status = ? OR (c.status = ? AND c.lease_expires < ?)"
+                    " ORDER BY c.rowid LIMIT 1",
+                    (PENDING, CLAIMED, now)
+                ).fetchone()
+                if chunk is None:
+                    connection.execute("COMMIT")
+                    return None
+
+                if chunk["attempts"] >= JOB_MAX_ATTEMPTS:
+                    # Its workers keep dying (e.g. out of memory): give up on this chunk
+                    connection.execute(
+                        "UPDATE chunks SET status = ?, finished_at = ?, error = ? WHERE job_id = ? AND chunk_index = ?",
+                        (FAILED, now, f"Abandoned after {chunk['attempts']} attempts", chunk["job_id"], chunk["chunk_index"])
+                    )
+                    self._finish_job_if_done(connection, chunk["job_id"], now)
+                    connection.execute("COMMIT")
+                    continue
+
+                connection.execute(
+                    "UPDATE chunks SET status = ?, attempts = attempts + 1, worker = ?, lease_expires = ?, started_at = ?"
+                    " WHERE job_id = ? AND chunk_index = ?",
+                    (CLAIMED, worker, now + JOB_CHUNK_LEASE_SECONDS, now, chunk["job_id"], chunk["chunk_index"])
+                )
+                connection.execute(
+                    "UPDATE jobs SET status = ?, started_at = COALESCE(started_at, ?) WHERE id = ?",
+                    (RUNNING, now, chunk["job_id"])
+                )
+                connection.execute("COMMIT")
+                return chunk
+            except BaseException:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                raise
+            finally:
+                connection.close()
+
+    def complete_chunk(self, job_id: str, chunk_index: int, worker: str, results: List[Dict[str, Any]],
+                       scored: int, errors: int) -> None:
+        now = time.time()
+        with self._transaction() as connection:
+            # Only the current lease holder may store results
+            connection.execute(
+                "UPDATE chunks SET status = ?, finished_at = ?, scored = ?, errors = ?, results = ?, error = NULL"
+                " WHERE job_id = ? AND chunk_index = ? AND status = ? AND worker = ?",
+                (DONE, now, scored, errors, json.dumps(results), job_id, chunk_index, CLAIMED, worker)
+            )
+            self._finish_job_if_done(connection, job_id, now)
+
+    def fail_chunk(self, job_id: str, chunk_index: int, worker: str, error: str) -> None:
+        """Record a chunk-level error; the chunk is retried until it reaches JOB_MAX_ATTEMPTS."""
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE chunks SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END,"
+                " finished_at = CASE WHEN attempts >= ? THEN ? END, lease_expires = NULL, error = ?"
+                " WHERE job_id = ? AND chunk_index = ? AND status = ? AND worker = ?",
+                (JOB_MAX_ATTEMPTS, FAILED, PENDING, JOB_MAX_ATTEMPTS, now, error, job_id, chunk_index, CLAIMED, worker)
+            )
+            self._finish_job_if_done(connection, job_id, now)
+
+    def _finish_job_if_done(self, connection: sqlite3.Connection, job_id: str, now: float) -> None:
+        counts = dict(connection.execute(
+            "SELECT status, COUNT(*) FROM chunks WHERE job_id = ? GROUP BY status", (job_id,)
+        ).fetchall())
+        if counts.get(PENDING) or counts.get(CLAIMED):
+            return
+        if not counts.get(FAILED):
+            status = COMPLETED
+        else:
+            status = FAILED if not counts.get(DONE) else COMPLETED_WITH_ERRORS
+        connection.execute(
+            "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND finished_at IS NULL", (status, now, job_id)
+        )
+
+    def get_job(self, job_id: str, offset: int = 0, limit: int = 100) -> Optional[Dict[str, Any]]:
+        """
+        Job status with progress, throughput and a page of the results scored so far.
+
+        Args:
+            job_id (str): Job ID
+            offset (int): Number of finished results to skip, in input order
+            limit (int): Maximum results to return (up to MAX_RESULTS_PAGE)
+
+        Returns:
+            Optional[Dict[str, Any]]: The job, or None if it does not exist
+        """
+        with self._transaction() as connection:
+            job = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            chunks = connection.execute(
+                "SELECT chunk_index, status, row_count, scored, errors, error FROM chunks WHERE job_id = ? ORDER BY chunk_index",
+                (job_id,)
+            ).fetchall()
+
+            done = [c for c in chunks if c["status"] == DONE]
+            processed = sum(c["row_count"] for c in done)
+            end = job["finished_at"] or time.time()
+            elapsed = end - job["started_at"] if job["started_at"] else None
+            throughput = processed / elapsed if elapsed else None
+            remaining = job["total"] - processed
+
+            # Page through the results of finished chunks, loading only the chunks needed
+            results = []
+            limit = max(0, min(limit, MAX_RESULTS_PAGE))
+            skip = max(0, offset)
+            for chunk in done:
+                if len(results) >= limit:
+                    break
+                if skip >= chunk["row_count"]:
+                    skip -= chunk["row_count"]
+                    continue
+                row = connection.execute(
+                    "SELECT results FROM chunks WHERE job_id = ? AND chunk_index = ?", (job_id, chunk["chunk_index"])
+                ).fetchone()
+                results.extend(json.loads(row["results"])[skip:skip + limit - len(results)])
+                skip = 0
+
+        source = json.loads(job["source"])
+        return {
+            "job_id": job_id,
+            "status": job["status"],
+            "source": {key: value for key, value in source.items() if key != "path"},
+            "created_at": _timestamp(job["created_at"]),
+            "started_at": _timestamp(job["started_at"]),
+            "finished_at": _timestamp(job["finished_at"]),
+            "total": job["total"],
+            "processed": processed,
+            "scored": sum(c["scored"] for c in done),
+            "errors": sum(c["errors"] for c in done),
+            "progress": processed / job["total"] if job["total"] else 1.0,
+            "chunks": {
+                "total": len(chunks),
+                **{status: sum(1 for c in chunks if c["status"] == status) for status in (PENDING, CLAIMED, DONE, FAILED)},
+            },
+            "failed_chunks": [{"chunk": c["chunk_index"], "error": c["error"]} for c in chunks if c["status"] == FAILED],
+            "throughput_per_second": throughput,
+            "eta_seconds": remaining / throughput if throughput and job["finished_at"] is None else None,
+            "results_offset": offset,
+            "results": results,
+        }
+
+
+def read_chunk(chunk: sqlite3.Row) -> List[Any]:
+    """Load a chunk's profiles from the job database or the job's input file."""
+    if chunk["payload"] is not None:
+        return json.loads(chunk["payload"])
+    source = json.loads(chunk["source"])
+    if os.path.getsize(source["path"]) != source["size"]:
+        raise JobError(f"Job input file changed since submission: {source['file']}")
+    with open(source["path"], "rb") as f:
+        f.seek(chunk["start_offset"])
+        data = f.read(chunk["end_offset"] - chunk["start_offset"])
+    return [line for line in data.splitlines() if line.strip()]
+
+
+class JobWorkerPool:
+    """
+    Threads that claim and score chunks from the job store until stopped.
+    """
+
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS):
+        self.store = store
+        self.workers = workers
+        self.threads: List[threading.Thread] = []
+        self.stopping = threading.Event()
+        self.wake = threading.Event()
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, args=(f"{self.name}:{i}",), name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Stop after the chunks in progress; unfinished chunks are picked up again later."""
+        self.stopping.set()
+        self.wake.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def notify(self) -> None:
+        """Wake idle workers, e.g. after a job is submitted in this process."""
+        self.wake.set()
+
+    def _run(self, worker: str) -> None:
+        while not self.stopping.is_set():
+            try:
+                chunk = self.store.claim_chunk(worker)
+            except sqlite3.Error as e:
+                print(f"Job worker {worker} could not claim a chunk: {e}")
+                chunk = None
+            if chunk is None:
+                self.wake.wait(JOB_POLL_SECONDS)
+                self.wake.clear()
+                continue
+            self.process(chunk, worker)
+
+    def process(self, chunk: sqlite3.Row, worker: str) -> None:
+        job_id, index = chunk["job_id"], chunk["chunk_index"]
+        started = time.perf_counter()
+        try:
+            results, scored, errors = score_rows(read_chunk(chunk), chunk["first_row"])
+        except Exception as e:
+            print(f"Job {job_id} chunk {index} failed: {e}")
+            self.store.fail_chunk(job_id, index, worker, str(e))
+            return
+        self.store.complete_chunk(job_id, index, worker, results, scored, errors)
+        print(json.dumps({
+            "event": "job_chunk",
+            "job_id": job_id,
+            "chunk": index,
+            "rows": chunk["row_count"],
+            "errors": errors,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        }))
+
+
+_store: Optional[JobStore] = None
+_pool: Optional[JobWorkerPool] = None
+_lock = threading.Lock()
+
+
+def get_store() -> JobStore:
+    """Return the process-wide job store, opening the database on first use."""
+    global _store
+    with _lock:
+        if _store is None:
+            _store = JobStore()
+        return _store
+
+
+def start_workers(workers: int = JOB_WORKERS) -> None:
+    """Start this process's job workers; they also resume chunks left unfinished by a crash."""
+    global _pool
+    with _lock:
+        if _pool is not None or workers <= 0:
+            return
+    pool = JobWorkerPool(get_store(), workers)
+    pool.start()
+    with _lock:
+        _pool = pool
+
+
+def stop_workers() -> None:
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.stop()
+
+
+def submit_job(farmers: Optional[List[Dict[str, Any]]] = None, file: Optional[str] = None,
+               chunk_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Queue a bulk scoring job.
+
+    Args:
+        farmers (List[Dict[str, Any]], optional): Farmer profiles to score
+        file (str, optional): JSON lines file of profiles, relative to JOBS_INPUT_DIR
+        chunk_size (int, optional): Farmers per chunk (default JOB_CHUNK_SIZE)
+
+    Returns:
+        Dict[str, Any]: The queued job's status
+    """
+    if (farmers is None) == (file is None):
+        raise JobError("Provide either 'farmers' or 'file'")
+    chunk_size = chunk_size or JOB_CHUNK_SIZE
+    if not 1 <= chunk_size <= MAX_CHUNK_SIZE:
+        raise JobError(f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}")
+
+    if farmers is not None:
+        source = {"type": "inline"}
+        chunks = [
+            {"first_row": start, "row_count": len(farmers[start:start + chunk_size]),
+             "payload": json.dumps(farmers[start:start + chunk_size], default=str)}
+            for start in range(0, len(farmers), chunk_size)
+        ]
+    else:
+        path = resolve_input_file(file)
+        source = {"type": "file", "file": file, "path": path, "size": os.path.getsize(path)}
+        chunks = [
+            {"first_row": first_row, "row_count": row_count, "start_offset": start, "end_offset": end}
+            for first_row, row_count, start, end in plan_file_chunks(path, chunk_size)
+        ]
+
+    store = get_store()
+    job_id = store.create_job(source, chunks, chunk_size)
+    if _pool is not None:
+        _pool.notify()
+    return store.get_job(job_id, limit=0)
+
+
+def get_job(job_id: str, offset: int = 0, limit: int = 100) -> Optional[Dict[str, Any]]:
+    return get_store().get_job(job_id, offset, limit)
+
+
+if __name__ == "__main__":
+    # Standalone workers and submission:
+    #   python -m scoring.jobs worker [--workers 4]
+    #   python -m scoring.jobs submit profiles.jsonl [--chunk-size 500]
+    #   python -m scoring.jobs status <job_id>
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk credit scoring jobs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker_parser = commands.add_parser("worker", help="Process queued chunks until interrupted")
+    worker_parser.add_argument("--workers", type=int, default=max(1, JOB_WORKERS))
+    submit_parser = commands.add_parser("submit", help="Queue a JSON lines file from JOBS_INPUT_DIR")
+    submit_parser.add_argument("file")
+    submit_parser.add_argument("--chunk-size", type=int)
+    status_parser = commands.add_parser("status", help="Show a job's progress")
+    status_parser.add_argument("job_id")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        start_workers(args.workers)
+        print(f"Job workers running against {get_store().path}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            stop_workers()
+    elif args.command == "submit":
+        print(json.dumps(submit_job(file=args.file, chunk_size=args.chunk_size), indent=2))
+    else:
+        print(json.dumps(get_job(args.job_id, limit=0), indent=2))
@@ -0,0 +1,226 @@
+import csv
+import math
+import os
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+# Mean Earth radius used for haversine distances
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Default location of the local market dataset (name,state,latitude,longitude)
+DEFAULT_MARKETS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "nigerian_markets.csv")
+
+# Grid cell size in degrees (~28km at the equator)
+DEFAULT_CELL_DEGREES = 0.25
+
+# Bulk lookups against datasets up to this many markets use chunked broadcast
+# distance matrices of at most BROADCAST_CHUNK_CELLS entries instead of the grid
+BROADCAST_MAX_MARKETS = 2048
+BROADCAST_CHUNK_CELLS = 1 << 20
+
+
+def haversine_km(lat: np.ndarray, lon: np.ndarray, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Vectorized haversine distance between points, all inputs in radians.
+
+    Inputs broadcast against each other, so passing column vectors for
+    (lat, lon) and row vectors for (lats, lons) yields a full distance matrix.
+
+    Returns:
+        np.ndarray: Distances in kilometres.
+    """
+    dlat = lats - lat
+    dlon = lons - lon
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class MarketIndex:
+    """
+    Uniform lat/lon grid over market locations for nearest-market lookups.
+
+    Each query only computes distances against markets in the grid cells
+    around the point, expanding ring by ring until no unvisited cell can
+    hold a closer market.
+    """
+
+    def __init__(self, names: List[str], latitudes: List[float], longitudes: List[float], cell_degrees: float = DEFAULT_CELL_DEGREES):
+        if not names:
+            raise ValueError("MarketIndex requires at least one market")
+
+        self.names = list(names)
+        self.cell_degrees = cell_degrees
+        self.lat_deg = np.asarray(latitudes, dtype=np.float64)
+        self.lon_deg = np.asarray(longitudes, dtype=np.float64)
+        self.lat_rad = np.radians(self.lat_deg)
+        self.lon_rad = np.radians(self.lon_deg)
+
+        # Bucket market positions by grid cell
+        rows = np.floor(self.lat_deg / cell_degrees).astype(np.int64)
+        cols = np.floor(self.lon_deg / cell_degrees).astype(np.int64)
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        for i, cell in enumerate(zip(rows.tolist(), cols.tolist())):
+            buckets.setdefault(cell, []).append(i)
+        self.cells = {cell: np.asarray(ids, dtype=np.int64) for cell, ids in buckets.items()}
+
+        # Beyond this ring every cell has been visited, so a full scan is exact
+        self.max_ring = int(max(rows.max() - rows.min(), cols.max() - cols.min())) + 1
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _ring_candidates(self, row: int, col: int, ring: int) -> List[np.ndarray]:
+        """Return the market id arrays of cells exactly `ring` cells away from (row, col)."""
+        if ring == 0:
+            ids = self.cells.get((row, col))
+            return [ids] if ids is not None else []
+
+        found = []
+        for c in range(col - ring, col + ring + 1):
+            for r in (row - ring, row + ring):
+                ids = self.cells.get((r, c))
+                if ids is not None:
+                    found.append(ids)
+        for r in range(row - ring + 1, row + ring):
+            for c in (col - ring, col + ring):
+                ids = self.cells.get((r, c))
+                if ids is not None:
+                    found.append(ids)
+        return found
+
+    def nearest(self, latitude: float, longitude: float) -> Tuple[int, float]:
+        """
+        Find the nearest market to a single point.
+
+        Args:
+            latitude (float): Latitude in degrees.
+            longitude (float): Longitude in degrees.
+
+        Returns:
+            Tuple[int, float]: Index of the nearest market and its distance in km.
+        """
+        row = int(math.floor(latitude / self.cell_degrees))
+        col = int(math.floor(longitude / self.cell_degrees))
+        lat = math.radians(latitude)
+        lon = math.radians(longitude)
+
+        best_id, best_km = -1, math.inf
+        for ring in range(self.max_ring + 1):
+            candidates = self._ring_candidates(row, col, ring)
+            if candidates:
+                ids = np.concatenate(candidates) if len(candidates) > 1 else candidates[0]
+                distances = haversine_km(lat, lon, self.lat_rad[ids], self.lon_rad[ids])
+                pos = int(np.argmin(distances))
+                if distances[pos] < best_km:
+                    best_id, best_km = int(ids[pos]), float(distances[pos])
+
+            # Any market in a ring further out is at least this far away
+            widest_lat = min(abs(latitude) + (ring + 1) * self.cell_degrees, 90.0)
+            lower_bound = ring * self.cell_degrees * KM_PER_DEGREE * math.cos(math.radians(widest_lat))
+            if best_id >= 0 and best_km <= lower_bound:
+                return best_id, best_km
+
+        if best_id < 0:
+            distances = haversine_km(lat, lon, self.lat_rad, self.lon_rad)
+            best_id = int(np.argmin(distances))
+            best_km = float(distances[best_id])
+        return best_id, best_km
+
+    def nearest_distances(self, latitudes: List[float], longitudes: List[float]) -> np.ndarray:
+        """
+        Nearest-market distance in km for every point in a batch.
+
+        Small batches are answered with one broadcast haversine matrix over
+        all markets. Larger ones are answered in broadcast chunks when the
+        dataset is small enough, and otherwise go through the grid, one point
+        at a time.
+        """
+        lat = np.asarray(latitudes, dtype=np.float64)
+        lon = np.asarray(longitudes, dtype=np.float64)
+        if lat.size == 0:
+            return np.empty(0, dtype=np.float64)
+
+        if lat.size * len(self) <= 4096 or len(self) <= BROADCAST_MAX_MARKETS:
+            rows = max(1, BROADCAST_CHUNK_CELLS // len(self))
+            lat_rad, lon_rad = np.radians(lat)[:, None], np.radians(lon)[:, None]
+            return np.concatenate([
+                haversine_km(lat_rad[i:i + rows], lon_rad[i:i + rows], self.lat_rad[None, :], self.lon_rad[None, :]).min(axis=1)
+                for i in range(0, lat.size, rows)
+            ])
+
+        return np.fromiter((self.nearest(a, b)[1] for a, b in zip(lat.tolist(), lon.tolist())), dtype=np.float64, count=lat.size)
+
+
+def load_markets(path: str, cell_degrees: float = DEFAULT_CELL_DEGREES) -> MarketIndex:
+    """
+    Build a MarketIndex from a CSV file with name, latitude and longitude columns.
+
+    Args:
+        path (str): Path to the market CSV file.
+        cell_degrees (float): Grid cell size in degrees.
+
+    Returns:
+        MarketIndex: The spatial index over all markets in the file.
+    """
+    names, latitudes, longitudes = [], [], []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                latitudes.append(float(row["latitude"]))
+                longitudes.append(float(row["longitude"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+            names.append(row.get("name", ""))
+    return MarketIndex(names, latitudes, longitudes, cell_degrees=cell_degrees)
+
+
+_market_index: Optional[MarketIndex] = None
+_market_index_loaded = False
+
+
+def get_market_index() -> Optional[MarketIndex]:
+    """
+    Return the process-wide market index, loading it on first use.
+
+    The dataset path can be overridden with the MARKETS_DATA_PATH environment
+    variable. Returns None if the dataset is missing or empty.
+    """
+    global _market_index, _market_index_loaded
+    if not _market_index_loaded:
+        path = os.getenv("MARKETS_DATA_PATH", DEFAULT_MARKETS_PATH)
+        try:
+            _market_index = load_markets(path)
+        except (OSError, ValueError) as e:
+            print(f"Market dataset unavailable ({path}): {e}")
+            _market_index = None
+        _market_index_loaded = True
+    return _market_index
+
+
+def nearest_market_distance(addresses: List[Dict[str, Any]]) -> Optional[float]:
+    """
+    Average nearest-market distance in km over all addresses with coordinates.
+
+    Args:
+        addresses (List[Dict[str, Any]]): Address records with latitude/longitude.
+
+    Returns:
+        Optional[float]: Mean distance in km, or None if no address has
+        coordinates or the market dataset is unavailable.
+    """
+    points = [
+        (address["latitude"], address["longitude"])
+        for address in addresses
+        if address.get("latitude") is not None and address.get("longitude") is not None
+    ]
+    if not points:
+        return None
+
+    index = get_market_index()
+    if index is None:
+        return None
+
+    latitudes, longitudes = zip(*points)
+    return float(index.nearest_distances(latitudes, longitudes).mean())
@@ -0,0 +1,384 @@
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+import credit_score as cs
+from scoring import features as scoring_features
+from scoring import rules as scoring_rules
+from scoring.features import FarmerFeatures
+from scoring.rules import RuleSet
+
+# Compact model file layout:
+#   magic (4 bytes) | header length (uint32, little endian) | JSON header | padding | arrays
+# Each array is stored raw at a 64-byte aligned offset recorded in the header so it can be
+# memory-mapped without copying.
+MODEL_MAGIC = b"FCM1"
+ARRAY_ALIGNMENT = 64
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "credit_model.fcm")
+
+# Default per-request latency budget for ML scoring, in milliseconds
+DEFAULT_LATENCY_BUDGET_MS = float(os.getenv("ML_LATENCY_BUDGET_MS", "50"))
+
+# Seconds before a model file that failed to load is tried again (sooner if the file changes)
+MODEL_RETRY_SECONDS = float(os.getenv("ML_MODEL_RETRY_SECONDS", "30"))
+
+# Shadow comparisons run on their own pool so they never hold up budgeted scoring;
+# comparisons submitted while ML_SHADOW_QUEUE are already pending are dropped
+SHADOW_WORKERS = int(os.getenv("ML_SHADOW_WORKERS", "1"))
+SHADOW_QUEUE = int(os.getenv("ML_SHADOW_QUEUE", "32"))
+
+# Credit score range the predicted repayment probability is mapped onto
+MIN_SCORE = 300
+MAX_SCORE = 850
+
+
+class ModelUnavailableError(RuntimeError):
+    """Raised when no ML model file can be loaded."""
+
+
+def model_inputs(features: FarmerFeatures, rules: Optional[RuleSet] = None) -> Dict[str, float]:
+    """
+    Turn a farmer's extracted features into the named numeric inputs the model uses.
+
+    Args:
+        features (FarmerFeatures): Features extracted from the farmer profile
+        rules (RuleSet, optional): Rules used to encode education and zone risk
+
+    Returns:
+        Dict[str, float]: Feature name to numeric value
+    """
+    rules = rules or scoring_rules.get_rules()
+    zones = rules.lookups["geopolitical_zone"]
+    zone_points = [zones(zone) for zone in features.geopolitical_zones if zone in zones]
+
+    return {
+        "age": float(features.age or 0),
+        "experience_years": float(features.experience_years),
+        "education_points": float(rules.keyword("education", features.highest_education)),
+        "has_next_of_kin": float(features.has_next_of_kin),
+        "wallet_balance": float(features.wallet_balance or 0),
+        "bvn_verified": float(features.bvn_verified),
+        "has_alternative_income": float(features.has_alternative_income),
+        "transaction_count": float(features.transaction_count),
+        "avg_transaction_amount": float(features.avg_transaction_amount or 0.0),
+        "repayment_count": float(features.repayment_count),
+        "on_time_ratio": features.on_time_ratio if features.repayment_count else 1.0,
+        "avg_days_late": features.avg_days_late if features.repayment_count else 0.0,
+        "existing_loan_amount": float(features.existing_loan_amount or 0),
+        "total_farm_size": float(features.total_farm_size),
+        "crop_diversity": float(features.crop_diversity),
+        "farming_experience": float(features.farming_experience),
+        "total_harvests": float(features.total_harvests),
+        "avg_expected_yield": float(features.avg_expected_yield or 0.0),
+        "avg_profit_margin": float(features.avg_profit_margin or 0.0),
+        "zone_risk_points": sum(zone_points) / len(zone_points) if zone_points else float(zones.default),
+        "market_distance_km": features.market_distance_km if features.market_distance_km is not None else -1.0,
+    }
+
+
+def save_model(path: str, model_type: str, feature_names: List[str], arrays: Dict[str, np.ndarray],
+               params: Optional[Dict[str, Any]] = None, version: str = "1") -> None:
+    """
+    Write a model in the compact memory-mappable format.
+
+    Args:
+        path (str): Output file path.
+        model_type (str): 'logistic' or 'gbt'.
+        feature_names (List[str]): Ordered feature names the model expects.
+        arrays (Dict[str, np.ndarray]): Named parameter arrays.
+        params (Dict[str, Any], optional): Scalar parameters (e.g. bias, base_score, max_depth).
+        version (str): Model version label reported with predictions.
+    """
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    layout, offset = {}, 0
+    for name, a in arrays.items():
+        offset = -(-offset // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+        layout[name] = {"dtype": a.dtype.str, "shape": list(a.shape), "offset": offset}
+        offset += a.nbytes
+
+    header = {
+        "model_type": model_type,
+        "version": version,
+        "feature_names": list(feature_names),
+        "params": params or {},
+        "arrays": layout,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = -(-(8 + len(header_bytes)) // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+    with open(path, "wb") as f:
+        f.write(MODEL_MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for name, a in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(a.tobytes())
+
+
+class CreditModel:
+    """A loaded, memory-mapped scoring model with batched prediction."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:4] != MODEL_MAGIC:
+            raise ValueError(f"{path} is not a FarmCredit model file")
+        (header_len,) = struct.unpack("<I", self._mmap[4:8])
+        header = json.loads(self._mmap[8:8 + header_len].decode("utf-8"))
+        data_start = -(-(8 + header_len) // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+        self.model_type = header["model_type"]
+        self.version = header.get("version", "1")
+        self.feature_names = header["feature_names"]
+        self.params = header.get("params", {})
+        self.arrays = {
+            name: np.frombuffer(self._mmap, dtype=np.dtype(spec["dtype"]),
+                                count=int(np.prod(spec["shape"])), offset=data_start + spec["offset"]).reshape(spec["shape"])
+            for name, spec in header["arrays"].items()
+        }
+
+        if self.model_type not in ("logistic", "gbt"):
+            raise ValueError(f"Unsupported model type: {self.model_type}")
+
+    def feature_matrix(self, profiles: List[Dict[str, float]]) -> np.ndarray:
+        """Arrange named feature dictionaries into the column order the model expects."""
+        return np.array([[p.get(name, 0.0) for name in self.feature_names] for p in profiles], dtype=np.float64).reshape(len(profiles), len(self.feature_names))
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Return the predicted repayment probability for each row of X."""
+        if self.model_type == "logistic":
+            a = self.arrays
+            z = ((X - a["mean"]) / a["scale"]) @ a["weights"] + self.params.get("bias", 0.0)
+        else:
+            z = self._gbt_margin(X)
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def _gbt_margin(self, X: np.ndarray) -> np.ndarray:
+        a = self.arrays
+        feature, threshold = a["feature"], a["threshold"]
+        left, right, value = a["left"], a["right"], a["value"]
+        rows = np.arange(X.shape[0])
+        margin = np.full(X.shape[0], float(self.params.get("base_score", 0.0)))
+        max_depth = int(self.params.get("max_depth", 32))
+
+        # Walk all samples down each tree together, one level per step
+        for root in a["roots"]:
+            node = np.full(X.shape[0], root, dtype=np.int64)
+            for _ in range(max_depth):
+                feat = feature[node]
+                is_leaf = feat < 0
+                if is_leaf.all():
+                    break
+                go_left = X[rows, np.where(is_leaf, 0, feat)] <= threshold[node]
+                node = np.where(is_leaf, node, np.where(go_left, left[node], right[node]))
+            margin += value[node]
+        return margin
+
+    def close(self):
+        self.arrays = {}
+        self._mmap.close()
+        self._file.close()
+
+
+_model: Optional[CreditModel] = None
+# Last failed load: error message, path, file modification time and when to retry
+_model_failure: Optional[Dict[str, Any]] = None
+_model_lock = threading.Lock()
+
+
+def _file_mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _should_load(path: str) -> bool:
+    failure = _model_failure
+    return (failure is None or failure["path"] != path or time.monotonic() >= failure["retry_at"]
+            or _file_mtime(path) != failure["mtime"])
+
+
+def get_model() -> CreditModel:
+    """
+    Return this worker's model, loading it on first use.
+
+    The file path is taken from ML_MODEL_PATH, defaulting to data/credit_model.fcm. A
+    failed load is retried after ML_MODEL_RETRY_SECONDS, or as soon as the file appears
+    or changes, so a model deployed after startup (or after the server preloaded without
+    one) is picked up without a restart.
+    """
+    global _model, _model_failure
+    if _model is not None:
+        return _model
+
+    path = os.getenv("ML_MODEL_PATH", DEFAULT_MODEL_PATH)
+    with _model_lock:
+        if _model is None and _should_load(path):
+            mtime = _file_mtime(path)
+            try:
+                _model = CreditModel(path)
+                _model_failure = None
+                print(f"Loaded ML credit model {_model.version} ({_model.model_type}) from {path}")
+            except (OSError, ValueError, KeyError) as e:
+                _model_failure = {
+                    "error": f"{path}: {e}",
+                    "path": path,
+                    "mtime": mtime,
+                    "retry_at": time.monotonic() + MODEL_RETRY_SECONDS,
+                }
+                print(f"ML credit model unavailable: {_model_failure['error']}")
+    if _model is None:
+        raise ModelUnavailableError(f"ML credit model unavailable: {_model_failure['error']}")
+    return _model
+
+
+def probability_to_score(probability: float) -> int:
+    """Map a repayment probability onto the 300-850 credit score range."""
+    return int(round(MIN_SCORE + probability * (MAX_SCORE - MIN_SCORE)))
+
+
+def predict_credit_scores(farmers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Score a batch of farmer profiles with the ML model.
+
+    Args:
+        farmers (List[Dict[str, Any]]): Farmer data dictionaries
+
+    Returns:
+        List[Dict[str, Any]]: One result per farmer with score, rating and probability
+    """
+    model = get_model()
+    rules = scoring_rules.get_rules()
+    inputs = [model_inputs(scoring_features.get_features(f), rules) for f in farmers]
+    probabilities = model.predict_proba(model.feature_matrix(inputs))
+
+    results = []
+    for probability in probabilities.tolist():
+        if math.isnan(probability):
+            raise ValueError("ML model produced an invalid prediction")
+        score = probability_to_score(probability)
+        results.append({
+            "credit_score": score,
+            "credit_rating": cs.get_credit_rating(score, rules),
+            "repayment_probability": probability,
+            "engine": "ml",
+            "model_version": model.version,
+        })
+    return results
+
+
+def predict_credit_score(farmer_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Score a single farmer profile with the ML model."""
+    return predict_credit_scores([farmer_data])[0]
+
+
+# Background pool for budgeted inference
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("ML_WORKERS", "2")), thread_name_prefix="ml-score")
+
+# Background pool for shadow comparisons, with a slot per pending comparison
+_shadow_executor = ThreadPoolExecutor(max_workers=SHADOW_WORKERS, thread_name_prefix="ml-shadow")
+_shadow_slots = threading.BoundedSemaphore(SHADOW_QUEUE)
+
+_shadow_lock = threading.Lock()
+_shadow_stats = {
+    "count": 0,
+    "errors": 0,
+    "dropped": 0,
+    "rating_agreements": 0,
+    "abs_delta_sum": 0.0,
+    "latency_ms_sum": 0.0,
+}
+
+
+def score_with_budget(farmer_data: Dict[str, Any], budget_ms: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Score with the ML model, falling back to the heuristic if the budget is exceeded.
+
+    Args:
+        farmer_data (Dict[str, Any]): Farmer data dictionary
+        budget_ms (float, optional): Latency budget in milliseconds (default: ML_LATENCY_BUDGET_MS)
+
+    Returns:
+        Dict[str, Any]: The ML result, or the heuristic result with a fallback_reason
+    """
+    budget_ms = DEFAULT_LATENCY_BUDGET_MS if budget_ms is None else budget_ms
+    future = _executor.submit(predict_credit_score, farmer_data)
+    try:
+        return future.result(timeout=budget_ms / 1000)
+    except FutureTimeoutError:
+        reason = f"ML scoring exceeded {budget_ms:g}ms budget"
+    except ModelUnavailableError as e:
+        reason = str(e)
+    except Exception as e:
+        reason = f"ML scoring failed: {e}"
+
+    result = cs.calculate_credit_score(farmer_data)
+    result["engine"] = "heuristic"
+    result["fallback_reason"] = reason
+    return result
+
+
+def _run_shadow(farmer_data: Dict[str, Any], primary: Dict[str, Any], primary_engine: str) -> None:
+    start = time.perf_counter()
+    try:
+        if primary_engine == "ml":
+            shadow = cs.calculate_credit_score(farmer_data)
+        else:
+            shadow = predict_credit_score(farmer_data)
+    except Exception:
+        with _shadow_lock:
+            _shadow_stats["errors"] += 1
+        return
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    with _shadow_lock:
+        _shadow_stats["count"] += 1
+        _shadow_stats["abs_delta_sum"] += abs(shadow["credit_score"] - primary["credit_score"])
+        _shadow_stats["latency_ms_sum"] += elapsed_ms
+        if shadow["credit_rating"] == primary["credit_rating"]:
+            _shadow_stats["rating_agreements"] += 1
+
+
+def submit_shadow(farmer_data: Dict[str, Any], primary: Dict[str, Any], primary_engine: str = "heuristic") -> None:
+    """
+    Score with the other engine in the background and record how it compares, unless
+    ML_SHADOW_QUEUE comparisons are already pending, in which case this one is dropped.
+    """
+    if not _shadow_slots.acquire(blocking=False):
+        with _shadow_lock:
+            _shadow_stats["dropped"] += 1
+        return
+    try:
+        future = _shadow_executor.submit(_run_shadow, farmer_data, primary, primary_engine)
+    except RuntimeError:
+        _shadow_slots.release()
+        raise
+    future.add_done_callback(lambda _: _shadow_slots.release())
+
+
+def get_shadow_stats() -> Dict[str, Any]:
+    """Return aggregate agreement statistics for shadow scoring."""
+    with _shadow_lock:
+        stats = dict(_shadow_stats)
+    count = stats["count"]
+    return {
+        "count": count,
+        "errors": stats["errors"],
+        "dropped": stats["dropped"],
+        "rating_agreement": stats["rating_agreements"] / count if count else None,
+        "mean_abs_score_delta": stats["abs_delta_sum"] / count if count else None,
+        "mean_latency_ms": stats["latency_ms_sum"] / count if count else None,
+        "model_loaded": _model is not None,
+    }
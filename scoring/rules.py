@@ -0,0 +1,266 @@
+import bisect
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+# Default location of the declarative scoring rule table
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "scoring_rules.json")
+
+# Minimum seconds between file modification checks for hot-reload
+RELOAD_CHECK_INTERVAL = 2.0
+
+
+class BandTable:
+    """
+    A step function compiled from a ladder of thresholds.
+
+    Each step is either {"gte": x} or {"gt": x}; strict thresholds are moved
+    to the next representable float so every breakpoint is inclusive and a
+    single bisect finds the band a value falls in.
+    """
+
+    def __init__(self, name: str, breakpoints: List[float], points: List[Any], default: Any,
+                 conditions: Optional[List[Tuple[str, float]]] = None):
+        self.name = name
+        self.breakpoints = breakpoints
+        self.points = points
+        self.default = default
+        # The thresholds as written, e.g. (">", 18), for describing bands
+        self.conditions = conditions or [(">=", b) for b in breakpoints]
+        # Per band index (-1 for the default): its description and the nearest better band
+        self.descriptions = {i: self._describe(i) for i in range(-1, len(points))}
+        self.better = {i: self._better(i) for i in range(-1, len(points))}
+        self.max_points = max([default] + list(points))
+
+    def band(self, value: float) -> int:
+        """Return the band index for a value, -1 meaning below the first breakpoint."""
+        return bisect.bisect_right(self.breakpoints, value) - 1
+
+    def __call__(self, value: float) -> Any:
+        i = self.band(value)
+        return self.points[i] if i >= 0 else self.default
+
+    def points_at(self, i: int) -> Any:
+        return self.points[i] if i >= 0 else self.default
+
+    def describe(self, i: int) -> str:
+        """The range of values in band i, e.g. ">= 1000 and < 10000"."""
+        return self.descriptions[i]
+
+    def better_band(self, value: float) -> Optional[int]:
+        """The nearest band to a value's band that awards more points, or None if none does."""
+        return self.better[self.band(value)]
+
+    def _describe(self, i: int) -> str:
+        parts = []
+        if i >= 0:
+            parts.append(f"{self.conditions[i][0]} {self.conditions[i][1]:g}")
+        if i + 1 < len(self.conditions):
+            op, threshold = self.conditions[i + 1]
+            parts.append(f"{'<' if op == '>=' else '<='} {threshold:g}")
+        return " and ".join(parts)
+
+    def _better(self, current: int) -> Optional[int]:
+        points = self.points_at(current)
+        better = [i for i in range(-1, len(self.points)) if self.points_at(i) > points]
+        if not better:
+            return None
+        return min(better, key=lambda i: (abs(i - current), -i))
+
+    def vectorized(self, values: np.ndarray) -> np.ndarray:
+        """Points for every value in an array, as __call__ would give them (values must not be NaN)."""
+        # Index -1 (below the first breakpoint) picks the default appended at the end
+        points = np.asarray(list(self.points) + [self.default])
+        return points[np.searchsorted(self.breakpoints, values, side="right") - 1]
+
+
+class KeywordTable:
+    """An ordered list of keyword groups; the first group with a substring match wins."""
+
+    def __init__(self, name: str, rules: List[Tuple[Tuple[str, ...], Any]], default: Any):
+        self.name = name
+        self.rules = rules
+        self.default = default
+
+    def __call__(self, text: str) -> Any:
+        text = (text or "").lower()
+        for keywords, points in self.rules:
+            for keyword in keywords:
+                if keyword in text:
+                    return points
+        return self.default
+
+
+class LookupTable:
+    """A case-insensitive exact-match lookup with a default."""
+
+    def __init__(self, name: str, values: Dict[str, Any], default: Any):
+        self.name = name
+        self.values = values
+        self.default = default
+
+    def __contains__(self, key: str) -> bool:
+        return (key or "").lower() in self.values
+
+    def __call__(self, key: str) -> Any:
+        return self.values.get((key or "").lower(), self.default)
+
+
+class RuleSet:
+    """A compiled, immutable version of the scoring rule table."""
+
+    def __init__(self, version: str, bands: Dict[str, BandTable], lookups: Dict[str, LookupTable],
+                 keywords: Dict[str, KeywordTable], awards: Dict[str, Any], fingerprint: str = ""):
+        self.version = version
+        # Hash of the source table, so cached scores are never reused across rule edits
+        self.fingerprint = fingerprint
+        self.bands = bands
+        self.lookups = lookups
+        self.keywords = keywords
+        self.awards = awards
+
+    def band(self, name: str, value: float) -> Any:
+        return self.bands[name](value)
+
+    def lookup(self, name: str, key: str) -> Any:
+        return self.lookups[name](key)
+
+    def keyword(self, name: str, text: str) -> Any:
+        return self.keywords[name](text)
+
+    def award(self, name: str) -> Any:
+        return self.awards[name]
+
+
+def _compile_band(name: str, spec: Dict[str, Any]) -> BandTable:
+    thresholds = []
+    for step in spec.get("steps", []):
+        if "gte" in step:
+            threshold, condition = float(step["gte"]), (">=", float(step["gte"]))
+        elif "gt" in step:
+            threshold, condition = math.nextafter(float(step["gt"]), math.inf), (">", float(step["gt"]))
+        else:
+            raise ValueError(f"Band '{name}' step needs a 'gte' or 'gt' threshold: {step}")
+        thresholds.append((threshold, step["points"], condition))
+
+    thresholds.sort(key=lambda t: t[0])
+    breakpoints = [t for t, _, _ in thresholds]
+    if len(set(breakpoints)) != len(breakpoints):
+        raise ValueError(f"Band '{name}' has duplicate thresholds")
+    return BandTable(name, breakpoints, [p for _, p, _ in thresholds], spec.get("default", 0),
+                     [c for _, _, c in thresholds])
+
+
+def compile_rules(spec: Dict[str, Any]) -> RuleSet:
+    """
+    Compile a declarative rule table into sorted breakpoint arrays and lookup tables.
+
+    Args:
+        spec (Dict[str, Any]): Parsed rule table with 'bands', 'lookups', 'keywords' and 'awards'.
+
+    Returns:
+        RuleSet: The compiled rules.
+    """
+    bands = {name: _compile_band(name, band) for name, band in spec.get("bands", {}).items()}
+    lookups = {
+        name: LookupTable(name, {k.lower(): v for k, v in table.get("values", {}).items()}, table.get("default"))
+        for name, table in spec.get("lookups", {}).items()
+    }
+    keywords = {
+        name: KeywordTable(
+            name,
+            [(tuple(k.lower() for k in rule["contains"]), rule["points"]) for rule in table.get("rules", [])],
+            table.get("default"),
+        )
+        for name, table in spec.get("keywords", {}).items()
+    }
+    fingerprint = hashlib.blake2b(json.dumps(spec, sort_keys=True, default=str).encode("utf-8"), digest_size=8).hexdigest()
+    return RuleSet(str(spec.get("version", "unversioned")), bands, lookups, keywords, dict(spec.get("awards", {})),
+                   fingerprint=fingerprint)
+
+
+def load_rules(path: str) -> RuleSet:
+    """
+    Load and compile a rule table from a JSON or YAML file.
+
+    Args:
+        path (str): Path to a .json, .yaml or .yml rule file.
+
+    Returns:
+        RuleSet: The compiled rules.
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml  # Optional dependency, only needed for YAML rule files
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    return compile_rules(spec)
+
+
+class _RulesHolder:
+    """Holds the active rule set and swaps it when the source file changes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rules: Optional[RuleSet] = None
+        self.path: Optional[str] = None
+        self.mtime = 0.0
+        self.checked_at = 0.0
+
+    def get(self) -> RuleSet:
+        now = time.monotonic()
+        if self.rules is not None and now - self.checked_at < RELOAD_CHECK_INTERVAL:
+            return self.rules
+
+        with self.lock:
+            path = os.getenv("SCORING_RULES_PATH", DEFAULT_RULES_PATH)
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                mtime = None
+            self.checked_at = now
+
+            if self.rules is None or path != self.path or (mtime is not None and mtime != self.mtime):
+                try:
+                    rules = load_rules(path)
+                except (OSError, ValueError, KeyError) as e:
+                    if self.rules is None:
+                        raise
+                    # Keep serving the last good version if an edit is broken
+                    print(f"Failed to reload scoring rules from {path}: {e}")
+                else:
+                    if self.rules is not None:
+                        print(f"Scoring rules reloaded: {self.rules.version} -> {rules.version}")
+                    self.rules, self.path, self.mtime = rules, path, mtime or 0.0
+            return self.rules
+
+    def reset(self):
+        with self.lock:
+            self.rules = None
+            self.checked_at = 0.0
+
+
+_holder = _RulesHolder()
+
+
+def get_rules() -> RuleSet:
+    """
+    Return the active rule set, reloading it if the rule file has changed.
+
+    The file path is taken from SCORING_RULES_PATH, defaulting to
+    data/scoring_rules.json.
+    """
+    return _holder.get()
+
+
+def reload_rules() -> RuleSet:
+    """Force the rule file to be re-read on the next access and return the new rules."""
+    _holder.reset()
+    return _holder.get()
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Cache shared by all worker processes on a host, kept in a local SQLite file
+# (in /dev/shm when available, so it stays in memory). Workers keep their own
+# in-process caches in front of it; this only saves work one worker already did
+# for another. Off by default; the gunicorn profile turns it on.
+SHARED_CACHE = os.getenv("SHARED_CACHE", "false").lower() == "true"
+SHARED_CACHE_PATH = os.getenv(
+    "SHARED_CACHE_PATH",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "farmcredit-cache.sqlite")
+)
+
+# Entries kept per namespace; older ones are trimmed every PRUNE_INTERVAL writes
+SHARED_CACHE_MAX_ENTRIES = int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "50000"))
+PRUNE_INTERVAL = 1000
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def _connection() -> sqlite3.Connection:
+    # One connection per thread and process; connections must not cross a fork
+    connection = getattr(_local, "connection", None)
+    if connection is not None and _local.pid == os.getpid():
+        return connection
+
+    connection = sqlite3.connect(SHARED_CACHE_PATH, timeout=1.0, isolation_level=None, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=OFF")
+    with _schema_lock:
+        if (os.getpid(), SHARED_CACHE_PATH) not in _schema_ready:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+            _schema_ready.add((os.getpid(), SHARED_CACHE_PATH))
+    _local.connection, _local.pid = connection, os.getpid()
+    return connection
+
+
+def _hash_key(key: str) -> str:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class SharedCache:
+    """
+    A namespace in the cross-worker cache. Values are stored as JSON.
+
+    Lookups and writes never raise: if the store is unavailable or locked the
+    cache reports a miss and the caller recomputes.
+    """
+
+    def __init__(self, namespace: str, ttl_seconds: float, max_entries: int = SHARED_CACHE_MAX_ENTRIES):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return SHARED_CACHE
+
+    def _count(self, name: str) -> None:
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, key: str) -> Optional[Any]:
+        if not SHARED_CACHE:
+            return None
+        try:
+            row = _connection().execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self.namespace, _hash_key(key), time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._count("errors")
+            print(f"Shared cache read failed ({self.namespace}): {e}")
+            return None
+        self._count("hits" if row else "misses")
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, value: Any) -> None:
+        if not SHARED_CACHE:
+            return
+        try:
+            connection = _connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, _hash_key(key), json.dumps(value), time.time() + self.ttl_seconds)
+            )
+            with self.lock:
+                self.writes += 1
+                prune = self.writes % PRUNE_INTERVAL == 0
+            if prune:
+                self._prune(connection)
+        except sqlite3.Error as e:
+            self._count("errors")
+            print(f"Shared cache write failed ({self.namespace}): {e}")
+
+    def _prune(self, connection: sqlite3.Connection) -> None:
+        connection.execute("DELETE FROM cache WHERE namespace = ? AND expires_at <= ?", (self.namespace, time.time()))
+        connection.execute(
+            "DELETE FROM cache WHERE namespace = ? AND rowid IN ("
+            " SELECT rowid FROM cache WHERE namespace = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_entries)
+        )
+
+    def clear(self) -> None:
+        if not SHARED_CACHE:
+            return
+        try:
+            _connection().execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+        except sqlite3.Error as e:
+            print(f"Shared cache clear failed ({self.namespace}): {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "errors": self.errors,
+                "hit_rate": self.hits / lookups if lookups else None,
+            }
+
+
+_caches: Dict[str, SharedCache] = {}
+
+
+def get_cache(namespace: str, ttl_seconds: float, max_entries: int = SHARED_CACHE_MAX_ENTRIES) -> SharedCache:
+    """Returns the process-wide handle for a cache namespace."""
+    with _schema_lock:
+        if namespace not in _caches:
+            _caches[namespace] = SharedCache(namespace, ttl_seconds, max_entries)
+        return _caches[namespace]
+
+
+def get_stats() -> Dict[str, Any]:
+    return {
+        "enabled": SHARED_CACHE,
+        "path": SHARED_CACHE_PATH if SHARED_CACHE else None,
+        "worker_pid": os.getpid(),
+        "namespaces": {name: cache.stats() for name, cache in _caches.items()},
+    }
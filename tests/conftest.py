@@ -0,0 +1,152 @@
+import datetime
+import json
+import os
+import random
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The FAQ and conversation pipelines run against the offline stand-ins, never AWS
+os.environ.setdefault("RAG_BACKEND", "stub")
+
+SAMPLE_FARMER_PATH = os.path.join(ROOT, "data", "sample_farmer.json")
+
+EDUCATION = ["University", "Polytechnic", "Secondary", "Primary", "None", ""]
+ZONES = ["South West", "South East", "South South", "North Central", "North East", "North West"]
+CROPS = ["Maize", "Cassava", "Rice", "Yam", "Sorghum", "Cocoa"]
+
+
+def _iso(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def make_profile(n, rng, now=None):
+    """
+    A consistent request profile: every child row links to the farmer (or its farm,
+    application or contract), with dates spread around repayment due dates and the
+    90-day transaction window.
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    farmer_id = f"farmer-{n}"
+
+    def days_ago(low, high):
+        return now - datetime.timedelta(days=rng.randint(low, high))
+
+    addresses = [{
+        "id": f"{farmer_id}-address-{i}",
+        "geopolitical_zone": rng.choice(ZONES),
+        "latitude": round(rng.uniform(4.3, 13.8), 4),
+        "longitude": round(rng.uniform(2.7, 14.6), 4),
+    } for i in range(rng.randint(0, 3))]
+
+    farms, production = [], []
+    for i in range(rng.randint(0, 3)):
+        farm_id = f"{farmer_id}-farm-{i}"
+        farms.append({
+            "id": farm_id,
+            "farmer_id": farmer_id,
+            "size": round(rng.uniform(0.2, 30), 2),
+            "start_date": _iso(days_ago(100, 7000)),
+            "number_of_harvests": rng.randint(0, 20),
+            "address_id": rng.choice([a["id"] for a in addresses] + [None]) if addresses else None,
+        })
+        production += [{
+            "id": f"{farm_id}-production-{j}",
+            "farm_id": farm_id,
+            "type": rng.choice(CROPS),
+            "expected_yield": rng.randint(0, 8000),
+            "expected_unit_profit": round(rng.uniform(-2, 15), 2),
+        } for j in range(rng.randint(0, 3))]
+
+    applications, contracts, repayments = [], [], []
+    for i in range(rng.randint(0, 3)):
+        application_id = f"{farmer_id}-application-{i}"
+        created = days_ago(30, 2000)
+        applications.append({
+            "id": application_id,
+            "farmer_id": farmer_id,
+            "amount_requested": rng.randint(1000, 500000),
+            "existing_loans": rng.random() < 0.3,
+            "total_existing_loan_amount": rng.choice([0, rng.randint(1000, 200000)]),
+            "status": rng.choice(["approved", "approved", "pending", "rejected"]),
+            "created_at": _iso(created),
+        })
+        if rng.random() < 0.7:
+            contract_id = f"{farmer_id}-contract-{i}"
+            contracts.append({
+                "id": contract_id,
+                "loan_application_id": application_id,
+                "amount_disbursed": rng.randint(1000, 500000),
+                "interest_rate": rng.choice([5, 10, 15]),
+                "created_at": _iso(created),
+            })
+            for j in range(rng.randint(0, 4)):
+                due = created + datetime.timedelta(days=30 * (j + 1))
+                repayments.append({
+                    "id": f"{contract_id}-repayment-{j}",
+                    "loan_contract_id": contract_id,
+                    "periodic_repayment_amount": rng.randint(100, 50000),
+                    "interest_amount": rng.randint(0, 5000),
+                    "created_at": _iso(due),
+                    "date_paid": _iso(due + datetime.timedelta(days=rng.randint(-10, 40))),
+                    "due_date": _iso(due),
+                })
+
+    transactions = [{
+        "id": f"{farmer_id}-transaction-{i}",
+        "farmer_id": farmer_id,
+        "transaction_data": {"amount": float(rng.randint(-5000, 50000))},
+        "created_at": _iso(days_ago(0, 400)),
+    } for i in range(rng.randint(0, 5))]
+
+    return {
+        "farmers": {
+            "id": farmer_id,
+            "age": rng.randint(18, 70),
+            "created_at": _iso(days_ago(10, 4000)),
+            "highest_education": rng.choice(EDUCATION),
+            "gender": rng.choice(["Male", "Female"]),
+            "mobile_wallet_balance": float(rng.randint(0, 300000)),
+            "bvn": rng.choice(["12345678901", ""]),
+            "other_sources_of_income": rng.choice(["Trading", ""]),
+            "address_id": rng.choice([a["id"] for a in addresses]) if addresses and rng.random() < 0.7 else None,
+        },
+        "farmer_next_of_kin": [
+            {"id": f"{farmer_id}-kin-{i}", "farmer_id": farmer_id, "full_name": "Jane Doe"}
+            for i in range(rng.randint(0, 2))
+        ],
+        "farms": farms,
+        "farm_production": production,
+        "address": addresses,
+        "loan_application": applications,
+        "loan_contract": contracts,
+        "loan_repayments": repayments,
+        "transaction_history": transactions,
+    }
+
+
+@pytest.fixture
+def sample_farmer():
+    with open(SAMPLE_FARMER_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def profiles():
+    rng = random.Random(7)
+    return [make_profile(n, rng) for n in range(200)]
+
+
+@pytest.fixture
+def api_score():
+    """Scores a profile the way POST /calculate_credit_score does, bypassing the score cache."""
+    import credit_score
+    from models.request import CreditScoreRequestModel
+
+    def score(profile):
+        return credit_score.calculate_credit_score(CreditScoreRequestModel(**profile).model_dump())
+
+    return score
@@ -0,0 +1,64 @@
+import json
+import os
+
+import pytest
+
+from rag import answer_index
+from rag.answer_index import AnswerIndex
+from rag.clients import EMBEDDING_DIMENSIONS
+
+CHUNKS = [
+    {"question": "How is my credit score calculated?", "answer": "From your farm, loan and payment history."},
+    {"question": "Who is eligible to register?", "answer": "Youth farmers aged 18-35."},
+    {"question": "How do I repay a loan?", "answer": "From your mobile wallet."},
+]
+
+
+def embed(text):
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for i, char in enumerate(text):
+        vector[(i * 31 + ord(char)) % EMBEDDING_DIMENSIONS] += 1.0
+    return vector
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """A FAQ corpus with an ingest-time index path, and a runtime cache directory of its own."""
+    corpus_path = tmp_path / "faq_chunks.json"
+    corpus_path.write_text(json.dumps(CHUNKS))
+    monkeypatch.setattr(answer_index, "ANSWER_INDEX_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(answer_index, "_embedder", lambda: (embed, "test-model"))
+    return str(corpus_path), str(tmp_path / "data" / "faq_answer_index.npz")
+
+
+def test_save_leaves_no_partial_file(tmp_path):
+    path = str(tmp_path / "index.npz")
+    index = AnswerIndex.build(CHUNKS, embed, "test-model")
+    index.save(path)
+    index.save(path)
+    assert os.listdir(tmp_path) == ["index.npz"]
+    loaded = AnswerIndex.load(path, CHUNKS, "test-model")
+    assert loaded is not None and loaded.match_exact("who is eligible to register") == 1
+
+
+def test_runtime_build_skips_corrupt_file_and_writes_to_cache_dir(corpus, tmp_path):
+    corpus_path, index_path = corpus
+    os.makedirs(os.path.dirname(index_path))
+    with open(index_path, "wb") as f:
+        f.write(b"PK\x03\x04 truncated")
+
+    source = answer_index._IndexSource(corpus_path, index_path)
+    assert source.get().match_exact("How do I repay a loan") == 2
+    source.building.join(10)
+    assert source.index.embeddings is not None
+
+    # The ingest-time file is left alone; the built index goes to the cache directory
+    with open(index_path, "rb") as f:
+        assert f.read() == b"PK\x03\x04 truncated"
+    cache_path = source._cache_path()
+    assert os.path.dirname(cache_path) == str(tmp_path / "cache")
+
+    # Another worker (or a restart) loads it instead of embedding the questions again
+    fresh = answer_index._IndexSource(corpus_path, index_path)
+    fresh.get()
+    assert fresh.building is None and fresh.index.embeddings is not None
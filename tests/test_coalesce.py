@@ -0,0 +1,63 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from rag import querying
+from rag.answers import ERROR_MESSAGE, TIMEOUT_MESSAGE
+from rag.coalesce import SingleFlight
+from rag.deadline import Deadline, DeadlineExceeded
+
+DEADLINE_MS = 3000
+
+
+def run_concurrently(queries):
+    """Sends the queries through rag_pipeline at once; returns (answers, seconds)."""
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+        answers = list(pool.map(lambda query: querying.rag_pipeline(query, deadline=Deadline(DEADLINE_MS)), queries))
+    return answers, time.monotonic() - started
+
+
+def test_distinct_concurrent_queries_do_not_wait_for_each_other():
+    # Each query leads its own shared query call, which leads its own shared embedding call
+    queries = [f"How do I apply for a {uuid.uuid4().hex} loan?" for _ in range(8)]
+    answers, seconds = run_concurrently(queries)
+    assert not {TIMEOUT_MESSAGE, ERROR_MESSAGE} & set(answers)
+    assert seconds < DEADLINE_MS / 1000 / 2
+
+
+def test_identical_concurrent_queries_share_one_call(monkeypatch):
+    calls = []
+    answer_query = querying.answer_query
+
+    def slow_answer_query(query, deadline=None, tenant=None):
+        calls.append(query)
+        time.sleep(0.2)  # Long enough for every caller to join the call in flight
+        return answer_query(query, deadline=deadline, tenant=tenant)
+
+    monkeypatch.setattr(querying, "answer_query", slow_answer_query)
+    query = f"What documents do I need for a {uuid.uuid4().hex} loan?"
+    answers, _ = run_concurrently([query] * 8)
+    assert len(calls) == 1
+    assert len(set(answers)) == 1 and answers[0] not in (TIMEOUT_MESSAGE, ERROR_MESSAGE)
+
+
+def test_follower_stops_waiting_at_its_own_deadline():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do_with_deadline, args=("key", lambda deadline: release.wait(5)))
+    leader.start()
+    while not flight.calls:
+        time.sleep(0.01)
+
+    started = time.monotonic()
+    try:
+        flight.do_with_deadline("key", lambda deadline: None, Deadline(50))
+        raise AssertionError("The follower should have timed out")
+    except DeadlineExceeded:
+        pass
+    assert time.monotonic() - started < 1
+    release.set()
+    leader.join(5)
+    assert flight.get_stats()["timeouts"] == 1
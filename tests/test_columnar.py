@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import pyarrow.parquet as pq
+
+from scoring import columnar
+
+COMPONENTS = ("personal_demographic", "financial_history", "loan_history", "agricultural_factors", "geographical")
+
+
+def rescore(profiles, tmp_path, batch_rows=64):
+    columnar.export_snapshot(profiles, str(tmp_path / "snapshot"))
+    columnar.rescore_snapshot(str(tmp_path / "snapshot"), str(tmp_path / "scores.parquet"), batch_rows=batch_rows)
+    return {row["farmer_id"]: row for row in pq.read_table(tmp_path / "scores.parquet").to_pylist()}
+
+
+def test_rescoring_matches_api(profiles, api_score, tmp_path):
+    results = rescore(profiles, tmp_path)
+    assert len(results) == len(profiles)
+    for profile in profiles:
+        result, expected = results[profile["farmers"]["id"]], api_score(profile)
+        assert result["credit_score"] == expected["credit_score"]
+        assert result["credit_rating"] == expected["credit_rating"]
+        for component in COMPONENTS:
+            assert result[component] == pytest.approx(expected["component_scores"][component])
+        assert result["raw_score"] == pytest.approx(expected["raw_score"])
+
+
+def test_sample_farmer_matches_api(sample_farmer, api_score, tmp_path):
+    # Snapshot tables are joined on farmer_id, so the sample's farmer needs the id its rows point to
+    sample_farmer["farmers"]["id"] = sample_farmer["farms"][0]["farmer_id"]
+    results = rescore([sample_farmer], tmp_path)
+    assert results[sample_farmer["farmers"]["id"]]["credit_score"] == api_score(sample_farmer)["credit_score"]
@@ -0,0 +1,28 @@
+import sqlite3
+
+import pytest
+
+from scoring import database
+
+
+def test_score_database_matches_api(profiles, api_score):
+    connection = sqlite3.connect(":memory:")
+    database.create_schema(connection)
+    database.insert_profiles(connection, profiles)
+    results = {r["farmer_id"]: r for r in database.score_database(connection, batch_size=64)}
+    assert len(results) == len(profiles)
+    for profile in profiles:
+        expected = api_score(profile)
+        result = results[profile["farmers"]["id"]]
+        assert "error" not in result
+        assert result["credit_score"] == expected["credit_score"]
+        assert result["component_scores"] == pytest.approx(expected["component_scores"])
+
+
+def test_missing_farmer_is_reported(profiles):
+    connection = sqlite3.connect(":memory:")
+    database.create_schema(connection)
+    database.insert_profiles(connection, profiles[:2])
+    results = list(database.score_database(connection, farmer_ids=["missing", profiles[0]["farmers"]["id"]]))
+    assert results[0] == {"index": 0, "farmer_id": "missing", "error": "Farmer not found"}
+    assert "credit_score" in results[1]
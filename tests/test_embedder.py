@@ -0,0 +1,50 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+
+from rag.deadline import Deadline, DeadlineExceeded
+from rag.embedder import EmbeddingBatcher, EmbeddingCache
+
+
+class SlowBedrock:
+    """Answers invoke_model like Titan embeddings, after a delay."""
+
+    def __init__(self, delay_s):
+        self.delay_s = delay_s
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def invoke_model(self, modelId, contentType, accept, body):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay_s)
+        return {"body": io.BytesIO(json.dumps({"embedding": [1.0, 0.0]}).encode("utf-8"))}
+
+
+def test_batched_embedding_stops_waiting_at_the_deadline():
+    batcher = EmbeddingBatcher(SlowBedrock(1.0), "test-model", dimensions=2, max_wait_ms=0)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        batcher.embed("How do I repay?", Deadline(50))
+    assert time.monotonic() - started < 0.5
+
+
+def test_abandoned_texts_are_not_sent_to_bedrock():
+    bedrock = SlowBedrock(0.0)
+    batcher = EmbeddingBatcher(bedrock, "test-model", dimensions=2, max_wait_ms=300)
+    with pytest.raises(DeadlineExceeded):
+        batcher.embed("How do I repay?", Deadline(20))
+    assert batcher.embed("What is BVN?", Deadline(2000)) == [1.0, 0.0]
+    assert bedrock.calls == 1
+
+
+def test_embedding_cache_is_a_bounded_lru():
+    cache = EmbeddingCache(2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.get("a")
+    cache.put("c", [3.0])
+    assert len(cache) == 2 and cache.get("b") is None and cache.get("a") == [1.0]
@@ -0,0 +1,28 @@
+import datetime
+
+from models.request import CreditScoreRequestModel
+from scoring.features import _parse_timestamp, extract_features
+
+
+def test_parse_timestamp_accepts_strings_and_datetimes():
+    expected = datetime.datetime(2022, 7, 5, tzinfo=datetime.timezone.utc)
+    assert _parse_timestamp("2022-07-05T00:00:00Z") == expected
+    assert _parse_timestamp("2022-07-05T00:00:00") == expected
+    assert _parse_timestamp(expected) == expected
+    assert _parse_timestamp(expected.replace(tzinfo=None)) == expected
+    assert _parse_timestamp(datetime.date(2022, 7, 5)) == expected
+
+
+def test_validated_profile_keeps_date_features(sample_farmer, api_score):
+    features = extract_features(CreditScoreRequestModel(**sample_farmer).model_dump())
+    assert features.experience_years > 0
+    assert features.farming_experience > 0
+    assert (features.repayment_count, features.on_time_count, features.fully_repaid_loans) == (1, 1, 1)
+    assert api_score(sample_farmer)["component_scores"]["loan_history"] > 0
+
+
+def test_validated_and_json_profiles_score_the_same(profiles, api_score):
+    import credit_score
+    for profile in profiles:
+        as_json = CreditScoreRequestModel(**profile).model_dump(mode="json")
+        assert api_score(profile) == credit_score.calculate_credit_score(as_json)
@@ -0,0 +1,27 @@
+import json
+
+from scoring import jobs
+
+
+def test_score_rows_matches_api(profiles, api_score):
+    results, scored, errors = jobs.score_rows([json.dumps(p) for p in profiles], 0)
+    assert (scored, errors) == (len(profiles), 0)
+    for result, profile in zip(results, profiles):
+        expected = api_score(profile)
+        assert result["farmer_id"] == profile["farmers"]["id"]
+        assert result["credit_score"] == expected["credit_score"]
+        assert result["component_scores"] == expected["component_scores"]
+
+
+def test_score_rows_counts_dated_repayments(sample_farmer):
+    late = json.loads(json.dumps(sample_farmer))
+    late["loan_repayments"][0]["date_paid"] = "2022-08-20T00:00:00Z"
+    (on_time, paid_late), scored, errors = jobs.score_rows([sample_farmer, late], 0)
+    assert (scored, errors) == (2, 0)
+    assert on_time["component_scores"]["loan_history"] > paid_late["component_scores"]["loan_history"] > 0
+
+
+def test_score_rows_reports_invalid_rows(sample_farmer):
+    results, scored, errors = jobs.score_rows([sample_farmer, {"farmers": {"id": "broken"}}], 10)
+    assert (scored, errors) == (1, 1)
+    assert results[1]["index"] == 11 and results[1]["farmer_id"] == "broken" and "error" in results[1]
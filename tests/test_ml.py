@@ -0,0 +1,102 @@
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from scoring import convert_model, ml
+
+
+@pytest.fixture
+def model_path(tmp_path, monkeypatch):
+    """An ML_MODEL_PATH with no model yet, and no model loaded in this process."""
+    path = tmp_path / "credit_model.fcm"
+    monkeypatch.setenv("ML_MODEL_PATH", str(path))
+    monkeypatch.setattr(ml, "_model", None)
+    monkeypatch.setattr(ml, "_model_failure", None)
+    yield str(path)
+    if ml._model is not None:
+        ml._model.close()
+
+
+def write_logistic(path, weights):
+    names = list(weights)
+    ml.save_model(path, "logistic", names, {
+        "mean": np.zeros(len(names)),
+        "scale": np.ones(len(names)),
+        "weights": np.array([weights[name] for name in names], dtype=np.float64),
+    }, {"bias": -1.0}, version="test")
+
+
+def test_missing_model_falls_back_to_heuristic(model_path, profiles, api_score):
+    from models.request import CreditScoreRequestModel
+    for profile in profiles[:20]:
+        result = ml.score_with_budget(CreditScoreRequestModel(**profile).model_dump(), budget_ms=1000)
+        assert result["engine"] == "heuristic"
+        assert "unavailable" in result["fallback_reason"]
+        assert result["credit_score"] == api_score(profile)["credit_score"]
+
+
+def test_model_deployed_after_failure_is_loaded(model_path, sample_farmer):
+    with pytest.raises(ml.ModelUnavailableError):
+        ml.get_model()
+    write_logistic(model_path, {"on_time_ratio": 2.0, "bvn_verified": 1.0})
+    model = ml.get_model()
+    assert model.version == "test"
+
+    from models.request import CreditScoreRequestModel
+    result = ml.score_with_budget(CreditScoreRequestModel(**sample_farmer).model_dump(), budget_ms=1000)
+    assert result["engine"] == "ml"
+    assert 300 <= result["credit_score"] <= 850
+
+
+def test_failed_load_is_not_retried_before_backoff(model_path, monkeypatch):
+    with open(model_path, "wb") as f:
+        f.write(b"not a model")
+    with pytest.raises(ml.ModelUnavailableError):
+        ml.get_model()
+    failure = ml._model_failure
+
+    with pytest.raises(ml.ModelUnavailableError):
+        ml.get_model()
+    assert ml._model_failure is failure
+
+    monkeypatch.setitem(failure, "retry_at", 0.0)
+    with pytest.raises(ml.ModelUnavailableError):
+        ml.get_model()
+    assert ml._model_failure is not failure
+
+
+def test_xgboost_json_conversion(tmp_path):
+    # One stump on on_time_ratio: left (x < 0.5) -1.0, right +1.0, base score 0.5
+    source = tmp_path / "model.json"
+    source.write_text(json.dumps({"learner": {
+        "feature_names": ["age", "on_time_ratio"],
+        "learner_model_param": {"base_score": "[5E-1]"},
+        "objective": {"name": "binary:logistic"},
+        "gradient_booster": {"name": "gbtree", "model": {"trees": [{
+            "left_children": [1, -1, -1],
+            "right_children": [2, -1, -1],
+            "split_indices": [1, 0, 0],
+            "split_conditions": [0.5, -1.0, 1.0],
+        }]}},
+    }}))
+    output = str(tmp_path / "model.fcm")
+    convert_model.convert(str(source), output, "xgboost", version="xgb")
+
+    model = ml.CreditModel(output)
+    probabilities = model.predict_proba(model.feature_matrix([
+        {"age": 30, "on_time_ratio": 0.2},
+        {"age": 30, "on_time_ratio": 0.5},
+    ]))
+    model.close()
+    expected = 1 / (1 + np.exp(-np.array([-1.0, 1.0])))
+    assert np.allclose(probabilities, expected)
+
+
+def test_shadow_scoring_drops_work_when_full(monkeypatch, sample_farmer):
+    monkeypatch.setattr(ml, "_shadow_slots", threading.BoundedSemaphore(1))
+    assert ml._shadow_slots.acquire(blocking=False)  # the one slot is taken
+    dropped = ml.get_shadow_stats()["dropped"]
+    ml.submit_shadow(sample_farmer, {"credit_score": 700, "credit_rating": "Good"})
+    assert ml.get_shadow_stats()["dropped"] == dropped + 1
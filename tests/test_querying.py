@@ -0,0 +1,36 @@
+import converse
+from rag import metrics, querying
+from rag.answers import ERROR_MESSAGE
+from rag.deadline import DeadlineExceeded
+from rag.resilience import UpstreamUnavailable
+
+QUERY = "Can I get a loan without collateral for my cassava farm next season?"
+
+
+def fail_with(error):
+    def retrieve(*args, **kwargs):
+        raise error
+    return retrieve
+
+
+def test_unexpected_errors_are_reported_not_answered(monkeypatch):
+    monkeypatch.setattr(querying, "lookup_faq_answer", lambda *args, **kwargs: (None, None))
+    monkeypatch.setattr(querying, "retrieve_similar_chunks", fail_with(KeyError("matches")))
+    monkeypatch.setattr(converse, "retrieve_similar_chunks", fail_with(KeyError("matches")))
+    before = metrics.snapshot()["counters"]
+
+    querying.get_tenant().answer_cache.put(QUERY, "A cached answer")
+    assert querying.answer_query(QUERY) == ERROR_MESSAGE
+    assert converse.answer_turn(QUERY, None, [], "small") == ERROR_MESSAGE
+
+    counters = metrics.snapshot()["counters"]
+    assert counters.get("faq.errors", 0) == before.get("faq.errors", 0) + 1
+    assert counters.get("converse.errors", 0) == before.get("converse.errors", 0) + 1
+
+
+def test_deadline_and_upstream_failures_fall_back_to_cached_answer(monkeypatch):
+    monkeypatch.setattr(querying, "lookup_faq_answer", lambda *args, **kwargs: (None, None))
+    querying.get_tenant().answer_cache.put(QUERY, "A cached answer")
+    for error in (DeadlineExceeded("retrieval"), UpstreamUnavailable("bedrock_generation")):
+        monkeypatch.setattr(querying, "retrieve_similar_chunks", fail_with(error))
+        assert querying.answer_query(QUERY) == "A cached answer"
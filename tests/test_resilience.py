@@ -0,0 +1,100 @@
+import time
+
+import pytest
+
+from rag import resilience
+from rag.resilience import (
+    BREAKER_FAILURE_THRESHOLD,
+    CircuitBreaker,
+    CircuitOpenError,
+    LoadShedder,
+    RateLimited,
+    Upstream,
+    UpstreamUnavailable,
+)
+
+
+def failing_call():
+    raise ConnectionError("upstream down")
+
+
+def test_breaker_opens_after_threshold_and_half_opens_after_reset():
+    upstream = Upstream("test", rate=1000.0)
+    upstream.breaker = CircuitBreaker(reset_seconds=0.05)
+
+    for _ in range(BREAKER_FAILURE_THRESHOLD - 1):
+        with pytest.raises(ConnectionError):
+            upstream.call(None, failing_call)
+    assert upstream.breaker.state == CircuitBreaker.CLOSED
+
+    with pytest.raises(ConnectionError):
+        upstream.call(None, failing_call)
+    assert upstream.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        upstream.call(None, lambda: "ok")
+    assert upstream.get_stats()["rejected_open"] == 1
+
+    time.sleep(0.06)
+    # A single trial call is let through once the reset has passed
+    assert upstream.breaker.allow()
+    assert upstream.breaker.state == CircuitBreaker.HALF_OPEN
+    assert not upstream.breaker.allow()
+    upstream.breaker.record_success()
+    assert upstream.call(None, lambda: "ok") == "ok"
+    assert upstream.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_trial_call_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_guarded_raises_when_the_bucket_cannot_refill_in_time(monkeypatch):
+    upstream = Upstream("pinecone", rate=1.0)
+    monkeypatch.setitem(resilience.upstreams, "pinecone", upstream)
+    monkeypatch.setattr(resilience, "RATE_LIMIT_MAX_WAIT_MS", 50.0)
+    calls = []
+
+    assert resilience.guarded("pinecone", None, calls.append, "first") is None
+    started = time.monotonic()
+    # The next token is a second away, beyond the 50 ms the call may wait
+    with pytest.raises(UpstreamUnavailable) as raised:
+        resilience.guarded("pinecone", None, calls.append, "second")
+    assert isinstance(raised.value, RateLimited)
+    assert time.monotonic() - started < 0.5
+    assert calls == ["first"]
+    assert upstream.get_stats()["rejected_rate"] == 1
+    # A rate-limited call does not count against the circuit
+    assert upstream.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_shedder_refuses_low_priority_beyond_max_low():
+    shedder = LoadShedder(capacity=10, reserved=2, max_low=3)
+    assert all(shedder.try_acquire("low") for _ in range(3))
+    assert not shedder.try_acquire("low")
+    assert shedder.try_acquire("high")
+
+    shedder.release("low")
+    assert shedder.try_acquire("low")
+    assert shedder.get_stats() == {"in_flight": {"high": 1, "low": 3}, "shed": 1}
+
+
+def test_shedder_keeps_reserved_slots_for_high_priority():
+    shedder = LoadShedder(capacity=6, reserved=2, max_low=10)
+    assert all(shedder.try_acquire("low") for _ in range(4))
+    # Only the reserved slots are left, and they are not given to low-priority requests
+    assert not shedder.try_acquire("low")
+    assert shedder.try_acquire("high")
+    assert shedder.try_acquire("high")
+
+    with shedder.admit("low") as admitted:
+        assert not admitted
+    with shedder.admit("high") as admitted:
+        assert admitted
+    assert shedder.get_stats()["in_flight"] == {"high": 2, "low": 4}
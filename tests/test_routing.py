@@ -0,0 +1,37 @@
+import pytest
+
+from rag import routing
+
+USER = {"name": "Ada Obi", "wallet_balance": 1500.0, "credit_score": 712.0,
+        "available_loans": [{"amount_disbursed": 50000}]}
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Hello", (routing.GREETING, None)),
+    ("good morning", (routing.GREETING, None)),
+    ("thanks!", (routing.GREETING, routing.CLOSING)),
+    ("ok bye", (routing.GREETING, routing.CLOSING)),
+    ("what is my balance?", (routing.ACCOUNT, "balance")),
+    ("how much is in my wallet", (routing.ACCOUNT, "balance")),
+    ("my credit score", (routing.ACCOUNT, "credit_score")),
+    ("do I have any loans", (routing.ACCOUNT, "loans")),
+    ("how many loans do i have", (routing.ACCOUNT, "loans")),
+    ("what is my loan interest rate", (routing.SMALL, None)),
+    ("what loans can i get with my farm", (routing.SMALL, None)),
+    ("what is a good score", (routing.SMALL, None)),
+    ("why is my credit score low", (routing.ACCOUNT, routing.SCORE_REASONS)),
+])
+def test_classify_turn(query, expected):
+    assert routing.classify_turn(query) == expected
+
+
+def test_closings_are_not_greeted():
+    assert routing.template_answer(routing.GREETING, routing.CLOSING, USER, query="thank you").startswith("You're welcome Ada!")
+    assert routing.template_answer(routing.GREETING, routing.CLOSING, None, query="bye").startswith("Goodbye!")
+    assert routing.template_answer(routing.GREETING, None, USER).startswith("Hello Ada!")
+
+
+def test_templates_name_the_tenant():
+    for route, intent in [(routing.GREETING, None), (routing.ACCOUNT, "balance"), (routing.ACCOUNT, "loans")]:
+        answer = routing.template_answer(route, intent, USER, brand="GreenBank")
+        assert "GreenBank" in answer and "FarmCredit" not in answer
@@ -0,0 +1,33 @@
+import json
+
+import warmup
+
+
+def test_recorded_queries_are_warmed_up_next_time(tmp_path):
+    path = str(tmp_path / "queries.jsonl")
+    recorder = warmup.QueryRecorder(interval=3600)
+    for query in ["How do I repay?"] * 3 + ["What is BVN?"] * 2 + ["Hello"]:
+        recorder.record(query)
+    recorder.flush(path)
+    recorder.record("What is BVN?")
+    recorder.flush(path)
+
+    assert warmup.load_top_queries(path, limit=2) == ["How do I repay?", "What is BVN?"]
+
+
+def test_large_query_file_is_compacted(tmp_path, monkeypatch):
+    path = tmp_path / "queries.jsonl"
+    path.write_text("".join(json.dumps({"query": f"query {i}", "count": i}) + "\n" for i in range(5000)) + '{"query": "cut sh')
+    monkeypatch.setattr(warmup, "WARMUP_QUERIES_MAX_BYTES", 1024)
+    monkeypatch.setattr(warmup, "COMPACTED_QUERIES", 10)
+
+    warmup.QueryRecorder(interval=3600).flush(str(path))
+    assert len(path.read_text().splitlines()) == 10
+    assert warmup.load_top_queries(str(path), limit=1) == ["query 4999"]
+
+
+def test_pre_embed_fills_the_in_process_cache():
+    from rag.clients import EMBEDDING_MODEL_ID
+    from rag.embedder import EMBEDDING_DIMENSIONS, embedding_cache
+    assert warmup.pre_embed(["How long does loan approval take?"]) == 1
+    assert embedding_cache.get(f"{EMBEDDING_MODEL_ID}|{EMBEDDING_DIMENSIONS}|How long does loan approval take?") is not None
@@ -0,0 +1,324 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Startup warm-up: each server worker loads its data, opens its upstream connections,
+# fills the embedding cache with the most frequent past queries and runs a synthetic
+# score in the background, and reports ready (GET /ready) once it is done. Until
+# then the worker serves requests, but load balancers should not send it traffic.
+
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+
+# Past FAQ and conversation queries, one JSON object per line with a 'query' and
+# optionally a 'count' (default 1); the most frequent are embedded at startup.
+# Workers append the queries they serve (see QueryRecorder), so a recycled or
+# restarted worker warms up with the traffic its predecessors saw.
+DEFAULT_WARMUP_QUERIES_PATH = os.path.join(tempfile.gettempdir(), "farmcredit-warmup-queries.jsonl")
+WARMUP_TOP_QUERIES = int(os.getenv("WARMUP_TOP_QUERIES", "200"))
+
+# How often each worker appends the queries it served to the file (0: don't record them)
+WARMUP_RECORD_SECONDS = float(os.getenv("WARMUP_RECORD_SECONDS", "300"))
+
+# Once the file grows past this size it is rewritten with only the most frequent queries
+WARMUP_QUERIES_MAX_BYTES = int(os.getenv("WARMUP_QUERIES_MAX_BYTES", str(4 * 1024 * 1024)))
+
+# Distinct queries a worker counts between appends, and queries kept when the file is compacted
+RECORDED_QUERIES_MAX = 10000
+COMPACTED_QUERIES = 10 * WARMUP_TOP_QUERIES
+
+# Longest the warm-up waits for the FAQ answer index and query embeddings before reporting ready
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "120"))
+
+# Idle upstream connections are closed by the other end after about a minute; ping
+# Bedrock and Pinecone this often to keep them open (0: don't)
+UPSTREAM_KEEPALIVE_SECONDS = float(os.getenv("UPSTREAM_KEEPALIVE_SECONDS", "45"))
+
+# Query embeddings requested at once during warm-up
+WARMUP_EMBEDDING_CONCURRENCY = 4
+
+SAMPLE_FARMER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sample_farmer.json")
+
+
+def warmup_queries_path():
+    return os.getenv("WARMUP_QUERIES_PATH", DEFAULT_WARMUP_QUERIES_PATH)
+
+
+def _count_queries(path):
+    counts = Counter()
+    if not os.path.exists(path):
+        return counts
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by a crash mid-append
+                query = (entry.get("query") or "").strip()
+                if query:
+                    counts[query] += entry.get("count", 1)
+    return counts
+
+
+def load_top_queries(path=None, limit=WARMUP_TOP_QUERIES):
+    """
+    Reads past queries and returns the most frequent.
+
+    Args:
+        path (str, optional): JSON lines file of {"query", "count"} objects (default:
+            WARMUP_QUERIES_PATH, or farmcredit-warmup-queries.jsonl in the temp directory).
+        limit (int): Number of queries to return.
+
+    Returns:
+        list: Up to `limit` queries, most frequent first (empty if the file is missing).
+    """
+    return [query for query, _ in _count_queries(path or warmup_queries_path()).most_common(limit)]
+
+
+class QueryRecorder:
+    """
+    Counts the FAQ and conversation queries a worker serves and appends the counts to
+    the warm-up queries file every WARMUP_RECORD_SECONDS, in one write so workers
+    appending at the same time don't interleave lines.
+    """
+
+    def __init__(self, interval=WARMUP_RECORD_SECONDS):
+        self.interval = interval
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.flushed_at = time.monotonic()
+        self.flushing = False
+
+    def record(self, query):
+        query = (query or "").strip()
+        if not query or self.interval <= 0:
+            return
+        with self.lock:
+            if query in self.counts or len(self.counts) < RECORDED_QUERIES_MAX:
+                self.counts[query] += 1
+            due = not self.flushing and time.monotonic() - self.flushed_at >= self.interval
+            if due:
+                self.flushing = True
+        if due:
+            threading.Thread(target=self.flush, name="warmup-queries", daemon=True).start()
+
+    def flush(self, path=None):
+        """Appends the queries counted since the last flush to the file, compacting it if it is too large."""
+        path = path or warmup_queries_path()
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            self.flushed_at = time.monotonic()
+        try:
+            if counts:
+                lines = "".join(json.dumps({"query": query, "count": count}) + "\n" for query, count in counts.items())
+                fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, lines.encode("utf-8"))
+                finally:
+                    os.close(fd)
+            if os.path.exists(path) and os.path.getsize(path) > WARMUP_QUERIES_MAX_BYTES:
+                self._compact(path)
+        except OSError as e:
+            print(f"Could not record warm-up queries ({e})")
+        finally:
+            with self.lock:
+                self.flushing = False
+
+    def _compact(self, path):
+        # Appends from other workers between the read and the replace are lost; the
+        # file is a warm-up hint, not a record
+        top = _count_queries(path).most_common(COMPACTED_QUERIES)
+        temp_path = f"{path}.tmp-{os.getpid()}"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for query, count in top:
+                f.write(json.dumps({"query": query, "count": count}) + "\n")
+        os.replace(temp_path, path)
+
+
+query_recorder = QueryRecorder()
+
+
+def record_query(query):
+    """Counts a served query for the warm-up of later workers."""
+    query_recorder.record(query)
+
+
+def ping_upstreams():
+    """
+    Sends one small request to Bedrock and to the vector index, opening (or keeping
+    open) their connections. The Bedrock embedding goes through its rate limiter and
+    circuit breaker, and is skipped if this process called Bedrock since the last ping.
+    """
+    from rag.clients import EMBEDDING_MODEL_ID, get_bedrock_client, get_vector_index
+    from rag.embedder import invoke_embedding, seconds_since_last_call
+    from rag.resilience import guarded
+    idle = seconds_since_last_call()
+    if idle is None or idle >= UPSTREAM_KEEPALIVE_SECONDS:
+        guarded("bedrock_embedding", None, invoke_embedding, "warm-up", get_bedrock_client(), EMBEDDING_MODEL_ID)
+    get_vector_index().describe_index_stats()
+
+
+def pre_embed(queries, timeout=WARMUP_TIMEOUT_SECONDS):
+    """
+    Embeds queries into the embedding cache (and the shared cache, when enabled), so
+    their first request skips Bedrock.
+
+    Returns:
+        int: Queries embedded before the timeout.
+    """
+    from rag.clients import EMBEDDING_MODEL_ID, get_bedrock_client
+    from rag.embedder import embed_query
+    bedrock = get_bedrock_client()
+    stop_at = time.monotonic() + timeout
+
+    def embed(query):
+        if time.monotonic() >= stop_at:
+            return False
+        embed_query(query, bedrock, EMBEDDING_MODEL_ID)
+        return True
+
+    with ThreadPoolExecutor(max_workers=WARMUP_EMBEDDING_CONCURRENCY) as pool:
+        return sum(pool.map(embed, queries))
+
+
+def synthetic_score():
+    """
+    Scores the sample farmer through request validation, feature extraction and the
+    active rules (and the ML model, if one is deployed), bypassing the score cache.
+
+    Returns:
+        int: The sample farmer's credit score.
+    """
+    import credit_score
+    from models.request import CreditScoreRequestModel
+    from scoring import ml, rules
+    with open(SAMPLE_FARMER_PATH, encoding="utf-8") as f:
+        farmer_data = CreditScoreRequestModel(**json.load(f)).model_dump()
+    result = credit_score.calculate_credit_score(farmer_data, rules.get_rules())
+    try:
+        ml.predict_credit_score(farmer_data)
+    except ml.ModelUnavailableError:
+        pass
+    return result["credit_score"]
+
+
+class WarmUp:
+    """
+    Warm-up state of one server process: which steps ran, how long they took and
+    whether they failed. A failed step is reported but does not hold back readiness;
+    the request that needs what it would have loaded loads it instead.
+    """
+
+    def __init__(self):
+        self.status = "pending"
+        self.steps = {}
+        self.started_at = None
+        self.finished_at = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.keepalive = None
+
+    @property
+    def ready(self):
+        return self.status == "ready"
+
+    def _step(self, name, func, *args):
+        started = time.perf_counter()
+        try:
+            result = func(*args)
+            entry = {"ms": round((time.perf_counter() - started) * 1000, 1), "result": result}
+        except Exception as e:
+            entry = {"ms": round((time.perf_counter() - started) * 1000, 1), "error": str(e)}
+            print(f"Warm-up step {name} failed ({e})")
+        with self.lock:
+            self.steps[name] = entry
+
+    def _wait_for_answer_indexes(self):
+        from rag.answer_index import wait_for_answer_index
+        from rag.tenants import get_tenants
+        stop_at = time.monotonic() + WARMUP_TIMEOUT_SECONDS
+        return {
+            tenant_id: wait_for_answer_index(tenant, max(0.0, stop_at - time.monotonic()))
+            for tenant_id, tenant in get_tenants().items()
+        }
+
+    def _pre_embed(self):
+        return pre_embed(load_top_queries())
+
+    def run(self, routes):
+        """
+        Runs the warm-up steps for the given route groups ("scoring", "ai", "jobs")
+        and marks the process ready.
+        """
+        import controller
+        with self.lock:
+            self.status, self.started_at = "running", time.time()
+        started = time.perf_counter()
+
+        # Rule tables, reference data, FAQ indexes and clients (already loaded if the
+        # server preloaded them before forking)
+        self._step("preload", controller.preload, routes)
+        if "ai" in routes:
+            self._step("answer_index", self._wait_for_answer_indexes)
+            self._step("connections", ping_upstreams)
+            self._step("query_embeddings", self._pre_embed)
+        if "scoring" in routes:
+            self._step("synthetic_score", synthetic_score)
+
+        with self.lock:
+            self.status, self.finished_at = "ready", time.time()
+        print(json.dumps({
+            "event": "warmup",
+            "pid": os.getpid(),
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+            "steps": self.steps,
+        }))
+
+    def _keep_alive(self):
+        while not self.stop_event.wait(UPSTREAM_KEEPALIVE_SECONDS):
+            try:
+                ping_upstreams()
+            except Exception as e:
+                print(f"Upstream keep-alive ping failed ({e})")
+
+    def start(self, routes):
+        """
+        Starts the warm-up in the background (or marks the process ready if STARTUP_WARMUP
+        is off), and keeps upstream connections open for AI routes until stop().
+        """
+        if STARTUP_WARMUP:
+            threading.Thread(target=self.run, args=(routes,), name="warmup", daemon=True).start()
+        else:
+            with self.lock:
+                self.status = "ready"
+        if "ai" in routes and UPSTREAM_KEEPALIVE_SECONDS > 0:
+            self.stop_event.clear()
+            self.keepalive = threading.Thread(target=self._keep_alive, name="upstream-keepalive", daemon=True)
+            self.keepalive.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.keepalive is not None:
+            self.keepalive.join(timeout=1)
+            self.keepalive = None
+        query_recorder.flush()
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "status": self.status,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "steps": dict(self.steps),
+            }
+
+
+warm_up = WarmUp()
+
+
+def get_warmup_stats():
+    return warm_up.get_stats()